@@ -0,0 +1,93 @@
+"""Throughput vs. compression ratio for every archive codec.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_codecs [--size-mb 64] [--input FILE] [--json]
+"""
+import os
+import sys
+import json
+import time
+import contextlib
+import argparse
+import tempfile
+from benchmarks.corpus import generate_corpus
+from core.file_processor import FileProcessor
+from utils.settings_manager import SettingsManager
+
+CODECS = [
+    ("zip", "stored", None),
+    ("zip", "deflate", 1),
+    ("zip", "deflate", 6),
+    ("zip", "deflate", 9),
+    ("zip", "bzip2", 9),
+    ("zip", "lzma", None),
+    ("zip", "auto", 6),
+    ("tar.gz", None, 6),
+    ("tar.xz", None, 6),
+]
+
+
+def generate_sample(path: str, size_mb: int, seed: int = 0) -> None:
+    # Mix of source-like text, repeated license headers and incompressible blobs
+    generate_corpus(path, size_mb=size_mb, body_size="uniform:256-8192", depth=2, directories=40,
+                    utf8_ratio=0.0, blob_ratio=0.1, license_ratio=0.2, seed=seed)
+
+
+def run_benchmarks(input_path: str):
+    input_size = os.path.getsize(input_path)
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        settings_manager = SettingsManager(os.path.join(work_dir, 'settings.json'))
+        settings_manager.settings.update(index_cache_enabled=False)
+        file_processor = FileProcessor(settings_manager)
+        with file_processor.index_file(input_path) as index:
+            for archive_format, compression, level in CODECS:
+                settings_manager.settings.update(archive_format=archive_format, compression=compression,
+                                                 compression_level=level)
+                output_file = os.path.join(work_dir, 'output' + file_processor.archive_extension())
+                started = time.perf_counter()
+                file_processor.create_zip_from_index(index, output_file)
+                elapsed = time.perf_counter() - started
+                output_size = os.path.getsize(output_file)
+                os.unlink(output_file)
+                results.append({
+                    "format": archive_format,
+                    "compression": compression,
+                    "level": level,
+                    "seconds": round(elapsed, 3),
+                    "mb_per_s": round(input_size / (1024 * 1024) / elapsed, 2),
+                    "ratio": round(output_size / input_size, 4),
+                    "output_bytes": output_size,
+                })
+    return {"input_bytes": input_size, "results": results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--input", help="benchmark an existing dump instead of a generated sample")
+    parser.add_argument("--size-mb", type=int, default=64, help="size of the generated sample")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args(argv)
+
+    # The processor logs with print(); keep stdout for the results
+    with tempfile.TemporaryDirectory() as sample_dir, contextlib.redirect_stdout(sys.stderr):
+        input_path = args.input
+        if not input_path:
+            input_path = os.path.join(sample_dir, 'sample.txt')
+            generate_sample(input_path, args.size_mb)
+        report = run_benchmarks(input_path)
+
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+        return
+
+    print(f"{'format':8} {'codec':8} {'level':>5} {'MB/s':>9} {'ratio':>7} {'seconds':>8}")
+    for result in report["results"]:
+        print(f"{result['format']:8} {result['compression'] or '-':8} {result['level'] or '-':>5} "
+              f"{result['mb_per_s']:>9.2f} {result['ratio']:>7.3f} {result['seconds']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
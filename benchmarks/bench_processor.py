@@ -0,0 +1,236 @@
+"""Throughput, memory and syscalls of the FileProcessor entry points.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_processor [--records 100000] [--input FILE] [--json]
+    python -m benchmarks.bench_processor --json --output new.json --baseline old.json
+
+With --baseline the exit status is 1 when any benchmark's MB/s dropped by
+more than --tolerance against the saved results.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import contextlib
+import platform
+import argparse
+import tempfile
+import threading
+import psutil
+from benchmarks.corpus import generate_corpus
+from core.file_processor import FileProcessor
+from utils.settings_manager import SettingsManager
+
+
+class ResourceMonitor:
+    # Peak RSS (this process and its workers) sampled on a background thread,
+    # and the difference in psutil's I/O counters, which on Linux count
+    # read- and write-family syscalls of this process.
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak_rss = 0
+        self.read_syscalls = None
+        self.write_syscalls = None
+        self.context_switches = None
+        self._stop = threading.Event()
+
+    def _rss(self) -> int:
+        rss = self.process.memory_info().rss
+        for child in self.process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return rss
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, self._rss())
+
+    def _io_counters(self):
+        try:
+            return self.process.io_counters()
+        except (AttributeError, psutil.Error):  # not available on macOS
+            return None
+
+    def __enter__(self):
+        self.peak_rss = self._rss()
+        self._io_before = self._io_counters()
+        self._switches_before = self.process.num_ctx_switches()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, self._rss())
+        io_after = self._io_counters()
+        if self._io_before is not None and io_after is not None:
+            self.read_syscalls = io_after.read_count - self._io_before.read_count
+            self.write_syscalls = io_after.write_count - self._io_before.write_count
+        switches = self.process.num_ctx_switches()
+        self.context_switches = (switches.voluntary + switches.involuntary
+                                 - self._switches_before.voluntary - self._switches_before.involuntary)
+
+
+# Each benchmark prepares whatever it needs outside the timed region and
+# returns the function to time.
+
+def prepare_process_file(processor, input_path, work_dir):
+    return lambda: processor.process_file(input_path)
+
+
+def prepare_process_large_file(processor, input_path, work_dir):
+    output_dir = os.path.join(work_dir, 'large')
+
+    def run():
+        shutil.rmtree(output_dir, ignore_errors=True)
+        processor.process_large_file(input_path, output_dir)
+    return run
+
+
+def prepare_process_chunk(processor, input_path, work_dir):
+    with open(input_path, 'r', encoding='utf-8') as f:
+        chunk = f.read()
+    return lambda: processor._process_chunk(chunk)
+
+
+def prepare_create_zip_archive(processor, input_path, work_dir):
+    source_dir = os.path.join(work_dir, 'zip-source')
+    processor.process_large_file(input_path, source_dir)
+    output_file = os.path.join(work_dir, 'output.zip')
+    return lambda: processor.create_zip_archive(source_dir, output_file)
+
+
+BENCHMARKS = {
+    "process_file": prepare_process_file,
+    "process_large_file": prepare_process_large_file,
+    "_process_chunk": prepare_process_chunk,
+    "create_zip_archive": prepare_create_zip_archive,
+}
+
+
+def run_benchmarks(input_path: str, names=None, repeat: int = 3, settings: dict = None) -> dict:
+    input_size = os.path.getsize(input_path)
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        settings_manager = SettingsManager(os.path.join(work_dir, 'settings.json'))
+        # Archives are benchmarked separately (bench_codecs); keep zip output comparable
+        settings_manager.settings.update(index_cache_enabled=False, archive_format="zip", compression="deflate",
+                                         compression_level=6)
+        settings_manager.settings.update(settings or {})
+        processor = FileProcessor(settings_manager)
+        with processor.index_file(input_path) as index:
+            record_count = len(index)
+
+        for name in names or BENCHMARKS:
+            function = BENCHMARKS[name](processor, input_path, work_dir)
+            best = None
+            for _ in range(max(repeat, 1)):
+                with ResourceMonitor() as monitor:
+                    started = time.perf_counter()
+                    function()
+                    elapsed = time.perf_counter() - started
+                if best is None or elapsed < best[0]:
+                    best = (elapsed, monitor)
+
+            elapsed, monitor = best
+            results.append({
+                "benchmark": name,
+                "seconds": round(elapsed, 4),
+                "mb_per_s": round(input_size / (1024 * 1024) / elapsed, 2),
+                "records_per_s": round(record_count / elapsed),
+                "peak_rss_mb": round(monitor.peak_rss / (1024 * 1024), 1),
+                "read_syscalls": monitor.read_syscalls,
+                "write_syscalls": monitor.write_syscalls,
+                "context_switches": monitor.context_switches,
+            })
+
+    return {
+        "input_bytes": input_size,
+        "records": record_count,
+        "repeat": repeat,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": settings or {},
+        "results": results,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    # Benchmarks whose throughput fell below (1 - tolerance) of the baseline
+    previous = {result["benchmark"]: result for result in baseline.get("results", [])}
+    regressions = []
+    for result in report["results"]:
+        old = previous.get(result["benchmark"])
+        if old and result["mb_per_s"] < old["mb_per_s"] * (1 - tolerance):
+            regressions.append((result["benchmark"], old["mb_per_s"], result["mb_per_s"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--input", help="benchmark an existing dump instead of a generated one")
+    parser.add_argument("--records", type=int, default=100000, help="records in the generated dump")
+    parser.add_argument("--body-size", default="lognormal:1024", help="body size distribution (see corpus.py)")
+    parser.add_argument("--depth", type=int, default=4, help="directory depth of the generated dump")
+    parser.add_argument("--utf8-ratio", type=float, default=0.05, help="share of non-ASCII words")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--benchmark", action="append", choices=list(BENCHMARKS), dest="benchmarks",
+                        help="run only this benchmark (repeatable)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark; the fastest is reported")
+    parser.add_argument("--workers", type=int, help="worker_count setting")
+    parser.add_argument("--processes", action="store_true", help="parse in worker processes")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed MB/s drop against the baseline")
+    args = parser.parse_args(argv)
+
+    settings = {}
+    if args.workers is not None:
+        settings["worker_count"] = args.workers
+    if args.processes:
+        settings["execution_mode"] = "process"
+
+    # The processor logs with print(); keep stdout for the results
+    with tempfile.TemporaryDirectory() as sample_dir, contextlib.redirect_stdout(sys.stderr):
+        input_path = args.input
+        if not input_path:
+            input_path = os.path.join(sample_dir, 'corpus.txt')
+            generate_corpus(input_path, args.records, body_size=args.body_size, depth=args.depth,
+                            utf8_ratio=args.utf8_ratio, seed=args.seed)
+        report = run_benchmarks(input_path, args.benchmarks, args.repeat, settings)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print(f"{report['records']} records, {report['input_bytes'] / (1024 * 1024):.1f} MB")
+        print(f"{'benchmark':20} {'MB/s':>9} {'records/s':>11} {'peak MB':>8} {'reads':>8} {'writes':>8}")
+        for result in report["results"]:
+            reads, writes = (result[key] if result[key] is not None else '-'
+                             for key in ('read_syscalls', 'write_syscalls'))
+            print(f"{result['benchmark']:20} {result['mb_per_s']:>9.2f} {result['records_per_s']:>11} "
+                  f"{result['peak_rss_mb']:>8.1f} {reads:>8} {writes:>8}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for name, old, new in regressions:
+            print(f"{name}: {old:.2f} -> {new:.2f} MB/s", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""Deterministic synthetic dumps for benchmarks.
+
+The same arguments and seed always produce byte-identical output, so
+results from different runs and machines can be compared.
+
+    python -m benchmarks.corpus dump.txt [--records 100000] [--body-size lognormal:2048]
+"""
+import sys
+import math
+import base64
+import random
+import argparse
+from typing import Callable, NamedTuple
+
+WORDS = ["def", "class", "return", "import", "self", "value", "result", "config", "data", "index",
+         "for", "while", "yield", "lambda", "None", "True", "False", "try", "except", "with"]
+# Two-, three- and four-byte UTF-8 sequences
+UNICODE_WORDS = ["größe", "café", "naïve", "ошибка", "данные", "προσοχή", "日本語", "数据", "файл", "🙂", "🚀"]
+LICENSE_HEADER = "# Licensed under the MIT License. See LICENSE for details.\n" * 8
+
+
+class CorpusStats(NamedTuple):
+    records: int
+    bytes: int
+    distinct_paths: int
+
+
+def body_size_sampler(spec: str, rng: random.Random) -> Callable[[], int]:
+    # "fixed:N", "uniform:LOW-HIGH" or "lognormal:MEDIAN" (a long tail of
+    # large bodies, like real source trees)
+    kind, _, value = spec.partition(':')
+    if kind == "fixed":
+        size = int(value or 1024)
+        return lambda: size
+    if kind == "uniform":
+        low, _, high = (value or "64-4096").partition('-')
+        return lambda: rng.randint(int(low), int(high))
+    if kind == "lognormal":
+        mu = math.log(int(value or 2048))
+        return lambda: max(1, min(int(rng.lognormvariate(mu, 1.0)), 64 * 1024 * 1024))
+    raise ValueError(f"unknown body size distribution: {spec}")
+
+
+def _text_body(rng: random.Random, size: int, utf8_ratio: float) -> str:
+    lines = []
+    length = 0
+    while length < size:
+        words = [rng.choice(UNICODE_WORDS) if rng.random() < utf8_ratio else rng.choice(WORDS)
+                 for _ in range(rng.randint(3, 12))]
+        line = " ".join(words)
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines)
+
+
+def _blob_body(rng: random.Random, size: int) -> str:
+    raw = size * 3 // 4 or 1
+    return base64.b64encode(rng.getrandbits(raw * 8).to_bytes(raw, 'little')).decode()
+
+
+def _record_path(rng: random.Random, record: int, depth: int, directories: int) -> str:
+    parts = [f"dir{rng.randrange(directories)}" for _ in range(rng.randint(1, max(depth, 1)))]
+    return "/".join(parts + [f"file{record}.txt"])
+
+
+def generate_corpus(path: str, records: int = None, size_mb: float = None, body_size: str = "lognormal:2048",
+                    depth: int = 4, directories: int = 20, utf8_ratio: float = 0.05, blob_ratio: float = 0.0,
+                    license_ratio: float = 0.0, duplicate_ratio: float = 0.0, prefix: str = "/project_root/",
+                    seed: int = 0) -> CorpusStats:
+    # Stops after `records` records or once the file reaches `size_mb`,
+    # whichever comes first (at least one of them must be given).
+    # blob_ratio / license_ratio swap text bodies for incompressible base64
+    # or highly repetitive ones; duplicate_ratio reuses an earlier path.
+    if records is None and size_mb is None:
+        raise ValueError("either records or size_mb is required")
+    rng = random.Random(seed)
+    next_size = body_size_sampler(body_size, rng)
+    target = None if size_mb is None else int(size_mb * 1024 * 1024)
+    paths = []
+    written = 0
+    record = 0
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        while (records is None or record < records) and (target is None or written < target):
+            if paths and rng.random() < duplicate_ratio:
+                name = rng.choice(paths)
+            else:
+                name = _record_path(rng, record, depth, directories)
+                paths.append(name)
+
+            kind = rng.random()
+            if kind < blob_ratio:
+                body = _blob_body(rng, next_size())
+            elif kind < blob_ratio + license_ratio:
+                body = LICENSE_HEADER
+            else:
+                body = _text_body(rng, next_size(), utf8_ratio)
+
+            chunk = f"{prefix}{name}\n{body}\n".encode('utf-8')
+            f.buffer.write(chunk)
+            written += len(chunk)
+            record += 1
+    return CorpusStats(record, written, len(paths))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output", help="file to write")
+    parser.add_argument("--records", type=int, help="number of records")
+    parser.add_argument("--size-mb", type=float, help="approximate size of the dump")
+    parser.add_argument("--body-size", default="lognormal:2048",
+                        help="fixed:N, uniform:LOW-HIGH or lognormal:MEDIAN (bytes)")
+    parser.add_argument("--depth", type=int, default=4, help="maximum directory depth")
+    parser.add_argument("--directories", type=int, default=20, help="distinct names per directory level")
+    parser.add_argument("--utf8-ratio", type=float, default=0.05, help="share of words outside ASCII")
+    parser.add_argument("--blob-ratio", type=float, default=0.0, help="share of base64 binary bodies")
+    parser.add_argument("--license-ratio", type=float, default=0.0, help="share of repetitive bodies")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0, help="share of records reusing a path")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    if args.records is None and args.size_mb is None:
+        args.records = 10000
+
+    stats = generate_corpus(args.output, args.records, args.size_mb, args.body_size, args.depth, args.directories,
+                            args.utf8_ratio, args.blob_ratio, args.license_ratio, args.duplicate_ratio,
+                            seed=args.seed)
+    print(f"{stats.records} records, {stats.distinct_paths} paths, {stats.bytes / (1024 * 1024):.1f} MB",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import contextlib
+import threading
+import concurrent.futures
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from core.file_processor import FileProcessor, worker_count
+from core.index_cache import prefix_fingerprint
+from utils.progress_reporter import as_reporter
+from utils.metrics import create_metrics, export_metrics
+from utils.profiler import Profiler, profile_mode
+
+
+class BatchResult(NamedTuple):
+    input_path: str
+    output_path: Optional[str]
+    status: str  # "ok", "failed", "cancelled" or "duplicate"
+    size: int
+    seconds: float = 0.0
+    error: Optional[str] = None
+    duplicate_of: Optional[str] = None
+
+
+class BatchReport:
+    def __init__(self, results: List[BatchResult], elapsed: float, metrics: dict = None):
+        self.results = results
+        self.elapsed = elapsed
+        self.metrics = metrics
+
+    def count(self, status: str) -> int:
+        return sum(1 for result in self.results if result.status == status)
+
+    @property
+    def processed_bytes(self) -> int:
+        return sum(result.size for result in self.results if result.status == "ok")
+
+    @property
+    def succeeded(self) -> bool:
+        return not self.count("failed")
+
+    def summary(self) -> str:
+        megabytes = self.processed_bytes / (1024 * 1024)
+        lines = [f"Processed {self.count('ok')} of {len(self.results)} inputs ({megabytes:.1f} MB) "
+                 f"in {self.elapsed:.1f}s ({megabytes / max(self.elapsed, 1e-9):.1f} MB/s): "
+                 + ", ".join(f"{self.count(status)} {status}"
+                             for status in ("ok", "duplicate", "failed", "cancelled") if self.count(status))]
+        for result in self.results:
+            if result.status == "failed":
+                lines.append(f"  failed: {result.input_path}: {result.error}")
+            elif result.status == "duplicate":
+                lines.append(f"  duplicate: {result.input_path} (same as {result.duplicate_of})")
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict:
+        report = {
+            "elapsed_seconds": self.elapsed,
+            "processed_bytes": self.processed_bytes,
+            "counts": {status: self.count(status) for status in ("ok", "duplicate", "failed", "cancelled")},
+            "results": [result._asdict() for result in self.results],
+        }
+        if self.metrics is not None:
+            report["metrics"] = self.metrics
+        return report
+
+    def write(self, report_path: str) -> None:
+        with open(report_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=4)
+
+
+class BatchScheduler:
+    # Runs many inputs through FileProcessor. Identical inputs are processed
+    # once, the rest start largest first (so a big file isn't left running
+    # alone at the end) a few at a time, and every file's chunks are parsed
+    # on one shared worker pool.
+    def __init__(self, settings_manager, parallel_files: int = None):
+        self.settings_manager = settings_manager
+        self.parallel_files = (parallel_files or settings_manager.get_setting("batch_parallel_files", 0)
+                               or max(2, min(4, os.cpu_count() or 1)))
+        self.cancel_flag = threading.Event()
+        self.metrics = None
+        self._lock = threading.Lock()
+
+    def cancel(self) -> None:
+        # Every job's processor shares this flag, including jobs yet to start
+        self.cancel_flag.set()
+
+    def plan(self, inputs: List[str]) -> Tuple[List[Tuple[str, int]], List[BatchResult]]:
+        # Returns (jobs as (path, size) largest first, results for the inputs
+        # that won't run: duplicates and unreadable files)
+        jobs = []
+        skipped = []
+        seen_paths = {}
+        by_size: Dict[int, List[str]] = {}
+        for path in inputs:
+            real_path = os.path.realpath(path)
+            if real_path in seen_paths:
+                skipped.append(BatchResult(path, None, "duplicate", 0, duplicate_of=seen_paths[real_path]))
+                continue
+            seen_paths[real_path] = path
+            try:
+                size = os.path.getsize(path)
+            except OSError as e:
+                skipped.append(BatchResult(path, None, "failed", 0, error=str(e)))
+                continue
+            by_size.setdefault(size, []).append(path)
+
+        for size, paths in by_size.items():
+            # Only inputs of equal size can be identical, so only those are hashed
+            originals = {}
+            for path in paths:
+                try:
+                    digest = prefix_fingerprint(path, size, full=True) if len(paths) > 1 else None
+                except OSError as e:
+                    skipped.append(BatchResult(path, None, "failed", size, error=str(e)))
+                    continue
+                if digest in originals:
+                    skipped.append(BatchResult(path, None, "duplicate", size, duplicate_of=originals[digest]))
+                else:
+                    originals[digest] = path
+                    jobs.append((path, size))
+
+        jobs.sort(key=lambda job: job[1], reverse=True)
+        return jobs, skipped
+
+    def output_names(self, inputs: List[str]) -> Dict[str, str]:
+        names = {}
+        used = set()
+        for path in inputs:
+            stem, ext = os.path.splitext(os.path.basename(path))
+            base = stem if ext and stem else os.path.basename(path)
+            name = base
+            suffix = 2
+            while name in used:
+                name = f"{base}-{suffix}"
+                suffix += 1
+            used.add(name)
+            names[path] = name
+        return names
+
+    def run(self, inputs: List[str], output_dir: str, create_archive: bool = False, extract: bool = True,
+            progress_callback=None) -> BatchReport:
+        started = time.perf_counter()
+        self.cancel_flag.clear()
+        # One metrics object for the whole batch; its phases are summed over files
+        self.metrics = create_metrics(self.settings_manager)
+        jobs, skipped = self.plan(inputs)
+        job_paths = {path for path, _ in jobs}
+        names = self.output_names([path for path in inputs if path in job_paths])
+        os.makedirs(output_dir, exist_ok=True)
+
+        reporter = as_reporter(progress_callback)
+        reporter.start_phase("batch", max(sum(size for _, size in jobs), 1))
+        progress = {path: 0 for path, _ in jobs}
+
+        def file_progress(path, size):
+            if progress_callback is None:
+                return None
+
+            def update(value):
+                # Each file reports its own percentage; the reporter sees bytes
+                with self._lock:
+                    done = size * value // 100
+                    delta, progress[path] = done - progress[path], done
+                reporter.advance(delta)
+            return update
+
+        use_processes = self.settings_manager.get_setting("execution_mode", "thread") == "process"
+        max_workers = worker_count(self.settings_manager, use_processes)
+        if use_processes:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        # The worker processes serve every file, so their profiles are
+        # collected once for the batch, after the pool has shut down
+        pool_profiler = None
+        if use_processes and profile_mode(self.settings_manager) in ("cprofile", "all"):
+            profile_dir = self.settings_manager.get_setting("profile_dir", None) or output_dir
+            pool_profiler = Profiler("cprofile", profile_dir, "batch")
+
+        print(f"Starting batch of {len(jobs)} files ({len(skipped)} skipped)")
+        with pool_profiler or contextlib.nullcontext(), executor, \
+                concurrent.futures.ThreadPoolExecutor(max_workers=self.parallel_files) as drivers:
+            futures = [drivers.submit(self._run_job, executor, pool_profiler, path, size,
+                                      os.path.join(output_dir, names[path]), create_archive, extract,
+                                      file_progress(path, size))
+                       for path, size in jobs]
+            results = [future.result() for future in futures] + skipped
+
+        order = {path: i for i, path in enumerate(inputs)}
+        results.sort(key=lambda result: order[result.input_path])
+        reporter.end_phase()
+        report = BatchReport(results, time.perf_counter() - started,
+                             self.metrics.to_dict() if self.metrics.enabled else None)
+        export_metrics(self.metrics, self.settings_manager)
+        print(report.summary())
+        return report
+
+    def _run_job(self, executor, pool_profiler, path: str, size: int, target: str, create_archive: bool,
+                 extract: bool, progress_callback) -> BatchResult:
+        if self.cancel_flag.is_set():
+            return BatchResult(path, None, "cancelled", size)
+
+        processor = FileProcessor(self.settings_manager, executor, self.metrics, pool_profiler, self.cancel_flag)
+        started = time.perf_counter()
+        try:
+            if create_archive:
+                output_path = target + processor.archive_extension()
+                processor.process_file_to_zip(path, output_path, extract_dir=target if extract else None,
+                                              progress_callback=progress_callback)
+            else:
+                output_path = target
+                processor.process_large_file(path, target, progress_callback)
+        except Exception as e:
+            return BatchResult(path, None, "failed", size, time.perf_counter() - started, str(e))
+
+        status = "cancelled" if self.cancel_flag.is_set() else "ok"
+        return BatchResult(path, output_path, status, size, time.perf_counter() - started)
@@ -0,0 +1,107 @@
+import threading
+import time
+from typing import List, NamedTuple
+
+DEFAULT_MIN_CHUNK_SIZE = 256 * 1024
+DEFAULT_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+# Chunks parsed faster than this are dominated by per-chunk overhead
+FAST_CHUNK_SECONDS = 0.05
+# Chunks slower than this hold too much memory and delay cancellation
+SLOW_CHUNK_SECONDS = 1.0
+
+
+class ChunkDecision(NamedTuple):
+    chunk_index: int
+    old_size: int
+    new_size: int
+    reason: str
+    throughput: float  # bytes per second over the sample
+    queue_depth: float  # finished chunks waiting for the consumer, on average
+    rss: int
+
+
+class ChunkScheduler:
+    # Picks the size of the next chunk to submit. Every `sample_chunks`
+    # consumed chunks it looks at parse time, overall throughput, how many
+    # finished chunks are waiting on the consumer, and the memory governor,
+    # then doubles, halves or reverts the chunk size within [min, max].
+    def __init__(self, initial_size: int, min_size: int = DEFAULT_MIN_CHUNK_SIZE,
+                 max_size: int = DEFAULT_MAX_CHUNK_SIZE, window: int = 8, governor=None):
+        self.min_size = min(min_size, initial_size)
+        self.max_size = max(max_size, initial_size)
+        self.chunk_size = initial_size
+        self.window = window
+        self.governor = governor
+        self.sample_chunks = max(window // 2, 4)
+        self.decisions: List[ChunkDecision] = []
+
+        self._lock = threading.Lock()
+        self._completed = 0
+        self._consumed = 0
+        self._ceiling = self.max_size
+        self._previous_size = None
+        self._previous_throughput = None
+        self._reset_sample()
+
+    @property
+    def adaptive(self) -> bool:
+        return self.min_size < self.max_size
+
+    def _reset_sample(self) -> None:
+        self._sample_count = 0
+        self._sample_bytes = 0
+        self._sample_parse_seconds = 0.0
+        self._sample_queue_depth = 0
+        self._sample_started = time.perf_counter()
+
+    def on_chunk_done(self, _future) -> None:
+        # Future done-callback; runs on the worker side
+        with self._lock:
+            self._completed += 1
+
+    def record(self, size: int, parse_seconds: float) -> None:
+        with self._lock:
+            self._consumed += 1
+            queue_depth = self._completed - self._consumed
+        if not self.adaptive:
+            return
+        self._sample_count += 1
+        self._sample_bytes += size
+        self._sample_parse_seconds += parse_seconds
+        self._sample_queue_depth += queue_depth
+        if self._sample_count >= self.sample_chunks:
+            self._adjust()
+            self._reset_sample()
+
+    def _adjust(self) -> None:
+        elapsed = max(time.perf_counter() - self._sample_started, 1e-9)
+        throughput = self._sample_bytes / elapsed
+        mean_parse = self._sample_parse_seconds / self._sample_count
+        queue_depth = self._sample_queue_depth / self._sample_count
+        size = self.chunk_size
+
+        if self.governor is not None and self.governor.under_pressure and size > self.min_size:
+            self._decide(size // 2, "memory pressure", throughput, queue_depth)
+        elif (self._previous_size is not None and self._previous_size < size
+              and throughput < self._previous_throughput * 0.9):
+            # The last increase made things slower; go back and stop growing past it
+            self._ceiling = self._previous_size
+            self._decide(self._previous_size, "throughput dropped", throughput, queue_depth)
+        elif mean_parse < FAST_CHUNK_SECONDS and queue_depth < self.window / 2 and size < self._ceiling:
+            self._decide(size * 2, "per-chunk overhead", throughput, queue_depth)
+        elif mean_parse > SLOW_CHUNK_SECONDS and size > self.min_size:
+            self._decide(size // 2, "slow chunks", throughput, queue_depth)
+        else:
+            self._previous_size = None
+        self._previous_throughput = throughput
+
+    def _decide(self, new_size: int, reason: str, throughput: float, queue_depth: float) -> None:
+        new_size = max(self.min_size, min(new_size, self._ceiling, self.max_size))
+        old_size = self.chunk_size
+        if new_size == old_size:
+            self._previous_size = None
+            return
+        rss = self.governor.rss if self.governor is not None else 0
+        self.decisions.append(ChunkDecision(self._consumed, old_size, new_size, reason, throughput, queue_depth, rss))
+        self._previous_size = old_size
+        self.chunk_size = new_size
@@ -0,0 +1,110 @@
+import re
+from typing import Generator, Optional, Tuple
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+_REGEX_METACHARACTERS = set('.^$*+?{}[]|()')
+
+
+def _literal_prefix(pattern: str) -> Optional[str]:
+    # Returns the text a '^'-anchored pattern matches literally, or None when
+    # the pattern uses any real regex syntax.
+    if not pattern.startswith('^'):
+        return None
+    literal = []
+    chars = iter(pattern[1:])
+    for char in chars:
+        if char == '\\':
+            escaped = next(chars, None)
+            if escaped is None or escaped.isalnum():
+                return None
+            literal.append(escaped)
+        elif char in _REGEX_METACHARACTERS:
+            return None
+        else:
+            literal.append(char)
+    return ''.join(literal) or None
+
+
+def _required_prefix(body: str) -> bytes:
+    # The literal bytes every match of the (unanchored) pattern body starts
+    # with, possibly none; used to skip lines that can't match.
+    try:
+        tree = sre_parse.parse(body)
+    except re.error:
+        return b''
+    if tree.state.flags & re.IGNORECASE:
+        return b''
+    literal = []
+    for op, value in tree:
+        if op != sre_parse.LITERAL:
+            break
+        literal.append(chr(value))
+    return ''.join(literal).encode('utf-8')
+
+
+class DelimiterScanner:
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        literal = _literal_prefix(pattern)
+        if literal is not None:
+            self.literal = literal.encode('utf-8')
+            self.regex = None
+        else:
+            # Delimiters are matched per line, so anchor every match to a line
+            # start; each attempt is bounded to its line (see find())
+            body = pattern[1:] if pattern.startswith('^') else pattern
+            self.literal = None
+            self.regex = re.compile(b'^(?:' + body.encode('utf-8') + b')', re.MULTILINE)
+            self.prefix = _required_prefix(body)
+
+    def find(self, buf, start: int, end: int) -> int:
+        # Offset of the first delimiter line starting in [start, end), or -1.
+        if self.literal is not None:
+            literal = self.literal
+            if (start == 0 or buf[start - 1] == 0x0A) and buf[start:start + len(literal)] == literal:
+                return start
+            found = buf.find(b'\n' + literal, start, end)
+            return found + 1 if found != -1 else -1
+
+        # The regex is tried on one line at a time (endpos at the line's end),
+        # so a class such as [^ ]+ or \s can never run on into the following
+        # lines. Lines not starting with the pattern's literal prefix, if it
+        # has one, are skipped with a plain find.
+        prefix = self.prefix
+        line_start = start
+        if line_start > 0 and buf[line_start - 1] != 0x0A:
+            line_start = buf.find(b'\n', line_start, end) + 1 or end
+        while line_start < end:
+            if prefix and buf[line_start:line_start + len(prefix)] != prefix:
+                found = buf.find(b'\n' + prefix, line_start, end)
+                if found == -1:
+                    return -1
+                line_start = found + 1
+            line_end = buf.find(b'\n', line_start, end)
+            if line_end == -1:
+                line_end = end
+            if self.regex.match(buf, line_start, line_end):
+                return line_start
+            line_start = line_end + 1
+        return -1
+
+    def iter_records(self, buf, start: int, end: int) -> Generator[Tuple[int, int, int, int], None, None]:
+        # Yields (header_start, header_end, body_start, body_end) byte offsets
+        # for every record in buf[start:end]. Text before the first delimiter
+        # line is not part of any record.
+        header_start = self.find(buf, start, end)
+        while header_start != -1:
+            header_end = buf.find(b'\n', header_start, end)
+            if header_end == -1:
+                header_end = body_start = end
+            else:
+                body_start = header_end + 1
+
+            next_header = self.find(buf, body_start, end) if body_start < end else -1
+            body_end = end if next_header == -1 else next_header
+            yield header_start, header_end, body_start, body_end
+            header_start = next_header
@@ -2,134 +2,833 @@ import os
 import zipfile
 import threading
 import mmap
-from typing import Dict, Generator
+import collections
+import itertools
+import functools
+import contextlib
+from typing import Callable, Dict, Generator, Iterable, List, Optional, Tuple
 import concurrent.futures
 import tempfile
-import re
-from utils.memory_optimizer import MemoryOptimizer
+import time
+import io
+from core.delimiter_scanner import DelimiterScanner
+from core.record_index import RecordIndex, RecordOffsets, resolve_duplicate_paths
+from core.index_cache import IndexCache, default_cache_dir
+from core.output_writer import DeduplicatingOutputWriter, OutputWriter, content_key
+from core.output_commit import StagedOutput
+from core.quick_preview import DEFAULT_SAMPLE_MB, DEFAULT_SAMPLE_WINDOWS, PreviewEstimate, estimate, sample_offsets
+from core.chunk_scheduler import DEFAULT_MAX_CHUNK_SIZE, DEFAULT_MIN_CHUNK_SIZE, ChunkScheduler
+from core.zip_writer import (
+    COMPRESSION_METHODS, BlockReader, compress_member, compress_member_auto, read_file_blocks, write_precompressed
+)
+from utils.memory_optimizer import MemoryGovernor
+from utils.progress_reporter import as_reporter
+from utils.metrics import Metrics, create_metrics, export_metrics
+from utils.profiler import DEFAULT_SAMPLE_INTERVAL, Profiler, profile_mode
+
+
+ARCHIVE_EXTENSIONS = {"zip": ".zip", "tar.gz": ".tar.gz", "tar.xz": ".tar.xz"}
+
+
+@functools.lru_cache(maxsize=16)
+def _get_scanner(pattern: str) -> DelimiterScanner:
+    return DelimiterScanner(pattern)
+
+
+def _scan_record_offsets(buf, start: int, end: int, scanner: DelimiterScanner) -> List[RecordOffsets]:
+    # Works on raw bytes (an mmap or bytes object); only header lines are
+    # decoded, bodies are reported as byte offsets. A header that isn't valid
+    # UTF-8 gets U+FFFD in place of its bad bytes rather than failing the
+    # chunk and every other record in it.
+    records = []
+    for header_start, header_end, body_start, body_end in scanner.iter_records(buf, start, end):
+        path = buf[header_start:header_end].decode('utf-8', 'replace').strip()
+        if not path:
+            continue
+        if body_end > body_start and buf[body_end - 1] == 0x0A:
+            # The line break before the next delimiter (or chunk end) isn't content
+            body_end -= 1
+        records.append((path, header_start, body_start, body_end))
+    return records
+
+
+def _record_start_after(buf, pos: int, scanner: DelimiterScanner, limit: int = None) -> int:
+    # Offset of the first delimiter line starting at or after pos, or of
+    # `limit` (default: the end of buf) when there is none before it.
+    size = len(buf) if limit is None else min(limit, len(buf))
+    if pos >= size:
+        return size
+    if pos > 0 and buf[pos - 1] != 0x0A:
+        newline = buf.find(b'\n', pos, size)
+        if newline == -1:
+            return size
+        pos = newline + 1
+
+    found = scanner.find(buf, pos, size)
+    return size if found == -1 else found
+
+
+def _scan_records(buf, start: int, end: int, scanner: DelimiterScanner, policy: str = "concat") -> Dict[str, str]:
+    records = _scan_record_offsets(buf, start, end, scanner)
+    grouped = {}
+    for path, (_, _, body_start, body_end) in zip(resolve_duplicate_paths([record[0] for record in records], policy),
+                                                  records):
+        if path is not None:
+            grouped.setdefault(path, []).append(buf[body_start:body_end].decode('utf-8', 'replace'))
+    return {path: '\n'.join(texts) for path, texts in grouped.items()}
+
+
+def _iter_ordered(submit, items: Iterable, window: int, cancel_flag: threading.Event,
+                  throttle: Callable[[], bool] = None):
+    # Yields (item, future) in submission order while keeping at most
+    # `window` futures queued or running. Queued futures are cancelled as
+    # soon as the consumer stops early or cancel_flag is set. While
+    # throttle() is true no new items are taken until the in-flight ones drain.
+    items = iter(items)
+    pending = collections.deque()
+    try:
+        if cancel_flag.is_set():
+            return
+        for item in itertools.islice(items, window):
+            pending.append((item, submit(item)))
+
+        while pending:
+            if cancel_flag.is_set():
+                return
+
+            item, future = pending.popleft()
+            top_up = window - len(pending)
+            if throttle is not None and throttle():
+                top_up = 0 if pending else 1
+            for next_item in itertools.islice(items, top_up):
+                pending.append((next_item, submit(next_item)))
+
+            yield item, future
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
+def _completed_future(result) -> concurrent.futures.Future:
+    future = concurrent.futures.Future()
+    future.set_result(result)
+    return future
+
+
+def _timed_call(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+# Per-process mmaps of recent inputs, reused across the ranges a pool worker
+# gets: path -> (file identity, mmap). A pool shared by a batch sees every
+# input, so only the most recently used few stay open.
+_WORKER_MMAP_LIMIT = 4
+_worker_mmaps = collections.OrderedDict()
+
+
+def _worker_mmap(file_path: str):
+    stat = os.stat(file_path)
+    identity = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    cached = _worker_mmaps.pop(file_path, None)
+    if cached is not None:
+        if cached[0] == identity:
+            _worker_mmaps[file_path] = cached
+            return cached[1]
+        cached[1].close()  # the input was replaced or changed
+
+    with open(file_path, 'rb') as file:
+        mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    _worker_mmaps[file_path] = (identity, mm)
+    while len(_worker_mmaps) > _WORKER_MMAP_LIMIT:
+        _, (_, oldest) = _worker_mmaps.popitem(last=False)
+        oldest.close()
+    return mm
+
+
+def _process_file_range(file_path: str, start: int, end: int, delimiter_pattern: str) -> List[RecordOffsets]:
+    # Runs inside a ProcessPoolExecutor worker: only the path and the byte
+    # range are pickled, the data itself is read from the worker's own mmap.
+    return _scan_record_offsets(_worker_mmap(file_path), start, end, _get_scanner(delimiter_pattern))
+
+
+def worker_count(settings_manager, use_processes: bool) -> int:
+    count = settings_manager.get_setting("worker_count", 0)
+    if count:
+        return max(1, int(count))
+    if use_processes:
+        return os.cpu_count() or 1
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+def _entry_point(output_param: str = None):
+    # Top-level calls: total time, GC pauses and OS counters, and a profile
+    # of the run (written beside its output) when profiling is enabled. A
+    # processor with its own metrics starts them afresh for every call and
+    # exports them when it returns; shared metrics are the owner's to export.
+    def decorate(method):
+        # Position of output_param among the positional arguments after self
+        code = method.__code__
+        position = code.co_varnames[:code.co_argcount].index(output_param) - 1 if output_param else None
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            output_dir = None
+            if output_param:
+                output_dir = args[position] if position < len(args) else kwargs.get(output_param)
+                if output_dir and output_param == "output_file":
+                    output_dir = os.path.dirname(os.path.abspath(output_dir))
+            outermost = self._entry_depth == 0
+            if outermost and self._owns_cancel_flag:
+                self.cancel_flag.clear()
+            if outermost and self._owns_metrics:
+                self.metrics.reset()
+            self._entry_depth += 1
+            try:
+                with self.metrics.run(), self._profiling(method.__name__, output_dir):
+                    result = method(self, *args, **kwargs)
+            finally:
+                self._entry_depth -= 1
+            if outermost and self._owns_metrics:
+                export_metrics(self.metrics, self.settings_manager)
+            return result
+        return wrapper
+    return decorate
+
 
 class FileProcessor:
-    def __init__(self, settings_manager):
+    def __init__(self, settings_manager, executor: concurrent.futures.Executor = None, metrics: Metrics = None,
+                 pool_profiler: Profiler = None, cancel_flag: threading.Event = None):
+        # A shared executor (e.g. from the batch scheduler) is used for chunk
+        # parsing instead of a pool per file, and is never shut down here.
+        # Likewise a shared metrics object collects the figures of several runs.
+        # Worker processes of a shared pool outlive each run, so they are
+        # profiled by the pool's owner (pool_profiler), if at all.
         self.settings_manager = settings_manager
-        self.cancel_flag = threading.Event()
+        self.executor = executor
+        self.metrics = metrics if metrics is not None else create_metrics(settings_manager)
+        self._owns_metrics = metrics is None
+        self._entry_depth = 0
+        self.profiler = None
+        self.pool_profiler = pool_profiler
+        # A shared cancel_flag is cleared by its owner only, so a cancel that
+        # arrives before a run starts isn't lost
+        self.cancel_flag = cancel_flag if cancel_flag is not None else threading.Event()
+        self._owns_cancel_flag = cancel_flag is None
         self.delimiter_pattern = self.settings_manager.get_setting("delimiter_pattern", r'^/project_root/')
+        self.chunk_scheduler = None
+        self.failed_chunks = 0
 
+    @_entry_point()
     def process_file(self, file_path: str, progress_callback=None) -> Dict[str, str]:
-        self.cancel_flag.clear()
         print(f"Starting to process file: {file_path}")
-        
-        file_structure = {}
-        total_size = os.path.getsize(file_path)
-        processed_size = 0
 
         try:
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future_to_chunk = {executor.submit(self._process_chunk, chunk): chunk 
-                                   for chunk in self._read_file_chunks(file_path)}
-                
-                for future in concurrent.futures.as_completed(future_to_chunk):
-                    if self.cancel_flag.is_set():
-                        print("File processing cancelled")
-                        return {}
-                    
-                    chunk = future_to_chunk[future]
-                    try:
-                        chunk_structure = future.result()
-                        file_structure.update(chunk_structure)
-                    except Exception as exc:
-                        print(f"Error processing chunk: {str(exc)}")
-                    
-                    processed_size += len(chunk)
-                    if progress_callback:
-                        progress_callback(int(processed_size / total_size * 100))
-
-                    MemoryOptimizer.optimize()
+            with self.index_file(file_path, progress_callback) as index:
+                if self.cancel_flag.is_set():
+                    print("File processing cancelled")
+                    return {}
+                with self.metrics.span("decode"):
+                    return index.to_dict(self._duplicate_policy())
 
         except Exception as e:
             print(f"Error processing file: {str(e)}")
             raise
 
-        return file_structure
+    def index_file(self, file_path: str, progress_callback=None) -> RecordIndex:
+        # The returned index keeps the source mmapped; close it (or use it as a
+        # context manager) once its content is no longer needed.
+        progress = as_reporter(progress_callback)
+        index_cache = self._get_index_cache()
+        index, resume_offset = self._load_cached_index(index_cache, file_path)
+        if index is not None and resume_offset is None:
+            print(f"Using cached index for: {file_path}")
+            progress.start_phase("parse")
+            progress.end_phase()
+            return index
+
+        if index is None:
+            index, resume_offset = RecordIndex(file_path), 0
+        progress.start_phase("parse", max(os.path.getsize(file_path) - resume_offset, 1))
+
+        try:
+            for (start, end), records in self._iter_chunk_results(index, start_offset=resume_offset):
+                index.extend(records)
+                progress.advance(end - start, len(records))
+        except Exception:
+            index.close()
+            raise
+
+        self._store_index(index_cache, index)
+        progress.end_phase()
+        return index
+
+    def quick_preview(self, file_path: str, delimiter_pattern: str = None) -> PreviewEstimate:
+        # Parses only a sample of the file (its head, or evenly spaced windows
+        # aligned to record boundaries) and extrapolates to the whole file.
+        started = time.perf_counter()
+        scanner = _get_scanner(delimiter_pattern or self.delimiter_pattern)
+        sample_bytes = int(self.settings_manager.get_setting("preview_sample_mb", DEFAULT_SAMPLE_MB) * 1024 * 1024)
+        windows = self.settings_manager.get_setting("preview_sample_windows", DEFAULT_SAMPLE_WINDOWS)
+
+        records = []
+        sampled_bytes = 0
+        with RecordIndex(file_path) as index:
+            mm = index.buffer
+            file_size = len(mm)
+            previous_end = 0
+            for window_start, window_end in sample_offsets(file_size, sample_bytes, windows):
+                window_start = max(window_start, previous_end)
+                if window_start >= window_end:
+                    continue
+                start = window_start
+                if start > 0:
+                    start = _record_start_after(mm, start, scanner, window_end)
+                if start >= window_end:
+                    # No record starts here: every byte belongs to a longer record
+                    sampled_bytes += window_end - window_start
+                    continue
+                # Let the last record in the window finish, within reason
+                end = _record_start_after(mm, window_end, scanner, window_end + (window_end - start))
+                records.extend(_scan_record_offsets(mm, start, end, scanner))
+                sampled_bytes += end - start
+                previous_end = end
+
+        return estimate(file_size, sampled_bytes, records, time.perf_counter() - started)
+
+    @contextlib.contextmanager
+    def _profiling(self, name: str, output_dir: str = None):
+        # Dumps go to the profile_dir setting, else beside the output, else
+        # the working directory. Nested entry points share the outer profile.
+        mode = profile_mode(self.settings_manager)
+        if mode == "off" or self.profiler is not None:
+            yield None
+            return
+        output_dir = self.settings_manager.get_setting("profile_dir", None) or output_dir or os.getcwd()
+        interval = self.settings_manager.get_setting("profile_sample_interval", DEFAULT_SAMPLE_INTERVAL)
+        with Profiler(mode, output_dir, name, interval) as profiler:
+            self.profiler = profiler
+            try:
+                yield profiler
+            finally:
+                self.profiler = None
+
+    def _get_index_cache(self):
+        if not self.settings_manager.get_setting("index_cache_enabled", True):
+            return None
+        cache_dir = self.settings_manager.get_setting("index_cache_dir", None) or default_cache_dir()
+        return IndexCache(cache_dir, self.settings_manager.get_setting("index_cache_max_mb", 256),
+                          self.settings_manager.get_setting("incremental_full_verify", False))
+
+    def _load_cached_index(self, index_cache, file_path: str) -> Tuple[Optional[RecordIndex], Optional[int]]:
+        # Returns (index, None) for an up-to-date cache entry, (index, offset)
+        # when only the tail starting at offset needs scanning, or (None, None).
+        if index_cache is None:
+            return None, None
+        index = index_cache.load(file_path, self.delimiter_pattern)
+        if index is not None:
+            return index, None
+        if self.settings_manager.get_setting("incremental_indexing", True):
+            appended = index_cache.load_appended(file_path, self.delimiter_pattern)
+            if appended is not None:
+                print(f"Resuming index of appended file at byte {appended[1]}: {file_path}")
+                return appended
+        return None, None
+
+    def _store_index(self, index_cache, index: RecordIndex) -> None:
+        if index_cache is None or self.cancel_flag.is_set():
+            return
+        if self.failed_chunks:
+            # The index is missing those chunks' records; caching it would
+            # hide them from every later run
+            print(f"Not caching index: {self.failed_chunks} chunk(s) failed")
+            return
+        try:
+            index_cache.store(index, self.delimiter_pattern)
+        except OSError as e:
+            print(f"Error caching index: {str(e)}")
+
+    def _iter_chunk_results(self, index: RecordIndex, chunk_size: int = None, start_offset: int = 0
+                            ) -> Generator[Tuple[Tuple[int, int], List[RecordOffsets]], None, None]:
+        # Streams chunk results in file order while keeping at most `window`
+        # chunks queued or running, so memory stays bounded by the window
+        # rather than by the file size. A chunk that fails yields no records;
+        # once every chunk has been tried the run fails as a whole, so no
+        # caller can mistake the partial result for the file's content.
+        if self.executor is not None:
+            use_processes = isinstance(self.executor, concurrent.futures.ProcessPoolExecutor)
+        else:
+            use_processes = self.settings_manager.get_setting("execution_mode", "thread") == "process"
+        max_workers = self._worker_count(use_processes)
+        window = max_workers * 2
+        governor = self._create_memory_governor()
+        scheduler = self._create_chunk_scheduler(chunk_size, window, governor)
+        self.chunk_scheduler = scheduler
+        self.failed_chunks = 0
+        first_error = None
+
+        mm = index.buffer
+        file_path = index.source_path
+        executor = self.executor
+        profiler = self.pool_profiler if use_processes and self.executor is not None else self.profiler
+        task = _timed_call if profiler is None else profiler.wrap(_timed_call, use_processes)
+        if use_processes:
+            executor = executor or concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+            submit_range = lambda chunk_range: executor.submit(
+                task, _process_file_range, file_path, *chunk_range, self.delimiter_pattern)
+        else:
+            executor = executor or concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+            submit_range = lambda chunk_range: executor.submit(task, self._process_range, mm, *chunk_range)
+
+        metrics = self.metrics
+        metrics.gauge("chunk_size", scheduler.chunk_size)
+        in_flight = set()
+        in_flight_lock = threading.Lock()
+
+        def forget(future):
+            with in_flight_lock:
+                in_flight.discard(future)
+
+        def submit(chunk_range):
+            future = submit_range(chunk_range)
+            with in_flight_lock:
+                in_flight.add(future)
+            future.add_done_callback(forget)
+            future.add_done_callback(scheduler.on_chunk_done)
+            return future
+
+        try:
+            ranges = self._chunk_ranges(mm, chunk_size, start_offset, scheduler)
+            for chunk_range, future in _iter_ordered(submit, ranges, window, self.cancel_flag, governor.check):
+                try:
+                    with metrics.span("wait"):
+                        records, parse_seconds = future.result()
+                except Exception as exc:
+                    print(f"Error processing chunk: {str(exc)}")
+                    records, parse_seconds = [], 0.0
+                    self.failed_chunks += 1
+                    first_error = first_error or exc
+                    metrics.count("failed_chunks")
+
+                chunk_bytes = chunk_range[1] - chunk_range[0]
+                metrics.add_time("scan", parse_seconds)
+                metrics.count("chunks")
+                metrics.count("bytes", chunk_bytes)
+                metrics.count("records", len(records))
+
+                decision_count = len(scheduler.decisions)
+                scheduler.record(chunk_bytes, parse_seconds)
+                for decision in scheduler.decisions[decision_count:]:
+                    print(f"Chunk size {decision.old_size} -> {decision.new_size} bytes ({decision.reason})")
+                    metrics.count("chunk_size_changes")
+                    metrics.gauge("chunk_size", decision.new_size)
+
+                yield chunk_range, records
+
+            if self.failed_chunks:
+                raise RuntimeError(f"{self.failed_chunks} chunk(s) of {file_path} failed to parse: "
+                                   f"{first_error}") from first_error
+        finally:
+            # Queued chunks were already cancelled; wait only for the ones
+            # still running, since they read from the mmap.
+            if self.executor is None:
+                executor.shutdown(wait=True)
+            else:
+                with in_flight_lock:
+                    running = list(in_flight)
+                concurrent.futures.wait(running)
+
+    def _create_chunk_scheduler(self, chunk_size: Optional[int], window: int,
+                                governor: MemoryGovernor) -> ChunkScheduler:
+        # An explicit chunk_size pins the size; otherwise the setting is only
+        # the starting point unless adaptive sizing is turned off.
+        if chunk_size is not None or not self.settings_manager.get_setting("adaptive_chunk_size", True):
+            chunk_size = chunk_size or self.settings_manager.get_setting("chunk_size", 1024*1024)
+            return ChunkScheduler(chunk_size, chunk_size, chunk_size, window, governor)
+        return ChunkScheduler(self.settings_manager.get_setting("chunk_size", 1024*1024),
+                              self.settings_manager.get_setting("min_chunk_size", DEFAULT_MIN_CHUNK_SIZE),
+                              self.settings_manager.get_setting("max_chunk_size", DEFAULT_MAX_CHUNK_SIZE),
+                              window, governor)
+
+    def _create_memory_governor(self) -> MemoryGovernor:
+        return MemoryGovernor(self.settings_manager.get_setting("memory_high_water_mb", 0),
+                              self.settings_manager.get_setting("memory_sample_interval", 0.5))
+
+    def _worker_count(self, use_processes: bool) -> int:
+        return worker_count(self.settings_manager, use_processes)
+
+    def _process_range(self, mm, start: int, end: int) -> List[RecordOffsets]:
+        return _scan_record_offsets(mm, start, end, _get_scanner(self.delimiter_pattern))
 
     def _read_file_chunks(self, file_path: str, chunk_size: int = 1024*1024) -> Generator[str, None, None]:
-        with open(file_path, 'r') as file:
+        with open(file_path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return
             with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
-                for i in range(0, len(mm), chunk_size):
-                    yield mm[i:i+chunk_size].decode('utf-8')
+                for start, end in self._chunk_ranges(mm, chunk_size):
+                    yield mm[start:end].decode('utf-8', 'replace')
 
-    def _process_chunk(self, chunk: str) -> Dict[str, str]:
-        chunk_structure = {}
-        lines = chunk.split('\n')
-        current_file = None
-        current_content = []
-
-        for line in lines:
-            if re.match(self.delimiter_pattern, line):
-                if current_file:
-                    chunk_structure[current_file] = '\n'.join(current_content)
-                current_file = line.strip()
-                current_content = []
-            else:
-                current_content.append(line)
+    def _chunk_ranges(self, mm, chunk_size: int, start: int = 0,
+                      scheduler: ChunkScheduler = None) -> Generator[Tuple[int, int], None, None]:
+        # Every range after the first starts on a delimiter line, so each one
+        # holds whole records and can be parsed independently of its neighbours.
+        # With a scheduler, each range takes whatever size it currently picks.
+        size = len(mm)
+        while start < size:
+            end = self._next_record_start(mm, start + (scheduler.chunk_size if scheduler else chunk_size))
+            yield start, end
+            start = end
 
-        if current_file:
-            chunk_structure[current_file] = '\n'.join(current_content)
+    def _next_record_start(self, mm, pos: int) -> int:
+        return _record_start_after(mm, pos, _get_scanner(self.delimiter_pattern))
 
-        return chunk_structure
+    def _process_chunk(self, chunk: str) -> Dict[str, str]:
+        with self.metrics.span("scan"):
+            data = chunk.encode('utf-8')
+            return _scan_records(data, 0, len(data), _get_scanner(self.delimiter_pattern), self._duplicate_policy())
 
+    @_entry_point("output_file")
     def create_zip_archive(self, directory: str, output_file: str, progress_callback=None):
         print(f"Creating ZIP archive: {output_file}")
-        total_files = sum([len(files) for _, _, files in os.walk(directory)])
-        processed_files = 0
+        members = []
+        for root, _, files in os.walk(directory):
+            for file in files:
+                file_path = os.path.join(root, file)
+                try:
+                    zinfo = zipfile.ZipInfo.from_file(file_path, os.path.relpath(file_path, directory))
+                except OSError as e:
+                    print(f"Error adding file to ZIP: {str(e)}")
+                    continue
+                members.append((zinfo, functools.partial(read_file_blocks, file_path)))
+
+        self._write_zip(output_file, members, progress_callback)
+
+    @_entry_point("output_file")
+    def process_file_to_zip(self, file_path: str, output_file: str, extract_dir: str = None,
+                            progress_callback=None) -> None:
+        # Parse -> archive without an intermediate directory tree: members are
+        # compressed straight from the mmapped input. The tree is only written
+        # when extract_dir is given, staged and published like
+        # process_large_file's output.
+        print(f"Processing file to ZIP archive: {file_path}")
+        progress = as_reporter(progress_callback)
+        if extract_dir:
+            progress.plan(parse=(0, 30), write=(30, 20), zip=(50, 50))
+        else:
+            progress.plan(parse=(0, 30), zip=(30, 70))
+
+        with self.index_file(file_path, progress) as index:
+            if self.cancel_flag.is_set():
+                print("File processing cancelled")
+                return
+
+            if extract_dir:
+                with StagedOutput(extract_dir, self._worker_count(False)) as staged:
+                    self.write_index(index, staged.staging_dir, progress)
+                    if self.cancel_flag.is_set():
+                        print("File processing cancelled")
+                        return
+                    with self.metrics.span("merge"):
+                        staged.commit()
+
+            self.create_zip_from_index(index, output_file, progress)
+
+    def create_zip_from_index(self, index: RecordIndex, output_file: str, progress_callback=None):
+        print(f"Creating ZIP archive: {output_file}")
+        date_time = time.localtime()[:6]
+        members = []
+        for path, record_ids in self._group_records(index).items():
+            zinfo = zipfile.ZipInfo(path.lstrip('/'), date_time=date_time)
+            zinfo.file_size = sum(index.content_size(i) + 1 for i in record_ids)
+            members.append((zinfo, functools.partial(self._record_blocks, index, record_ids)))
+
+        self._write_zip(output_file, members, progress_callback)
+
+    def _record_blocks(self, index: RecordIndex, record_ids: List[int]):
+        for i in record_ids:
+            with index.content(i) as content:
+                yield content
+            yield b'\n'
+
+    def archive_extension(self) -> str:
+        archive_format = self.settings_manager.get_setting("archive_format", "zip")
+        return ARCHIVE_EXTENSIONS.get(archive_format, ".zip")
+
+    def _compression_level(self):
+        level = self.settings_manager.get_setting("compression_level", None)
+        return None if level is None else min(max(int(level), 1), 9)
+
+    def _write_zip(self, output_file: str, members: List[Tuple[zipfile.ZipInfo, Callable]], progress_callback=None):
+        archive_format = self.settings_manager.get_setting("archive_format", "zip")
+        if archive_format in ("tar.gz", "tar.xz"):
+            self._write_tar(output_file, members, archive_format, progress_callback)
+            return
+
+        # Members are compressed concurrently into spooled buffers, then a
+        # single writer appends them to the archive in their original order.
+        compression = self.settings_manager.get_setting("compression", "deflate")
+        compresslevel = self._compression_level()
+        compress_type = COMPRESSION_METHODS.get(compression, zipfile.ZIP_DEFLATED)
+        progress = as_reporter(progress_callback)
+        progress.start_phase("zip", sum(zinfo.file_size for zinfo, _ in members))
+        max_workers = self.settings_manager.get_setting("worker_count", 0) or os.cpu_count() or 1
+
+        def compress(member):
+            zinfo, blocks_factory = member
+            with self.metrics.span("compress"):
+                if compression == "auto":
+                    return compress_member_auto(blocks_factory, zinfo.filename, zinfo.file_size, compresslevel)
+                return compress_type, compress_member(blocks_factory(), compress_type, compresslevel)
+
+        # With deduplication, a member that shares its size with another is
+        # hashed by the task that compresses it, right before compressing,
+        # while its data is still cached (there is no separate hashing pass).
+        # The first member with a given content compresses it and the others
+        # only hash theirs and take that payload; payloads are kept until the
+        # last member of their size has been written.
+        candidates = self._dedup_candidates(members)
+        left = collections.Counter(zinfo.file_size for (zinfo, _), candidate in zip(members, candidates) if candidate)
+        payloads = {}
+        payloads_lock = threading.Lock()
+
+        def compress_once(item):
+            member, candidate = item
+            if not candidate:
+                return True, _completed_future(compress(member))
+            zinfo, blocks_factory = member
+            with self.metrics.span("hash"):
+                key = content_key(blocks_factory())
+            with payloads_lock:
+                group = payloads.setdefault(zinfo.file_size, {})
+                payload = group.get(key)
+                first = payload is None
+                if first:
+                    payload = group[key] = concurrent.futures.Future()
+            if first:
+                try:
+                    payload.set_result(compress(member))
+                except Exception as e:
+                    payload.set_exception(e)
+            return first, payload
+
+        def release(size):
+            with payloads_lock:
+                group = payloads.pop(size, {})
+            for payload in group.values():
+                if payload.done() and payload.exception() is None:
+                    payload.result()[1].payload.close()
 
         try:
-            with zipfile.ZipFile(output_file, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for root, _, files in os.walk(directory):
-                    for file in files:
-                        if self.cancel_flag.is_set():
-                            print("ZIP creation cancelled")
-                            return
+            with zipfile.ZipFile(output_file, 'w', compress_type) as zipf, \
+                    concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                submit = lambda item: executor.submit(compress_once, item)
+                for (member, candidate), future in _iter_ordered(submit, zip(members, candidates), max_workers * 2,
+                                                                 self.cancel_flag):
+                    zinfo = member[0]
+                    pooled = False
+                    try:
+                        first, payload = future.result()
+                        if payload.exception() is None:
+                            result, pooled = payload.result(), candidate
+                        elif first:
+                            raise payload.exception()
+                        else:
+                            # The first copy failed to compress
+                            result = compress(member)
+                        if not first:
+                            self.metrics.count("deduplicated_members")
+                            self.metrics.count("deduplicated_bytes", zinfo.file_size)
+                        member_compress_type, compressed = result
 
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, directory)
-                        
                         try:
-                            zipf.write(file_path, arcname)
-                        except Exception as e:
-                            print(f"Error adding file to ZIP: {str(e)}")
-                        
-                        processed_files += 1
-                        if progress_callback:
-                            progress_callback(int(processed_files / total_files * 100))
+                            with self.metrics.span("zip"):
+                                compressed.payload.seek(0)
+                                zinfo.compress_type = member_compress_type
+                                write_precompressed(zipf, zinfo, compressed)
+                        finally:
+                            if not pooled:
+                                compressed.payload.close()
+                        self.metrics.count("members")
+                        progress.advance(compressed.file_size, 1)
+                    except Exception as e:
+                        print(f"Error adding file to ZIP: {str(e)}")
+                    finally:
+                        if candidate:
+                            left[zinfo.file_size] -= 1
+                            if not left[zinfo.file_size]:
+                                release(zinfo.file_size)
 
         except Exception as e:
             print(f"Error creating ZIP archive: {str(e)}")
             raise
+        finally:
+            for size in list(payloads):
+                release(size)
+
+        if self.cancel_flag.is_set():
+            print("ZIP creation cancelled")
+            return
+
+        progress.end_phase()
 
         print(f"ZIP archive created successfully: {output_file}")
 
+    def _write_tar(self, output_file: str, members: List[Tuple[zipfile.ZipInfo, Callable]], archive_format: str,
+                   progress_callback=None):
+        # A tarball is one compressed stream, so members are written serially
+        import gzip
+        import lzma
+        import tarfile  # only needed for tar output; kept off the start-up path
+
+        compresslevel = self._compression_level()
+        progress = as_reporter(progress_callback)
+        progress.start_phase("zip", sum(zinfo.file_size for zinfo, _ in members))
+        # Members with the same content as an earlier one become hardlink
+        # entries; each is hashed just before it's written
+        candidates = self._dedup_candidates(members)
+        first_names = {}
+
+        try:
+            with open(output_file, 'wb') as raw_file:
+                if archive_format == "tar.xz":
+                    compressed_file = lzma.LZMAFile(raw_file, 'wb', preset=compresslevel or 6)
+                else:
+                    compressed_file = gzip.GzipFile(fileobj=raw_file, mode='wb', compresslevel=compresslevel or 6)
+                with compressed_file, tarfile.open(fileobj=compressed_file, mode='w|') as tar:
+                    for (zinfo, blocks_factory), candidate in zip(members, candidates):
+                        if self.cancel_flag.is_set():
+                            print("Archive creation cancelled")
+                            return
+
+                        key = None
+                        if candidate:
+                            with self.metrics.span("hash"):
+                                key = content_key(blocks_factory())
+
+                        tarinfo = tarfile.TarInfo(zinfo.filename)
+                        tarinfo.size = zinfo.file_size
+                        tarinfo.mtime = int(time.mktime(zinfo.date_time + (0, 0, -1)))
+                        tarinfo.mode = (zinfo.external_attr >> 16) & 0o777 or 0o644
+                        if key in first_names:
+                            tarinfo.type = tarfile.LNKTYPE
+                            tarinfo.linkname = first_names[key]
+                            tarinfo.size = 0
+                            tar.addfile(tarinfo)
+                            self.metrics.count("deduplicated_members")
+                            self.metrics.count("deduplicated_bytes", zinfo.file_size)
+                        else:
+                            with BlockReader(blocks_factory()) as reader, self.metrics.span("zip"):
+                                tar.addfile(tarinfo, io.BufferedReader(reader, 1024 * 1024))
+                            if key is not None:
+                                first_names[key] = zinfo.filename
+                        self.metrics.count("members")
+
+                        progress.advance(zinfo.file_size, 1)
+
+        except Exception as e:
+            print(f"Error creating archive: {str(e)}")
+            raise
+
+        progress.end_phase()
+
+        print(f"Archive created successfully: {output_file}")
+
+    def write_index(self, index: RecordIndex, output_dir: str, progress_callback=None,
+                    writer: OutputWriter = None) -> None:
+        if writer is None:
+            with self._create_output_writer(output_dir) as writer:
+                self.write_index(index, output_dir, progress_callback, writer)
+            self._count_deduplicated(writer)
+            return
+
+        progress = as_reporter(progress_callback)
+        total_records = len(index)
+        paths = resolve_duplicate_paths(index.paths, self._duplicate_policy())
+        progress.start_phase("write", os.path.getsize(index.source_path))
+        for first in range(0, total_records, 1000):
+            if self.cancel_flag.is_set():
+                print("Writing records cancelled")
+                return
+
+            last = min(first + 1000, total_records)
+            self._write_records(index, range(first, last), writer, paths)
+            end = index.body_ends[last - 1] if last < total_records else progress.total_bytes
+            progress.advance(end - progress.bytes_done, last - first)
+        progress.end_phase()
+
+    def _create_output_writer(self, output_dir: str) -> OutputWriter:
+        writer_class = OutputWriter
+        if self.settings_manager.get_setting("deduplicate_output", False):
+            writer_class = DeduplicatingOutputWriter
+        return writer_class(output_dir,
+                            self.settings_manager.get_setting("max_open_output_files", None),
+                            self.settings_manager.get_setting("output_buffer_kb", 64) * 1024)
+
+    def _dedup_candidates(self, members: List[Tuple[zipfile.ZipInfo, Callable]]) -> List[bool]:
+        # Archive members that may have a twin when deduplicating: only those
+        # sharing their size with another member need hashing
+        if not self.settings_manager.get_setting("deduplicate_output", False):
+            return [False] * len(members)
+        sizes = collections.Counter(zinfo.file_size for zinfo, _ in members)
+        return [sizes[zinfo.file_size] > 1 for zinfo, _ in members]
+
+    def _count_deduplicated(self, writer: OutputWriter) -> None:
+        if isinstance(writer, DeduplicatingOutputWriter):
+            self.metrics.count("deduplicated_files", writer.linked_files)
+            self.metrics.count("deduplicated_bytes", writer.linked_bytes)
+
+    def _duplicate_policy(self) -> str:
+        return self.settings_manager.get_setting("duplicate_paths", "concat")
+
+    def _group_records(self, index: RecordIndex) -> Dict[str, List[int]]:
+        return index.group(self._duplicate_policy())
+
+    @_entry_point("output_dir")
     def process_large_file(self, file_path: str, output_dir: str, progress_callback=None) -> None:
         print(f"Processing large file: {file_path}")
-        total_size = os.path.getsize(file_path)
-        processed_size = 0
+        progress = as_reporter(progress_callback)
+        index_cache = None
+        if self._duplicate_policy() == "concat":
+            # Records are written as they are parsed
+            progress.plan(parse=(0, 95), write=(0, 95), merge=(95, 5))
+            index_cache = self._get_index_cache()
+            index, resume_offset = self._load_cached_index(index_cache, file_path)
+            if index is None:
+                index, resume_offset = RecordIndex(file_path), 0
+        else:
+            # Which record keeps a path (or what it is renamed to) can depend
+            # on records further on, so the whole file is indexed first
+            progress.plan(parse=(0, 45), write=(45, 50), merge=(95, 5))
+            index, resume_offset = self.index_file(file_path, progress), None
 
         try:
-            with tempfile.TemporaryDirectory() as temp_dir:
-                for chunk in self._read_file_chunks(file_path):
-                    if self.cancel_flag.is_set():
-                        print("Large file processing cancelled")
-                        return
+            with index, StagedOutput(output_dir, self._worker_count(False)) as staged:
+                with self._create_output_writer(staged.staging_dir) as writer:
+                    if len(index):
+                        # Offsets of these records are already known; no need to rescan them
+                        self.write_index(index, staged.staging_dir,
+                                         progress if resume_offset is None else None, writer)
 
-                    chunk_structure = self._process_chunk(chunk)
-                    self._write_chunk_to_temp(chunk_structure, temp_dir)
+                    if resume_offset is not None:
+                        progress.start_phase("parse", max(os.path.getsize(file_path) - resume_offset, 1))
+                        for (start, end), records in self._iter_chunk_results(index, start_offset=resume_offset):
+                            first = len(index)
+                            index.extend(records)
+                            self._write_records(index, range(first, len(index)), writer)
+                            progress.advance(end - start, len(records))
 
-                    processed_size += len(chunk)
-                    if progress_callback:
-                        progress_callback(int(processed_size / total_size * 100))
+                        self._store_index(index_cache, index)
+                self._count_deduplicated(writer)
 
-                    MemoryOptimizer.optimize()
+                if self.cancel_flag.is_set():
+                    print("Large file processing cancelled")
+                    return
 
-                self._merge_temp_files(temp_dir, output_dir)
+                progress.start_phase("merge")
+                with self.metrics.span("merge"):
+                    staged.commit()
+                progress.end_phase()
 
         except Exception as e:
             print(f"Error processing large file: {str(e)}")
@@ -137,19 +836,17 @@ class FileProcessor:
 
         print(f"Large file processed successfully")
 
-    def _write_chunk_to_temp(self, chunk_structure: Dict[str, str], temp_dir: str) -> None:
-        for file_path, content in chunk_structure.items():
-            temp_file_path = os.path.join(temp_dir, file_path.lstrip('/'))
-            os.makedirs(os.path.dirname(temp_file_path), exist_ok=True)
-            with open(temp_file_path, 'a') as f:
-                f.write(content + '\n')
-
-    def _merge_temp_files(self, temp_dir: str, output_dir: str) -> None:
-        for root, _, files in os.walk(temp_dir):
-            for file in files:
-                temp_file_path = os.path.join(root, file)
-                relative_path = os.path.relpath(temp_file_path, temp_dir)
-                output_file_path = os.path.join(output_dir, relative_path)
-                
-                os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
-                os.rename(temp_file_path, output_file_path)
+    def _write_records(self, index: RecordIndex, record_ids: Iterable[int], writer: OutputWriter,
+                       paths: List[Optional[str]] = None) -> None:
+        # paths: output path per record (None to skip it), default the record's own
+        if paths is None:
+            paths = index.paths
+        written = 0
+        with self.metrics.span("write"):
+            for i in record_ids:
+                if paths[i] is None:
+                    continue
+                with index.content(i) as content:
+                    writer.write(paths[i].lstrip('/'), (content, b'\n'))
+                written += 1
+        self.metrics.count("records_written", written)
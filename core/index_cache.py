@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import struct
+import hashlib
+import tempfile
+import concurrent.futures
+from array import array
+from typing import Optional, Tuple
+from core.record_index import RecordIndex
+
+_MAGIC = b'TFAIDX1\0'
+_HEADER = struct.Struct('<I')
+_PATHS_HEADER = struct.Struct('<Q')
+_EDGE_BYTES = 64 * 1024
+_SAMPLE_BYTES = 4 * 1024
+_SAMPLE_COUNT = 16
+_BLOCK_SIZE = 1024 * 1024
+_BLOCK_DIGEST_SIZE = 16
+
+
+def prefix_fingerprint(source_path: str, length: int, full: bool = False) -> str:
+    # Hash of the first `length` bytes of a file. The sampled variant reads
+    # both edges plus a fixed number of windows, so it costs the same however
+    # large the file is, but it can't see edits between the windows.
+    digest = hashlib.sha256(str(length).encode('ascii'))
+    with open(source_path, 'rb') as f:
+        if full or length <= 2 * _EDGE_BYTES + _SAMPLE_COUNT * _SAMPLE_BYTES:
+            remaining = length
+            while remaining > 0:
+                block = f.read(min(remaining, 1024 * 1024))
+                if not block:
+                    break
+                digest.update(block)
+                remaining -= len(block)
+        else:
+            windows = [(0, _EDGE_BYTES), (length - _EDGE_BYTES, _EDGE_BYTES)]
+            step = (length - 2 * _EDGE_BYTES) // (_SAMPLE_COUNT + 1)
+            windows += [(_EDGE_BYTES + step * (i + 1), _SAMPLE_BYTES) for i in range(_SAMPLE_COUNT)]
+            for offset, size in windows:
+                f.seek(offset)
+                digest.update(f.read(size))
+    return digest.hexdigest()
+
+
+def default_cache_dir() -> str:
+    # Per user, so the cache doesn't depend on (or litter) the directory a
+    # command happens to run from
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'text_analyzer', 'index_cache')
+
+
+def _block_digest(fd: int, offset: int, size: int) -> bytes:
+    return hashlib.sha256(os.pread(fd, size, offset)).digest()[:_BLOCK_DIGEST_SIZE]
+
+
+def block_digests(source_path: str, length: int, blocks) -> dict:
+    # Digests of the given _BLOCK_SIZE blocks of the first `length` bytes
+    # (the last block may be short), by block number. hashlib releases the
+    # GIL, so the blocks are hashed on a few threads.
+    blocks = list(blocks)
+    if not blocks:
+        return {}
+    fd = os.open(source_path, os.O_RDONLY)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+            digests = executor.map(lambda block: _block_digest(fd, block * _BLOCK_SIZE,
+                                                               min(_BLOCK_SIZE, length - block * _BLOCK_SIZE)),
+                                   blocks)
+            return dict(zip(blocks, digests))
+    finally:
+        os.close(fd)
+
+
+def _block_count(length: int) -> int:
+    return (length + _BLOCK_SIZE - 1) // _BLOCK_SIZE
+
+
+def _sampled_blocks(count: int) -> list:
+    # Both ends and evenly spaced blocks in between; the last block is where
+    # an append starts, so it is always among them
+    step = max(count // (_SAMPLE_COUNT + 1), 1)
+    return sorted({0, count - 1, *range(step, count - 1, step)}) if count else []
+
+
+class IndexCache:
+    # One file per (source path, delimiter pattern). The entry records the
+    # size and mtime it was built from, so a changed input is a cache miss.
+    # It also keeps a digest per 1 MB block of the input: a file that has
+    # grown is resumed once its indexed prefix checks out against them, and
+    # storing the grown index only hashes the blocks past that prefix.
+    def __init__(self, cache_dir: str, max_size_mb: int = 256, full_fingerprint: bool = False):
+        self.cache_dir = cache_dir
+        self.max_size = max_size_mb * 1024 * 1024
+        self.full_fingerprint = full_fingerprint
+        self._verified = {}
+
+    def _entry_path(self, source_path: str, delimiter_pattern: str) -> str:
+        key = json.dumps([os.path.abspath(source_path), delimiter_pattern])
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.idx')
+
+    def load(self, source_path: str, delimiter_pattern: str) -> Optional[RecordIndex]:
+        entry = self._read_valid_entry(source_path, delimiter_pattern)
+        if entry is None:
+            return None
+        meta, index, stat = entry
+        if meta.get("size") != stat.st_size or meta.get("mtime_ns") != stat.st_mtime_ns:
+            return None
+        return index
+
+    def load_appended(self, source_path: str, delimiter_pattern: str) -> Optional[Tuple[RecordIndex, int]]:
+        # For a file that has only grown since it was indexed, returns the
+        # cached index minus its last record (which may have been cut short)
+        # and the offset to resume scanning from. The indexed prefix is
+        # checked block by block: a sample of its blocks (always including
+        # the last one), or every block with full_fingerprint.
+        entry = self._read_valid_entry(source_path, delimiter_pattern)
+        if entry is None:
+            return None
+        meta, index, stat = entry
+        indexed_size = meta.get("size")
+        if not isinstance(indexed_size, int) or stat.st_size <= indexed_size:
+            return None  # same size but a new mtime: rewritten, not appended to
+        try:
+            stored = bytes.fromhex(meta["block_digests"])
+        except (KeyError, TypeError, ValueError):
+            return None
+        count = _block_count(indexed_size)
+        if meta.get("block_size") != _BLOCK_SIZE or len(stored) != count * _BLOCK_DIGEST_SIZE:
+            return None
+        blocks = range(count) if self.full_fingerprint else _sampled_blocks(count)
+        try:
+            digests = block_digests(source_path, indexed_size, blocks)
+        except OSError:
+            return None
+        for block, digest in digests.items():
+            if digest != stored[block * _BLOCK_DIGEST_SIZE:(block + 1) * _BLOCK_DIGEST_SIZE]:
+                return None
+        self._verified[os.path.abspath(source_path)] = (indexed_size, stored)
+
+        if not len(index):
+            return index, 0
+        resume_offset = index.header_starts[-1]
+        index.truncate(len(index) - 1)
+        return index, resume_offset
+
+    def _read_valid_entry(self, source_path: str, delimiter_pattern: str):
+        entry_path = self._entry_path(source_path, delimiter_pattern)
+        try:
+            stat = os.stat(source_path)
+            with open(entry_path, 'rb') as f:
+                meta, index = self._read_entry(f, source_path)
+        except (OSError, ValueError, KeyError, struct.error):
+            return None
+
+        if (meta.get("source_path") != os.path.abspath(source_path)
+                or meta.get("delimiter_pattern") != delimiter_pattern):
+            return None
+
+        try:
+            os.utime(entry_path)  # mtime doubles as the LRU timestamp
+        except OSError:
+            pass
+        return meta, index, stat
+
+    def store(self, index: RecordIndex, delimiter_pattern: str) -> None:
+        stat = os.stat(index.source_path)
+        # Whole blocks of a prefix that load_appended just checked keep their
+        # digests; only the blocks after them are read
+        verified_size, digests = self._verified.pop(os.path.abspath(index.source_path), (0, b''))
+        kept = min(verified_size, stat.st_size) // _BLOCK_SIZE
+        digests = digests[:kept * _BLOCK_DIGEST_SIZE]
+        new_digests = block_digests(index.source_path, stat.st_size, range(kept, _block_count(stat.st_size)))
+        digests += b''.join(new_digests[block] for block in sorted(new_digests))
+        meta = {
+            "source_path": os.path.abspath(index.source_path),
+            "delimiter_pattern": delimiter_pattern,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "count": len(index),
+            "block_size": _BLOCK_SIZE,
+            "block_digests": digests.hex(),
+        }
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry_path = self._entry_path(index.source_path, delimiter_pattern)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                self._write_entry(f, meta, index)
+            os.replace(temp_path, entry_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.evict()
+
+    def evict(self) -> None:
+        try:
+            names = [name for name in os.listdir(self.cache_dir) if name.endswith('.idx')]
+        except OSError:
+            return
+
+        entries = []
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, name))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.unlink(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            total_size -= size
+
+    def clear(self) -> None:
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.idx'):
+                os.unlink(os.path.join(self.cache_dir, name))
+
+    def _write_entry(self, f, meta: dict, index: RecordIndex) -> None:
+        meta_bytes = json.dumps(meta).encode('utf-8')
+        paths_blob = '\n'.join(index.paths).encode('utf-8')
+        f.write(_MAGIC)
+        f.write(_HEADER.pack(len(meta_bytes)))
+        f.write(meta_bytes)
+        f.write(_PATHS_HEADER.pack(len(paths_blob)))
+        f.write(paths_blob)
+        for column in (index.header_starts, index.body_starts, index.body_ends):
+            if sys.byteorder == 'big':
+                column = array('Q', column)
+                column.byteswap()
+            f.write(column.tobytes())
+
+    def _read_entry(self, f, source_path: str):
+        if f.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError("Not an index cache entry")
+        meta_length, = _HEADER.unpack(f.read(_HEADER.size))
+        meta = json.loads(f.read(meta_length).decode('utf-8'))
+        paths_length, = _PATHS_HEADER.unpack(f.read(_PATHS_HEADER.size))
+        paths_blob = f.read(paths_length)
+
+        count = meta["count"]
+        index = RecordIndex(source_path)
+        index.paths = paths_blob.decode('utf-8').split('\n') if count else []
+        for column in (index.header_starts, index.body_starts, index.body_ends):
+            data = f.read(count * column.itemsize)
+            if len(data) != count * column.itemsize:
+                raise ValueError("Truncated index cache entry")
+            column.frombytes(data)
+            if sys.byteorder == 'big':
+                column.byteswap()
+        if len(index.paths) != count:
+            raise ValueError("Corrupt index cache entry")
+        return meta, index
@@ -0,0 +1,209 @@
+import os
+import stat
+import errno
+import shutil
+import tempfile
+import threading
+import concurrent.futures
+
+_COPY_BUFFER_SIZE = 1024 * 1024
+
+# Staging directories of this process that are still in use
+_active_staging_dirs = set()
+_active_lock = threading.Lock()
+
+
+def fast_copy(src: str, dst: str) -> None:
+    # Kernel-side copy where available (copy_file_range, then sendfile),
+    # falling back to a plain buffered copy from wherever those stopped.
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        copied = 0
+        for kernel_copy in (_copy_file_range, _sendfile):
+            try:
+                copied = kernel_copy(fsrc.fileno(), fdst.fileno(), copied, size)
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.ENOTSUP, errno.EBADF):
+                    raise
+            if copied >= size:
+                return
+        fsrc.seek(copied)
+        fdst.seek(copied)
+        shutil.copyfileobj(fsrc, fdst, _COPY_BUFFER_SIZE)
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, copied: int, size: int) -> int:
+    if not hasattr(os, 'copy_file_range'):
+        return copied
+    while copied < size:
+        sent = os.copy_file_range(src_fd, dst_fd, size - copied, copied, copied)
+        if sent == 0:
+            break
+        copied += sent
+    return copied
+
+
+def _sendfile(src_fd: int, dst_fd: int, copied: int, size: int) -> int:
+    if not hasattr(os, 'sendfile'):
+        return copied
+    os.lseek(dst_fd, copied, os.SEEK_SET)
+    while copied < size:
+        sent = os.sendfile(dst_fd, src_fd, copied, size - copied)
+        if sent == 0:
+            break
+        copied += sent
+    return copied
+
+
+class StagedOutput:
+    # Output is written into a hidden staging directory next to output_dir
+    # and published by commit(). Until then output_dir is left untouched, so
+    # a crash or cancellation never leaves a half-merged tree behind. If
+    # publishing into an existing directory fails partway, the files not yet
+    # published stay in the staging directory rather than being lost.
+    def __init__(self, output_dir: str, max_workers: int = None):
+        self.output_dir = os.path.abspath(output_dir)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.committed = False
+        self.kept = False
+        parent_dir = os.path.dirname(self.output_dir)
+        try:
+            os.makedirs(parent_dir, exist_ok=True)
+            # The pid tells a later run whether the directory may still be in use
+            self.staging_dir = tempfile.mkdtemp(prefix=f"{self._staging_prefix()}{os.getpid()}-", dir=parent_dir)
+            self.on_target_fs = True
+        except OSError:
+            self.staging_dir = tempfile.mkdtemp()
+            self.on_target_fs = False
+        with _active_lock:
+            _active_staging_dirs.add(self.staging_dir)
+
+    def __enter__(self):
+        self._remove_stale_staging()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.committed and not self.kept:
+            self.discard()
+        self._release()
+
+    def _staging_prefix(self) -> str:
+        return f".{os.path.basename(self.output_dir)}.staging-"
+
+    def _release(self) -> None:
+        with _active_lock:
+            _active_staging_dirs.discard(self.staging_dir)
+
+    def _remove_stale_staging(self) -> None:
+        # Staging directories beside the output left by a run that crashed
+        # or failed to publish; those of other live processes may belong to
+        # a run still in progress and are left alone.
+        import psutil  # slow to import; kept off the start-up path
+
+        parent_dir = os.path.dirname(self.output_dir)
+        prefix = self._staging_prefix()
+        try:
+            names = [name for name in os.listdir(parent_dir) if name.startswith(prefix)]
+        except OSError:
+            return
+        with _active_lock:
+            active = list(_active_staging_dirs)
+        for name in names:
+            path = os.path.join(parent_dir, name)
+            if any(path.startswith(active_dir) for active_dir in active):
+                continue  # ours, or its mode probe
+            pid = name[len(prefix):].split('-', 1)[0]
+            if pid.isdigit() and int(pid) != os.getpid() and psutil.pid_exists(int(pid)):
+                continue
+            if os.path.isdir(path) and not os.path.islink(path):
+                print(f"Removing stale staging directory: {path}")
+                shutil.rmtree(path, ignore_errors=True)
+
+    def discard(self) -> None:
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+    def commit(self) -> None:
+        if not (self.on_target_fs and self._publish_by_rename()):
+            try:
+                if not (self.on_target_fs and self._publish_by_replace()):
+                    self._publish_by_copy()
+            except BaseException:
+                # Part of the new output may already be in place; keep the
+                # rest so it can be recovered (a rerun publishes everything)
+                self.kept = True
+                print(f"Publishing to {self.output_dir} stopped partway; "
+                      f"unpublished files are left in {self.staging_dir}")
+                raise
+        self.committed = True
+
+    def _publish_by_rename(self) -> bool:
+        # The common case: a new output directory is one rename. mkdtemp made
+        # the staging directory private; give it the mode a plain mkdir would.
+        if os.path.lexists(self.output_dir):
+            return False
+        os.chmod(self.staging_dir, self._default_dir_mode())
+        os.rename(self.staging_dir, self.output_dir)
+        return True
+
+    def _default_dir_mode(self) -> int:
+        # Reading the umask means setting it, which would race with other
+        # threads creating files; probe with a scratch directory instead
+        probe = self.staging_dir + '.mode'
+        os.mkdir(probe)
+        try:
+            return stat.S_IMODE(os.stat(probe).st_mode)
+        finally:
+            os.rmdir(probe)
+
+    def _publish_by_replace(self) -> bool:
+        # An existing output directory stays where it is, with its own
+        # metadata and every file the new run didn't produce; each new file
+        # atomically replaces its counterpart.
+        if not os.path.isdir(self.output_dir):
+            return False
+        for root, dirs, files in os.walk(self.staging_dir):
+            destination_root = os.path.join(self.output_dir, os.path.relpath(root, self.staging_dir))
+            for name in dirs:
+                destination = os.path.join(destination_root, name)
+                if os.path.islink(destination) or (os.path.lexists(destination) and not os.path.isdir(destination)):
+                    os.unlink(destination)  # a file replaced by a directory
+                os.makedirs(destination, exist_ok=True)
+            for name in files:
+                source = os.path.join(root, name)
+                destination = os.path.join(destination_root, name)
+                if os.path.isdir(destination) and not os.path.islink(destination):
+                    shutil.rmtree(destination)  # a directory replaced by a file
+                try:
+                    os.replace(source, destination)
+                except OSError as e:
+                    # e.g. a subdirectory that is a mount point
+                    if e.errno not in (errno.EXDEV, errno.EBUSY):
+                        raise
+                    self._copy_into_place(source, destination)
+        self.discard()
+        return True
+
+    def _publish_by_copy(self) -> None:
+        # Staging ended up on another filesystem: copy each file to a temporary
+        # name beside its destination, then replace the destination atomically.
+        copies = []
+        for root, _, files in os.walk(self.staging_dir):
+            destination_root = os.path.join(self.output_dir, os.path.relpath(root, self.staging_dir))
+            os.makedirs(destination_root, exist_ok=True)
+            copies.extend((os.path.join(root, name), os.path.join(destination_root, name)) for name in files)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for future in [executor.submit(self._copy_into_place, src, dst) for src, dst in copies]:
+                future.result()
+        self.discard()
+
+    def _copy_into_place(self, src: str, dst: str) -> None:
+        fd, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(dst) + '.', dir=os.path.dirname(dst))
+        os.close(fd)
+        try:
+            fast_copy(src, temp_path)
+            shutil.copymode(src, temp_path)
+            os.replace(temp_path, dst)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
@@ -0,0 +1,154 @@
+import os
+import shutil
+import hashlib
+import collections
+from typing import Iterable
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_MAX_OPEN_FILES = 256
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+
+def _fd_budget() -> int:
+    # Leave most descriptors to the rest of the process (mmaps, sockets, pools)
+    if resource is None:
+        return DEFAULT_MAX_OPEN_FILES
+    soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft_limit == resource.RLIM_INFINITY:
+        return DEFAULT_MAX_OPEN_FILES
+    return max(soft_limit // 4, 1)
+
+
+class OutputWriter:
+    # Appends record contents to files under root_dir. Handles stay open in
+    # an LRU pool (each with its own write buffer) so a path that recurs
+    # across chunks doesn't pay for makedirs/open/close on every record.
+    def __init__(self, root_dir: str, max_open_files: int = None, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        self.root_dir = root_dir
+        self.max_open_files = min(max_open_files or DEFAULT_MAX_OPEN_FILES, _fd_budget())
+        self.buffer_size = buffer_size
+        self._handles = collections.OrderedDict()
+        self._created_dirs = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, relative_path: str, blocks: Iterable) -> None:
+        handle = self._handles.get(relative_path)
+        if handle is None:
+            handle = self._open(relative_path)
+        else:
+            self._handles.move_to_end(relative_path)
+        for block in blocks:
+            handle.write(block)
+
+    def _open(self, relative_path: str):
+        file_path = self._prepare_path(relative_path)
+        while len(self._handles) >= self.max_open_files:
+            _, oldest = self._handles.popitem(last=False)
+            oldest.close()
+
+        handle = open(file_path, 'ab', buffering=self.buffer_size)
+        self._handles[relative_path] = handle
+        return handle
+
+    def _prepare_path(self, relative_path: str) -> str:
+        file_path = os.path.join(self.root_dir, relative_path)
+        directory = os.path.dirname(file_path)
+        if directory not in self._created_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._created_dirs.add(directory)
+        return file_path
+
+    def close(self) -> None:
+        errors = []
+        while self._handles:
+            _, handle = self._handles.popitem(last=False)
+            try:
+                handle.close()
+            except OSError as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+
+
+def content_key(blocks: Iterable) -> tuple:
+    # (size, digest) identifying a body independently of where it's stored
+    hasher = hashlib.blake2b(digest_size=20)
+    size = 0
+    for block in blocks:
+        hasher.update(block)
+        size += len(block)
+    return size, hasher.digest()
+
+
+class DeduplicatingOutputWriter(OutputWriter):
+    # Content-addressed variant: a new file whose first record has the same
+    # body as a file written earlier becomes a hardlink to that file. A
+    # linked file that later receives more records is given its own copy
+    # first, so the other names keep their content.
+    def __init__(self, root_dir: str, max_open_files: int = None, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        super().__init__(root_dir, max_open_files, buffer_size)
+        self.linked_files = 0
+        self.linked_bytes = 0
+        self._seen = set()
+        self._first_by_key = {}
+        self._shared = {}  # path -> content key, while the file holds just that body
+        self._can_link = True
+
+    def write(self, relative_path: str, blocks: Iterable) -> None:
+        if relative_path in self._seen:
+            if relative_path in self._shared:
+                self._detach(relative_path)
+            super().write(relative_path, blocks)
+            return
+
+        self._seen.add(relative_path)
+        blocks = list(blocks)
+        key = content_key(blocks)
+        first = self._first_by_key.get(key)
+        if first is not None and self._link(first, relative_path):
+            self._shared[relative_path] = key
+            self.linked_files += 1
+            self.linked_bytes += key[0]
+            return
+
+        super().write(relative_path, blocks)
+        if self._handles[relative_path].tell() == key[0]:  # not appended to an existing file
+            self._first_by_key.setdefault(key, relative_path)
+            self._shared[relative_path] = key
+
+    def _link(self, source: str, target: str) -> bool:
+        if not self._can_link:
+            return False
+        handle = self._handles.get(source)
+        if handle is not None:
+            handle.flush()  # a later copy-on-append reads the content from disk
+        try:
+            os.link(os.path.join(self.root_dir, source), self._prepare_path(target))
+        except FileExistsError:
+            return False
+        except OSError:
+            self._can_link = False  # e.g. a filesystem without hardlinks
+            return False
+        return True
+
+    def _detach(self, relative_path: str) -> None:
+        key = self._shared.pop(relative_path)
+        if self._first_by_key.get(key) == relative_path:
+            del self._first_by_key[key]
+        handle = self._handles.pop(relative_path, None)
+        if handle is not None:
+            handle.close()
+        file_path = os.path.join(self.root_dir, relative_path)
+        if os.stat(file_path).st_nlink > 1:
+            private_copy = file_path + ".detach"
+            shutil.copyfile(file_path, private_copy)
+            os.replace(private_copy, file_path)
@@ -0,0 +1,61 @@
+from typing import Iterable, List, Tuple
+
+
+class PathNode:
+    __slots__ = ('name', 'children', 'records', 'files', 'terminal')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.children = {}
+        self.records = 0  # records at or below this node
+        self.files = 0  # distinct output files at or below this node
+        self.terminal = False  # some record is written to exactly this path
+
+    @property
+    def is_file(self) -> bool:
+        return not self.children
+
+    def sorted_children(self, offset: int = 0, limit: int = None) -> Tuple[List['PathNode'], int]:
+        # Directories before files, each alphabetically. Returns (children,
+        # number remaining after them) so huge directories can be shown a
+        # page at a time.
+        children = sorted(self.children.values(), key=lambda node: (node.is_file, node.name))
+        end = len(children) if limit is None else min(offset + limit, len(children))
+        return children[offset:end], len(children) - end
+
+
+class PathTrie:
+    # Record paths folded into one node per directory, so a directory shared
+    # by many records is stored (and shown) once.
+    def __init__(self, paths: Iterable[str] = ()):
+        self.root = PathNode("")
+        for path in paths:
+            self.add(path)
+
+    def __len__(self) -> int:
+        return self.root.files
+
+    def add(self, path: str) -> None:
+        parts = [part for part in path.split('/') if part]
+        if not parts:
+            return
+        nodes = [self.root]
+        for part in parts:
+            node = nodes[-1].children.get(part)
+            if node is None:
+                node = nodes[-1].children[part] = PathNode(part)
+            nodes.append(node)
+
+        new_file = not nodes[-1].terminal
+        nodes[-1].terminal = True
+        for node in nodes:
+            node.records += 1
+            if new_file:
+                node.files += 1
+
+    def find(self, path: str) -> PathNode:
+        node = self.root
+        for part in path.split('/'):
+            if part:
+                node = node.children[part]
+        return node
@@ -0,0 +1,205 @@
+import os
+import re
+import time
+import threading
+import multiprocessing
+from typing import NamedTuple, Optional
+from core.delimiter_scanner import DelimiterScanner
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+DEFAULT_SAMPLE_BYTES = 1024 * 1024
+DEFAULT_TIMEOUT = 2.0
+
+_REPEATS = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT)
+_WIDE_TOKENS = (sre_parse.ANY, sre_parse.IN, sre_parse.NOT_LITERAL, sre_parse.CATEGORY)
+
+
+class PatternStats(NamedTuple):
+    pattern: str
+    lines: int = 0
+    matches: int = 0
+    matches_per_mb: float = 0.0
+    total_seconds: float = 0.0
+    slowest_line_seconds: float = 0.0
+    slowest_line_number: int = 0
+    sample_bytes: int = 0
+    warning: Optional[str] = None
+    error: Optional[str] = None
+    timed_out: bool = False
+
+
+def _line_regex(pattern: str):
+    # Same anchoring as DelimiterScanner, applied to one line at a time
+    body = pattern[1:] if pattern.startswith('^') else pattern
+    return re.compile(b'(?:' + body.encode('utf-8') + b')')
+
+
+def backtracking_risk(pattern: str) -> Optional[str]:
+    # Heuristic: flags the shapes that make a backtracking engine go
+    # exponential (a quantifier inside another one, or a quantified
+    # alternation whose branches can match the same text) or polynomial
+    # (several unbounded wildcards in a row).
+    try:
+        tree = sre_parse.parse(pattern)
+    except re.error:
+        return None
+    return _check_sequence(tree, inside_repeat=False)
+
+
+def _is_unbounded(repeat_args) -> bool:
+    return repeat_args[1] == sre_parse.MAXREPEAT or repeat_args[1] > 16
+
+
+def _check_sequence(items, inside_repeat: bool) -> Optional[str]:
+    wildcards = 0
+    for op, args in items:
+        if op in _REPEATS:
+            unbounded = _is_unbounded(args)
+            subpattern = args[2]
+            if inside_repeat and unbounded:
+                return "nested quantifiers such as (a+)+ can backtrack exponentially"
+            if unbounded and any(sub_op in _WIDE_TOKENS for sub_op, _ in subpattern):
+                wildcards += 1
+                if wildcards > 1:
+                    return "several unbounded wildcards such as .*.* backtrack heavily on long lines"
+            if unbounded and _has_overlapping_branches(subpattern):
+                return "a repeated alternation whose branches overlap, such as (a|aa)*, can backtrack exponentially"
+            # A mandatory separator such as the '/' in ([a-z]+/)+ keeps the
+            # inner repeats from competing for the same characters.
+            nested = unbounded and not _has_separator(subpattern)
+            warning = _check_sequence(subpattern, inside_repeat or nested)
+            if warning:
+                return warning
+        elif op == sre_parse.SUBPATTERN:
+            warning = _check_sequence(args[-1], inside_repeat)
+            if warning:
+                return warning
+        elif op == sre_parse.BRANCH:
+            for branch in args[1]:
+                warning = _check_sequence(branch, inside_repeat)
+                if warning:
+                    return warning
+    return None
+
+
+def _unwrap(items):
+    while len(items) == 1 and items[0][0] == sre_parse.SUBPATTERN:
+        items = items[0][1][-1]
+    return items
+
+
+def _has_separator(items) -> bool:
+    items = _unwrap(items)
+    repeats = [args[2] for op, args in items if op in _REPEATS]
+    if any(sub_op in (sre_parse.ANY, sre_parse.NOT_LITERAL) for repeat in repeats for sub_op, _ in repeat):
+        return False
+    return any(op == sre_parse.LITERAL for op, _ in items)
+
+
+def _has_overlapping_branches(items) -> bool:
+    items = _unwrap(items)
+    if not items:
+        return False
+    body_first = items[0]
+    for op, args in items:
+        if op != sre_parse.BRANCH:
+            continue
+        firsts = [branch[0] if len(branch) else None for branch in args[1]]
+        alternatives = [token for token in firsts if token is not None]
+        if len(alternatives) < len(firsts):
+            # An empty branch lets one iteration end where the next begins
+            if not alternatives or body_first in alternatives:
+                return True
+        if len(alternatives) > 1 and any(token[0] in _WIDE_TOKENS for token in alternatives):
+            return True
+        if len(set(map(repr, alternatives))) < len(alternatives):
+            return True
+    return False
+
+
+def evaluate_pattern(pattern: str, sample: bytes) -> PatternStats:
+    # Matches and total time come from the scanner that processing uses, so
+    # they show what the pattern costs there; the per-line pass only points
+    # at the slowest line.
+    scanner = DelimiterScanner(pattern)
+    matches = 0
+    started = time.perf_counter()
+    header_start = scanner.find(sample, 0, len(sample))
+    while header_start != -1:
+        matches += 1
+        header_end = sample.find(b'\n', header_start)
+        if header_end == -1:
+            break
+        header_start = scanner.find(sample, header_end + 1, len(sample))
+    total = time.perf_counter() - started
+
+    regex = _line_regex(pattern)
+    slowest = 0.0
+    slowest_line = 0
+    lines = sample.split(b'\n')
+    for number, line in enumerate(lines, 1):
+        line_started = time.perf_counter()
+        regex.match(line)
+        elapsed = time.perf_counter() - line_started
+        if elapsed > slowest:
+            slowest, slowest_line = elapsed, number
+    return PatternStats(pattern, len(lines), matches, matches / max(len(sample) / (1024 * 1024), 1e-9), total,
+                        slowest, slowest_line, len(sample))
+
+
+class PatternTester:
+    # Evaluates delimiter patterns against a cached sample from the head of
+    # a file. Evaluation runs in a separate process so a pattern that
+    # backtracks for hours can be abandoned after `timeout` seconds.
+    def __init__(self, sample_bytes: int = DEFAULT_SAMPLE_BYTES, timeout: float = DEFAULT_TIMEOUT):
+        self.sample_bytes = sample_bytes
+        self.timeout = timeout
+        self._sample_key = None
+        self._sample = b''
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def sample(self, file_path: str) -> bytes:
+        stat = os.stat(file_path)
+        key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        if key != self._sample_key:
+            with open(file_path, 'rb') as f:
+                sample = f.read(self.sample_bytes)
+            if len(sample) == self.sample_bytes:
+                # Drop the partial last line
+                sample = sample[:sample.rfind(b'\n') + 1] or sample
+            self._sample_key, self._sample = key, sample
+        return self._sample
+
+    def test(self, pattern: str, file_path: str = None) -> PatternStats:
+        try:
+            _line_regex(pattern)
+        except re.error as e:
+            return PatternStats(pattern, error=str(e))
+        warning = backtracking_risk(pattern)
+        if not file_path:
+            return PatternStats(pattern, warning=warning)
+
+        with self._lock:
+            sample = self.sample(file_path)
+            if self._pool is None:
+                self._pool = multiprocessing.Pool(1)
+            result = self._pool.apply_async(evaluate_pattern, (pattern, sample))
+            try:
+                stats = result.get(self.timeout)
+            except multiprocessing.TimeoutError:
+                # The worker may be stuck inside the regex engine; only killing it helps
+                self._pool.terminate()
+                self._pool = None
+                return PatternStats(pattern, sample_bytes=len(sample), warning=warning, timed_out=True)
+        return stats._replace(warning=warning)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool = None
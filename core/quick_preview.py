@@ -0,0 +1,77 @@
+import collections
+from typing import List, NamedTuple, Tuple
+from core.path_trie import PathTrie
+from core.record_index import RecordOffsets
+
+DEFAULT_SAMPLE_MB = 4
+DEFAULT_SAMPLE_WINDOWS = 8
+
+
+class PreviewEstimate(NamedTuple):
+    file_size: int
+    sampled_bytes: int
+    exact: bool  # the sample covered the whole file
+    sampled_records: int
+    estimated_records: int
+    estimated_files: int
+    estimated_output_bytes: int
+    directories: int
+    max_fan_out: int
+    mean_fan_out: float
+    elapsed: float
+    trie: PathTrie
+
+
+def sample_offsets(file_size: int, sample_bytes: int, windows: int) -> List[Tuple[int, int]]:
+    # Unaligned (start, end) windows: the head of the file when it fits in the
+    # sample (or windows is 0), otherwise `windows` evenly spaced slices.
+    if file_size <= sample_bytes or windows <= 1:
+        return [(0, min(file_size, sample_bytes))]
+    window_bytes = sample_bytes // windows
+    step = file_size // windows
+    return [(i * step, i * step + window_bytes) for i in range(windows)]
+
+
+def estimate(file_size: int, sampled_bytes: int, records: List[RecordOffsets], elapsed: float) -> PreviewEstimate:
+    exact = sampled_bytes >= file_size
+    scale = 1.0 if exact or not sampled_bytes else file_size / sampled_bytes
+    trie = PathTrie(path for path, _, _, _ in records)
+    output_bytes = sum(body_end - body_start + 1 for _, _, body_start, body_end in records)
+
+    fan_outs = []
+    stack = [trie.root]
+    while stack:
+        node = stack.pop()
+        if node.children:
+            fan_outs.append(len(node.children))
+            stack.extend(node.children.values())
+
+    estimated_records = round(len(records) * scale)
+    return PreviewEstimate(
+        file_size=file_size,
+        sampled_bytes=sampled_bytes,
+        exact=exact,
+        sampled_records=len(records),
+        estimated_records=estimated_records,
+        estimated_files=len(trie) if exact else _estimate_distinct(records, estimated_records),
+        estimated_output_bytes=round(output_bytes * scale),
+        directories=len(fan_outs),
+        max_fan_out=max(fan_outs, default=0),
+        mean_fan_out=sum(fan_outs) / len(fan_outs) if fan_outs else 0.0,
+        elapsed=elapsed,
+        trie=trie,
+    )
+
+
+def _estimate_distinct(records: List[RecordOffsets], total: int) -> int:
+    # Chao1 estimate of how many distinct paths the whole file holds: paths
+    # seen only once in the sample suggest many more unseen ones, paths seen
+    # repeatedly suggest the sample has already found most of them.
+    counts = collections.Counter(path for path, _, _, _ in records)
+    frequencies = collections.Counter(counts.values())
+    singletons, doubletons = frequencies[1], frequencies[2]
+    if doubletons:
+        unseen = singletons * singletons / (2 * doubletons)
+    else:
+        unseen = singletons * (singletons - 1) / 2
+    return min(round(len(counts) + unseen), max(total, len(counts)))
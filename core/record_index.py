@@ -0,0 +1,146 @@
+import os
+import mmap
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# (path, header_start, body_start, body_end) as produced by the chunk scanners
+RecordOffsets = Tuple[str, int, int, int]
+
+# What happens when several records share a path:
+#   concat  every record is appended to the file, in file order
+#   first   the first record wins
+#   last    the last record in the file wins
+#   suffix  later records get their own files: name~2.ext, name~3.ext, ...
+DUPLICATE_POLICIES = ("concat", "first", "last", "suffix")
+
+
+def _suffixed(path: str, number: int) -> str:
+    directory, slash, name = path.rpartition('/')
+    stem, dot, extension = name.rpartition('.')
+    if stem:
+        return f"{directory}{slash}{stem}~{number}.{extension}"
+    return f"{path}~{number}"
+
+
+def resolve_duplicate_paths(paths: List[str], policy: str = "concat") -> List[Optional[str]]:
+    # The output path of each record under `policy`, or None where the
+    # record is dropped. Depends only on the order of `paths`, never on the
+    # order chunks were parsed in.
+    if policy == "concat":
+        return list(paths)
+    if policy == "first":
+        seen = set()
+        resolved = []
+        for path in paths:
+            resolved.append(None if path in seen else path)
+            seen.add(path)
+        return resolved
+    if policy == "last":
+        last = {path: i for i, path in enumerate(paths)}
+        return [path if last[path] == i else None for i, path in enumerate(paths)]
+    if policy == "suffix":
+        taken = set(paths)
+        numbers = {}
+        resolved = []
+        for path in paths:
+            number = numbers.get(path)
+            if number is None:
+                numbers[path] = 1
+                resolved.append(path)
+                continue
+            number += 1
+            while _suffixed(path, number) in taken:  # the dump already has a file by that name
+                number += 1
+            numbers[path] = number
+            taken.add(_suffixed(path, number))
+            resolved.append(_suffixed(path, number))
+        return resolved
+    raise ValueError(f"unknown duplicate path policy: {policy}")
+
+
+class RecordIndex:
+    # Paths plus byte offsets into the source file. Record bodies are never
+    # copied into the index; content() slices them out of the mmap on demand.
+    __slots__ = ('source_path', 'paths', 'header_starts', 'body_starts', 'body_ends', '_file', '_mm')
+
+    def __init__(self, source_path: str):
+        self.source_path = source_path
+        self.paths = []
+        self.header_starts = array('Q')
+        self.body_starts = array('Q')
+        self.body_ends = array('Q')
+        self._file = None
+        self._mm = None
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.paths)
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def append(self, path: str, header_start: int, body_start: int, body_end: int) -> None:
+        self.paths.append(path)
+        self.header_starts.append(header_start)
+        self.body_starts.append(body_start)
+        self.body_ends.append(body_end)
+
+    def extend(self, records: Iterable[RecordOffsets]) -> None:
+        for path, header_start, body_start, body_end in records:
+            self.append(path, header_start, body_start, body_end)
+
+    def truncate(self, count: int) -> None:
+        del self.paths[count:]
+        del self.header_starts[count:]
+        del self.body_starts[count:]
+        del self.body_ends[count:]
+
+    def open(self):
+        if self._mm is None:
+            self._file = open(self.source_path, 'rb')
+            if os.fstat(self._file.fileno()).st_size == 0:
+                self._mm = b''
+            else:
+                self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mm
+
+    @property
+    def buffer(self):
+        return self.open()
+
+    def close(self) -> None:
+        if self._mm is not None:
+            if isinstance(self._mm, mmap.mmap):
+                self._mm.close()
+            self._file.close()
+            self._mm = None
+            self._file = None
+
+    def content(self, i: int) -> memoryview:
+        return memoryview(self.buffer)[self.body_starts[i]:self.body_ends[i]]
+
+    def text(self, i: int) -> str:
+        # Written files keep the raw bytes; text is only for the dict API
+        return self.buffer[self.body_starts[i]:self.body_ends[i]].decode('utf-8', 'replace')
+
+    def content_size(self, i: int) -> int:
+        return self.body_ends[i] - self.body_starts[i]
+
+    def group(self, policy: str = "concat") -> Dict[str, List[int]]:
+        # Record ids per output file, in file order
+        grouped = {}
+        for i, path in enumerate(resolve_duplicate_paths(self.paths, policy)):
+            if path is not None:
+                grouped.setdefault(path, []).append(i)
+        return grouped
+
+    def to_dict(self, policy: str = "concat") -> Dict[str, str]:
+        # Same content as the files written for the index, less their final newline
+        return {path: '\n'.join(self.text(i) for i in record_ids)
+                for path, record_ids in self.group(policy).items()}
@@ -0,0 +1,150 @@
+import io
+import os
+import bz2
+import shutil
+import tempfile
+import zipfile
+import zlib
+from typing import Callable, Iterable, NamedTuple, Tuple
+
+# Members up to this size are compressed in memory; larger ones spill to disk
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+_COPY_BUFFER_SIZE = 1024 * 1024
+
+COMPRESSION_METHODS = {
+    "stored": zipfile.ZIP_STORED,
+    "deflate": zipfile.ZIP_DEFLATED,
+    "bzip2": zipfile.ZIP_BZIP2,
+    "lzma": zipfile.ZIP_LZMA,
+}
+
+# "auto" stores these instead of spending CPU on data that won't shrink
+ALREADY_COMPRESSED_EXTENSIONS = {
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.txz', '.lzma', '.zst', '.lz4', '.7z', '.rar',
+    '.jar', '.war', '.whl', '.apk', '.docx', '.xlsx', '.pptx', '.odt',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.mp3', '.aac', '.ogg', '.flac',
+    '.mp4', '.m4v', '.mkv', '.mov', '.avi', '.webm', '.woff', '.woff2',
+}
+AUTO_STORE_MAX_SIZE = 512
+
+
+class CompressedMember(NamedTuple):
+    payload: tempfile.SpooledTemporaryFile
+    crc: int
+    file_size: int
+    compress_size: int
+
+
+def _get_compressor(compress_type: int, compresslevel: int = None):
+    if compress_type == zipfile.ZIP_STORED:
+        return None
+    if compress_type == zipfile.ZIP_DEFLATED:
+        level = zlib.Z_DEFAULT_COMPRESSION if compresslevel is None else compresslevel
+        return zlib.compressobj(level, zlib.DEFLATED, -15)
+    if compress_type == zipfile.ZIP_BZIP2:
+        return bz2.BZ2Compressor(9 if compresslevel is None else compresslevel)
+    if compress_type == zipfile.ZIP_LZMA:
+        # The ZIP flavour of LZMA needs zipfile's property header; it has no level
+        return zipfile.LZMACompressor()
+    raise NotImplementedError(f"Unsupported compression method: {compress_type}")
+
+
+def read_file_blocks(file_path: str, block_size: int = _COPY_BUFFER_SIZE) -> Iterable[bytes]:
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                return
+            yield block
+
+
+def compress_member(blocks: Iterable, compress_type: int, compresslevel: int = None) -> CompressedMember:
+    # Safe to call from worker threads: zlib releases the GIL while compressing.
+    compressor = _get_compressor(compress_type, compresslevel)
+    payload = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    crc = 0
+    file_size = 0
+    try:
+        for block in blocks:
+            crc = zlib.crc32(block, crc)
+            file_size += len(block)
+            payload.write(compressor.compress(block) if compressor else block)
+        if compressor:
+            payload.write(compressor.flush())
+    except BaseException:
+        payload.close()
+        raise
+    compress_size = payload.tell()
+    payload.seek(0)
+    return CompressedMember(payload, crc, file_size, compress_size)
+
+
+def compress_member_auto(blocks_factory: Callable[[], Iterable], arcname: str, file_size: int,
+                         compresslevel: int = None) -> Tuple[int, CompressedMember]:
+    # Stores small or already-compressed members, deflates everything else,
+    # and falls back to storing when deflate didn't actually save space.
+    if file_size < AUTO_STORE_MAX_SIZE or os.path.splitext(arcname)[1].lower() in ALREADY_COMPRESSED_EXTENSIONS:
+        return zipfile.ZIP_STORED, compress_member(blocks_factory(), zipfile.ZIP_STORED)
+
+    member = compress_member(blocks_factory(), zipfile.ZIP_DEFLATED, compresslevel)
+    if member.compress_size >= member.file_size:
+        member.payload.close()
+        return zipfile.ZIP_STORED, compress_member(blocks_factory(), zipfile.ZIP_STORED)
+    return zipfile.ZIP_DEFLATED, member
+
+
+class BlockReader(io.RawIOBase):
+    # Readable file object over an iterable of bytes-like blocks, for APIs
+    # such as TarFile.addfile that want to pull data themselves.
+    def __init__(self, blocks: Iterable):
+        self._blocks = iter(blocks)
+        self._current = memoryview(b'')
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not len(self._current):
+            # Drop our view first: the producer may release the block's buffer
+            self._current = memoryview(b'')
+            block = next(self._blocks, None)
+            if block is None:
+                return 0
+            self._current = memoryview(block).cast('B')
+        size = min(len(buffer), len(self._current))
+        buffer[:size] = self._current[:size]
+        self._current = self._current[size:]
+        return size
+
+    def close(self) -> None:
+        self._current = memoryview(b'')
+        close_blocks = getattr(self._blocks, 'close', None)
+        if close_blocks:
+            close_blocks()
+        super().close()
+
+
+def write_precompressed(zipf: zipfile.ZipFile, zinfo: zipfile.ZipInfo, member: CompressedMember) -> None:
+    # zipfile has no public way to add data that is already compressed, so
+    # this mirrors ZipFile._open_to_write/_ZipWriteFile.close for a payload
+    # whose CRC and sizes are known up front. Requires a seekable archive.
+    zinfo.CRC = member.crc
+    zinfo.file_size = member.file_size
+    zinfo.compress_size = member.compress_size
+    zinfo.flag_bits = 0x00
+    if zinfo.compress_type == zipfile.ZIP_LZMA:
+        zinfo.flag_bits |= 0x02  # compressed data carries an end-of-stream marker
+    if not zinfo.external_attr:
+        zinfo.external_attr = 0o600 << 16
+    zip64 = max(member.file_size, member.compress_size) > zipfile.ZIP64_LIMIT
+
+    with zipf._lock:
+        zipf.fp.seek(zipf.start_dir)
+        zinfo.header_offset = zipf.fp.tell()
+        zipf._writecheck(zinfo)
+        zipf._didModify = True
+        zipf.fp.write(zinfo.FileHeader(zip64))
+        shutil.copyfileobj(member.payload, zipf.fp, _COPY_BUFFER_SIZE)
+        zipf.start_dir = zipf.fp.tell()
+        zipf.filelist.append(zinfo)
+        zipf.NameToInfo[zinfo.filename] = zinfo
@@ -1,16 +1,19 @@
 import wx
 import wx.adv
 import threading
+import os
 from gui.wizard_pages import (
     WelcomePage, FileSelectionPage, ProcessingOptionsPage, 
-    PreviewPage, ProcessingPage, CompletionPage
+    PreviewPage, ProcessingPage, CompletionPage, FormatProgress
 )
 from gui.settings_dialog import SettingsDialog
 from utils.drag_drop_target import FileDropTarget
 from utils.recent_files import RecentFiles
 from utils.updater import Updater
 from utils.localization import _
+from utils.progress_reporter import ProgressReporter
 from utils.plugin_manager import PluginManager
+from core.batch_scheduler import BatchScheduler
 
 class MainFrame(wx.Frame):
     def __init__(self, parent, title, file_processor, settings_manager, theme_manager):
@@ -21,6 +24,8 @@ class MainFrame(wx.Frame):
         self.recent_files = RecentFiles()
         self.updater = Updater("1.0", "https://example.com/update_info.json", self)
         self.plugin_manager = PluginManager()
+        self.batch_queue = []
+        self.batch_scheduler = None
         
         self.SetupUI()
         self.SetDropTarget(FileDropTarget(self))
@@ -42,7 +47,8 @@ class MainFrame(wx.Frame):
         self.wizard = wx.adv.Wizard(self.wizard_panel, -1, _("Text File Analyzer Wizard"))
         self.welcome_page = WelcomePage(self.wizard)
         self.file_selection_page = FileSelectionPage(self.wizard, self.file_processor)
-        self.options_page = ProcessingOptionsPage(self.wizard, self.settings_manager)
+        self.options_page = ProcessingOptionsPage(self.wizard, self.settings_manager, self.file_processor,
+                                                  self.file_selection_page.GetFilePath)
         self.preview_page = PreviewPage(self.wizard, self.file_processor)
         self.processing_page = ProcessingPage(self.wizard, self.file_processor)
         self.completion_page = CompletionPage(self.wizard)
@@ -189,10 +195,18 @@ class MainFrame(wx.Frame):
         self.Close(True)
 
     def OnSettings(self, event):
-        with SettingsDialog(self, self.settings_manager) as dlg:
+        with SettingsDialog(self, self.settings_manager, self.GetSampleFilePath) as dlg:
             if dlg.ShowModal() == wx.ID_SAVE:
                 self.ApplySettings()
 
+    def GetSampleFilePath(self):
+        # The file picked in the wizard, else the most recently opened one
+        file_path = self.file_selection_page.GetFilePath()
+        if file_path:
+            return file_path
+        recent = [path for path in self.recent_files.get_recent_files() if os.path.isfile(path)]
+        return recent[0] if recent else ""
+
     def OnToggleDarkMode(self, event):
         is_checked = event.IsChecked()
         new_theme = "dark" if is_checked else "light"
@@ -215,6 +229,58 @@ class MainFrame(wx.Frame):
         else:
             wx.MessageBox(_("File processing was cancelled."), _("Cancelled"), wx.OK | wx.ICON_INFORMATION)
 
+    def QueueFiles(self, file_paths):
+        # A single file still goes through the wizard; several are queued and
+        # run as one batch with the options last chosen in the wizard.
+        if len(file_paths) == 1 and self.batch_scheduler is None:
+            self.ProcessFile(file_paths[0])
+            return
+        for file_path in file_paths:
+            self.recent_files.add_file(file_path)
+        self.UpdateRecentFilesMenu()
+        self.batch_queue.extend(file_paths)
+        if self.batch_scheduler is None:
+            self.StartBatch()
+        else:
+            self.SetStatusText(_("%d files queued") % len(self.batch_queue))
+
+    def StartBatch(self):
+        with wx.DirDialog(self, _("Choose Output Directory")) as dirDialog:
+            if dirDialog.ShowModal() == wx.ID_CANCEL:
+                self.batch_queue = []
+                return
+            output_dir = dirDialog.GetPath()
+
+        file_paths, self.batch_queue = self.batch_queue, []
+        self.batch_scheduler = BatchScheduler(self.settings_manager)
+        self.SetStatusText(_("Processing %d files...") % len(file_paths))
+
+        reporter = ProgressReporter(lambda snapshot: wx.CallAfter(self.ShowBatchProgress, len(file_paths), snapshot))
+        threading.Thread(target=self._run_batch, args=(file_paths, output_dir, reporter),
+                         daemon=True).start()
+
+    def ShowBatchProgress(self, file_count, snapshot):
+        if self.batch_scheduler is not None:
+            self.SetStatusText(_("%d files - %s") % (file_count, FormatProgress(snapshot)))
+
+    def _run_batch(self, file_paths, output_dir, progress_callback):
+        try:
+            report = self.batch_scheduler.run(file_paths, output_dir,
+                                              create_archive=self.settings_manager.get_setting("create_zip", True),
+                                              extract=self.settings_manager.get_setting("extract_files", True),
+                                              progress_callback=progress_callback)
+            wx.CallAfter(self.OnBatchFinished, report.summary(), report.succeeded)
+        except Exception as e:
+            wx.CallAfter(self.OnBatchFinished, str(e), False)
+
+    def OnBatchFinished(self, summary, succeeded):
+        self.batch_scheduler = None
+        self.SetStatusText(summary.splitlines()[0])
+        wx.MessageBox(summary, _("Batch Complete") if succeeded else _("Batch Completed With Errors"),
+                      wx.OK | (wx.ICON_INFORMATION if succeeded else wx.ICON_WARNING))
+        if self.batch_queue:
+            self.StartBatch()
+
     def UpdateRecentFilesMenu(self):
         self.recent_menu.Clear()
         for i, file_path in enumerate(self.recent_files.get_recent_files()):
@@ -0,0 +1,82 @@
+import wx
+import threading
+from core.pattern_tester import PatternTester, DEFAULT_SAMPLE_BYTES, DEFAULT_TIMEOUT
+from utils.localization import _
+
+class PatternFeedback(wx.StaticText):
+    # Shows live statistics for the pattern in `text_ctrl`, evaluated against
+    # the head of the file returned by `get_file_path`. Typing restarts a
+    # short delay so only the pattern the user settles on gets evaluated.
+    DELAY_MS = 400
+
+    def __init__(self, parent, text_ctrl, settings_manager, get_file_path=None):
+        super().__init__(parent, label="")
+        self.text_ctrl = text_ctrl
+        self.get_file_path = get_file_path
+        self.tester = PatternTester(
+            sample_bytes=int(settings_manager.get_setting("pattern_test_sample_mb", DEFAULT_SAMPLE_BYTES // (1024 * 1024))
+                             * 1024 * 1024),
+            timeout=settings_manager.get_setting("pattern_test_timeout", DEFAULT_TIMEOUT))
+        self.generation = 0
+        self.timer = None
+        self.text_ctrl.Bind(wx.EVT_TEXT, self.OnText)
+        self.Bind(wx.EVT_WINDOW_DESTROY, self.OnDestroy)
+        self.Schedule()
+
+    def OnText(self, event):
+        self.Schedule()
+        event.Skip()
+
+    def Schedule(self):
+        if self.timer is not None and self.timer.IsRunning():
+            self.timer.Restart(self.DELAY_MS)
+        else:
+            self.timer = wx.CallLater(self.DELAY_MS, self.Evaluate)
+
+    def Evaluate(self):
+        self.generation += 1
+        generation = self.generation
+        pattern = self.text_ctrl.GetValue()
+        file_path = self.get_file_path() if self.get_file_path else ""
+        self.SetLabel(_("Testing pattern..."))
+
+        def run():
+            try:
+                stats = self.tester.test(pattern, file_path or None)
+                wx.CallAfter(self.ShowStats, stats, generation)
+            except Exception as e:
+                wx.CallAfter(self.ShowError, str(e), generation)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def ShowStats(self, stats, generation):
+        if generation != self.generation or not self:
+            return  # superseded by a newer pattern
+        if stats.error:
+            self.SetLabel(_("Invalid pattern: %s") % stats.error)
+            self.SetForegroundColour(wx.RED)
+            return
+        lines = []
+        if stats.timed_out:
+            lines.append(_("Timed out after %.1fs on a %.1f MB sample") % (self.tester.timeout,
+                                                                         stats.sample_bytes / (1024 * 1024)))
+        elif stats.sample_bytes:
+            lines.append(_("%d matches in %d lines (%.1f per MB), slowest line %d took %.2f ms") % (
+                stats.matches, stats.lines, stats.matches_per_mb, stats.slowest_line_number,
+                stats.slowest_line_seconds * 1000))
+        if stats.warning:
+            lines.append(_("Warning: %s") % stats.warning)
+        self.SetLabel("\n".join(lines))
+        self.SetForegroundColour(wx.RED if stats.timed_out or stats.warning else wx.NullColour)
+        self.GetParent().Layout()
+
+    def ShowError(self, error, generation):
+        if generation == self.generation and self:
+            self.SetLabel(_("Pattern test failed: %s") % error)
+
+    def OnDestroy(self, event):
+        if event.GetEventObject() is self:
+            if self.timer is not None:
+                self.timer.Stop()
+            self.tester.close()
+        event.Skip()
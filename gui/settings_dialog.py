@@ -1,10 +1,12 @@
 import wx
+from gui.pattern_feedback import PatternFeedback
 from utils.localization import _
 
 class SettingsDialog(wx.Dialog):
-    def __init__(self, parent, settings_manager):
+    def __init__(self, parent, settings_manager, get_sample_path=None):
         super().__init__(parent, title=_("Settings"))
         self.settings_manager = settings_manager
+        self.get_sample_path = get_sample_path
         self.SetupUI()
 
     def SetupUI(self):
@@ -25,12 +27,48 @@ class SettingsDialog(wx.Dialog):
         self.delimiter_input.SetValue(current_delimiter)
         sizer.Add(delimiter_label, 0, wx.ALL, 5)
         sizer.Add(self.delimiter_input, 0, wx.ALL | wx.EXPAND, 5)
+        self.pattern_feedback = PatternFeedback(self, self.delimiter_input, self.settings_manager, self.get_sample_path)
+        sizer.Add(self.pattern_feedback, 0, wx.ALL | wx.EXPAND, 5)
         
         # Auto-update settings
         self.auto_update_checkbox = wx.CheckBox(self, label=_("Check for updates automatically"))
         self.auto_update_checkbox.SetValue(self.settings_manager.get_setting("auto_update", True))
         sizer.Add(self.auto_update_checkbox, 0, wx.ALL, 5)
         
+        # Processing performance
+        execution_label = wx.StaticText(self, label=_("Parsing Backend:"))
+        self.execution_choice = wx.Choice(self, choices=[_("Threads"), _("Processes")])
+        execution_mode = self.settings_manager.get_setting("execution_mode", "thread")
+        self.execution_choice.SetSelection(1 if execution_mode == "process" else 0)
+        sizer.Add(execution_label, 0, wx.ALL, 5)
+        sizer.Add(self.execution_choice, 0, wx.ALL | wx.EXPAND, 5)
+        
+        workers_label = wx.StaticText(self, label=_("Worker Count (0 = automatic):"))
+        self.worker_count_input = wx.SpinCtrl(self, min=0, max=256,
+                                              initial=self.settings_manager.get_setting("worker_count", 0))
+        sizer.Add(workers_label, 0, wx.ALL, 5)
+        sizer.Add(self.worker_count_input, 0, wx.ALL | wx.EXPAND, 5)
+        
+        chunk_size_label = wx.StaticText(self, label=_("Chunk Size (MB):"))
+        chunk_size_mb = self.settings_manager.get_setting("chunk_size", 1024*1024) // (1024*1024)
+        self.chunk_size_input = wx.SpinCtrl(self, min=1, max=1024, initial=max(1, chunk_size_mb))
+        sizer.Add(chunk_size_label, 0, wx.ALL, 5)
+        sizer.Add(self.chunk_size_input, 0, wx.ALL | wx.EXPAND, 5)
+        
+        self.adaptive_chunk_checkbox = wx.CheckBox(self, label=_("Adjust chunk size automatically"))
+        self.adaptive_chunk_checkbox.SetValue(self.settings_manager.get_setting("adaptive_chunk_size", True))
+        sizer.Add(self.adaptive_chunk_checkbox, 0, wx.ALL, 5)
+        
+        memory_label = wx.StaticText(self, label=_("Memory High-Water Mark (MB, 0 = automatic):"))
+        self.memory_high_water_input = wx.SpinCtrl(self, min=0, max=1024*1024,
+                                                   initial=self.settings_manager.get_setting("memory_high_water_mb", 0))
+        sizer.Add(memory_label, 0, wx.ALL, 5)
+        sizer.Add(self.memory_high_water_input, 0, wx.ALL | wx.EXPAND, 5)
+        
+        self.index_cache_checkbox = wx.CheckBox(self, label=_("Cache file indexes for faster re-opening"))
+        self.index_cache_checkbox.SetValue(self.settings_manager.get_setting("index_cache_enabled", True))
+        sizer.Add(self.index_cache_checkbox, 0, wx.ALL, 5)
+        
         # Buttons
         button_sizer = wx.StdDialogButtonSizer()
         save_button = wx.Button(self, wx.ID_SAVE)
@@ -47,4 +85,11 @@ class SettingsDialog(wx.Dialog):
         self.settings_manager.set_setting("theme", self.theme_choice.GetStringSelection())
         self.settings_manager.set_setting("delimiter_pattern", self.delimiter_input.GetValue())
         self.settings_manager.set_setting("auto_update", self.auto_update_checkbox.GetValue())
+        self.settings_manager.set_setting("execution_mode",
+                                          "process" if self.execution_choice.GetSelection() == 1 else "thread")
+        self.settings_manager.set_setting("worker_count", self.worker_count_input.GetValue())
+        self.settings_manager.set_setting("chunk_size", self.chunk_size_input.GetValue() * 1024 * 1024)
+        self.settings_manager.set_setting("adaptive_chunk_size", self.adaptive_chunk_checkbox.GetValue())
+        self.settings_manager.set_setting("memory_high_water_mb", self.memory_high_water_input.GetValue())
+        self.settings_manager.set_setting("index_cache_enabled", self.index_cache_checkbox.GetValue())
         self.EndModal(wx.ID_SAVE)
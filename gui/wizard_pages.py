@@ -1,5 +1,10 @@
 import wx
 import wx.adv
+import threading
+from core.path_trie import PathNode, PathTrie
+from core.record_index import DUPLICATE_POLICIES
+from gui.pattern_feedback import PatternFeedback
+from utils.progress_reporter import ProgressReporter, format_eta
 from utils.localization import _
 
 class WelcomePage(wx.adv.WizardPageSimple):
@@ -31,10 +36,15 @@ class FileSelectionPage(wx.adv.WizardPageSimple):
     def SetFilePath(self, path):
         self.file_picker.SetPath(path)
 
+    def GetFilePath(self):
+        return self.file_picker.GetPath()
+
 class ProcessingOptionsPage(wx.adv.WizardPageSimple):
-    def __init__(self, parent, settings_manager):
+    def __init__(self, parent, settings_manager, file_processor=None, get_file_path=None):
         super().__init__(parent)
         self.settings_manager = settings_manager
+        self.file_processor = file_processor
+        self.get_file_path = get_file_path
         self.SetupUI()
 
     def SetupUI(self):
@@ -47,40 +57,186 @@ class ProcessingOptionsPage(wx.adv.WizardPageSimple):
         self.delimiter_input.SetValue(current_delimiter)
         sizer.Add(delimiter_label, 0, wx.ALL, 5)
         sizer.Add(self.delimiter_input, 0, wx.ALL | wx.EXPAND, 5)
+        self.pattern_feedback = PatternFeedback(self, self.delimiter_input, self.settings_manager, self.get_file_path)
+        sizer.Add(self.pattern_feedback, 0, wx.ALL | wx.EXPAND, 5)
+
+        # Quick preview: parses a sample of the file with the pattern above
+        self.quick_preview_button = wx.Button(self, label=_("Quick Preview"))
+        self.quick_preview_text = wx.StaticText(self, label="")
+        self.quick_preview_button.Enable(self.file_processor is not None)
+        sizer.Add(self.quick_preview_button, 0, wx.ALL, 5)
+        sizer.Add(self.quick_preview_text, 0, wx.ALL | wx.EXPAND, 5)
+        self.quick_preview_button.Bind(wx.EVT_BUTTON, self.OnQuickPreview)
 
         # Output options
         output_label = wx.StaticText(self, label=_("Output Options:"))
         self.create_zip_checkbox = wx.CheckBox(self, label=_("Create ZIP archive"))
-        self.create_zip_checkbox.SetValue(True)
+        self.create_zip_checkbox.SetValue(self.settings_manager.get_setting("create_zip", True))
         sizer.Add(output_label, 0, wx.ALL, 5)
         sizer.Add(self.create_zip_checkbox, 0, wx.ALL, 5)
 
+        # Without extraction the archive is built straight from the input file
+        self.extract_files_checkbox = wx.CheckBox(self, label=_("Extract files to output directory"))
+        self.extract_files_checkbox.SetValue(self.settings_manager.get_setting("extract_files", True))
+        sizer.Add(self.extract_files_checkbox, 0, wx.ALL, 5)
+
+        self.deduplicate_checkbox = wx.CheckBox(self, label=_("Store identical files only once"))
+        self.deduplicate_checkbox.SetValue(self.settings_manager.get_setting("deduplicate_output", False))
+        sizer.Add(self.deduplicate_checkbox, 0, wx.ALL, 5)
+
+        duplicates_label = wx.StaticText(self, label=_("Records with the same path:"))
+        self.duplicates_choice = wx.Choice(self, choices=[
+            _("Append to one file"), _("Keep the first"), _("Keep the last"), _("Write numbered copies")])
+        policy = self.settings_manager.get_setting("duplicate_paths", "concat")
+        self.duplicates_choice.SetSelection(DUPLICATE_POLICIES.index(policy) if policy in DUPLICATE_POLICIES else 0)
+        sizer.Add(duplicates_label, 0, wx.ALL, 5)
+        sizer.Add(self.duplicates_choice, 0, wx.ALL | wx.EXPAND, 5)
+
+        # Archive format and compression
+        format_label = wx.StaticText(self, label=_("Archive Format:"))
+        self.archive_format_choice = wx.Choice(self, choices=["zip", "tar.gz", "tar.xz"])
+        self.archive_format_choice.SetStringSelection(self.settings_manager.get_setting("archive_format", "zip"))
+        sizer.Add(format_label, 0, wx.ALL, 5)
+        sizer.Add(self.archive_format_choice, 0, wx.ALL | wx.EXPAND, 5)
+
+        compression_label = wx.StaticText(self, label=_("ZIP Compression:"))
+        self.compression_choice = wx.Choice(self, choices=["auto", "stored", "deflate", "bzip2", "lzma"])
+        self.compression_choice.SetStringSelection(self.settings_manager.get_setting("compression", "deflate"))
+        sizer.Add(compression_label, 0, wx.ALL, 5)
+        sizer.Add(self.compression_choice, 0, wx.ALL | wx.EXPAND, 5)
+
+        level_label = wx.StaticText(self, label=_("Compression Level (1 = fastest, 9 = smallest):"))
+        self.compression_level_input = wx.SpinCtrl(self, min=1, max=9,
+                                                   initial=self.settings_manager.get_setting("compression_level", 6))
+        sizer.Add(level_label, 0, wx.ALL, 5)
+        sizer.Add(self.compression_level_input, 0, wx.ALL | wx.EXPAND, 5)
+
         self.SetSizer(sizer)
+        self.Bind(wx.adv.EVT_WIZARD_PAGE_CHANGING, self.OnPageChanging)
+
+    def GetOptions(self):
+        return {
+            "delimiter_pattern": self.delimiter_input.GetValue(),
+            "create_zip": self.create_zip_checkbox.GetValue(),
+            "extract_files": self.extract_files_checkbox.GetValue(),
+            "deduplicate_output": self.deduplicate_checkbox.GetValue(),
+            "duplicate_paths": DUPLICATE_POLICIES[self.duplicates_choice.GetSelection()],
+            "archive_format": self.archive_format_choice.GetStringSelection(),
+            "compression": self.compression_choice.GetStringSelection(),
+            "compression_level": self.compression_level_input.GetValue(),
+        }
+
+    def OnQuickPreview(self, event):
+        file_path = self.get_file_path() if self.get_file_path else ""
+        if not file_path:
+            self.quick_preview_text.SetLabel(_("Choose a file first."))
+            return
+        delimiter_pattern = self.delimiter_input.GetValue()
+        self.quick_preview_button.Disable()
+        self.quick_preview_text.SetLabel(_("Sampling..."))
+
+        def run():
+            try:
+                preview = self.file_processor.quick_preview(file_path, delimiter_pattern)
+                wx.CallAfter(self.ShowQuickPreview, preview)
+            except Exception as e:
+                wx.CallAfter(self.ShowQuickPreview, None, str(e))
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def ShowQuickPreview(self, preview, error=None):
+        self.quick_preview_button.Enable()
+        if preview is None:
+            self.quick_preview_text.SetLabel(_("Preview failed: %s") % error)
+            return
+        approximate = "" if preview.exact else "~"
+        self.quick_preview_text.SetLabel(
+            _("%s%d records, %s%d files in %d directories (up to %d entries each), %s%.1f MB of output\n"
+              "Sampled %.1f of %.1f MB in %.2fs") % (
+                approximate, preview.estimated_records, approximate, preview.estimated_files,
+                preview.directories, preview.max_fan_out, approximate,
+                preview.estimated_output_bytes / (1024 * 1024),
+                preview.sampled_bytes / (1024 * 1024), preview.file_size / (1024 * 1024), preview.elapsed))
+        self.Layout()
+
+    def OnPageChanging(self, event):
+        # The file processor reads archive options from the settings manager
+        options = self.GetOptions()
+        for key in ("create_zip", "extract_files", "deduplicate_output", "duplicate_paths", "archive_format",
+                    "compression", "compression_level"):
+            self.settings_manager.set_setting(key, options[key])
+        event.Skip()
 
 class PreviewPage(wx.adv.WizardPageSimple):
+    # Directories are only filled in when expanded, and at most PAGE_SIZE
+    # children at a time, so the tree stays small however many records there are.
+    PAGE_SIZE = 500
+
     def __init__(self, parent, file_processor):
         super().__init__(parent)
         self.file_processor = file_processor
+        self.preview_generation = 0
         self.SetupUI()
 
     def SetupUI(self):
         sizer = wx.BoxSizer(wx.VERTICAL)
         self.preview_tree = wx.TreeCtrl(self, style=wx.TR_DEFAULT_STYLE | wx.TR_HIDE_ROOT)
+        self.summary_text = wx.StaticText(self, label="")
         sizer.Add(self.preview_tree, 1, wx.ALL | wx.EXPAND, 10)
+        sizer.Add(self.summary_text, 0, wx.ALL, 10)
         self.SetSizer(sizer)
+        self.preview_tree.Bind(wx.EVT_TREE_ITEM_EXPANDING, self.OnItemExpanding)
+        self.preview_tree.Bind(wx.EVT_TREE_ITEM_ACTIVATED, self.OnItemActivated)
 
     def UpdatePreview(self, file_structure):
+        # The trie is built on a worker thread; only the top level is added
+        # to the tree control once it is ready.
+        self.preview_generation += 1
+        generation = self.preview_generation
+        self.preview_tree.DeleteAllItems()
+        self.summary_text.SetLabel(_("Building preview..."))
+
+        def build():
+            trie = PathTrie(file_structure)
+            wx.CallAfter(self.ShowTrie, trie, generation)
+
+        threading.Thread(target=build, daemon=True).start()
+
+    def ShowTrie(self, trie, generation):
+        if generation != self.preview_generation:
+            return  # superseded by a newer preview
         self.preview_tree.DeleteAllItems()
         root = self.preview_tree.AddRoot("Root")
-        self.AddTreeNodes(root, file_structure)
+        self.AddTreeNodes(root, trie.root)
+        self.summary_text.SetLabel(_("%d records in %d files") % (trie.root.records, trie.root.files))
+
+    def AddTreeNodes(self, parent, node, offset=0):
+        children, remaining = node.sorted_children(offset, self.PAGE_SIZE)
+        for child in children:
+            label = child.name if child.records == 1 else f"{child.name} ({child.records})"
+            item = self.preview_tree.AppendItem(parent, label, data=child)
+            if child.children:
+                self.preview_tree.SetItemHasChildren(item, True)
+        if remaining:
+            more = self.preview_tree.AppendItem(parent, _("... %d more") % remaining)
+            self.preview_tree.SetItemData(more, (node, offset + len(children)))
+
+    def OnItemExpanding(self, event):
+        item = event.GetItem()
+        node = self.preview_tree.GetItemData(item)
+        if isinstance(node, PathNode) and not self.preview_tree.GetChildrenCount(item, recursively=False):
+            self.AddTreeNodes(item, node)
 
-    def AddTreeNodes(self, parent, items):
-        for path, content in items.items():
-            parts = path.split('/')
-            current = parent
-            for part in parts[1:]:  # Skip 'project_root'
-                child = self.preview_tree.AppendItem(current, part)
-                current = child
+    def OnItemActivated(self, event):
+        item = event.GetItem()
+        more = self.preview_tree.GetItemData(item)
+        if isinstance(more, tuple):
+            # Replace the "... N more" entry with the next page of children
+            parent = self.preview_tree.GetItemParent(item)
+            self.preview_tree.Delete(item)
+            self.AddTreeNodes(parent, *more)
+        else:
+            event.Skip()
 
 class ProcessingPage(wx.adv.WizardPageSimple):
     def __init__(self, parent, file_processor):
@@ -97,10 +253,31 @@ class ProcessingPage(wx.adv.WizardPageSimple):
         self.SetSizer(sizer)
 
     def UpdateProgress(self, value, status=None):
+        if not wx.IsMainThread():
+            wx.CallAfter(self.UpdateProgress, value, status)
+            return
         self.progress_bar.SetValue(value)
         if status:
             self.status_text.SetLabel(status)
 
+    def CreateReporter(self):
+        # Pass as progress_callback; widgets are only touched on the GUI thread
+        return ProgressReporter(lambda snapshot: wx.CallAfter(self.ShowProgress, snapshot))
+
+    def ShowProgress(self, snapshot):
+        if self:
+            self.UpdateProgress(snapshot.percent, FormatProgress(snapshot))
+
+def FormatProgress(snapshot):
+    phases = {"parse": _("Parsing"), "write": _("Writing files"), "merge": _("Merging output"),
+              "zip": _("Creating archive"), "batch": _("Processing files")}
+    parts = [_("%s: %d%%") % (phases.get(snapshot.phase, _("Processing")), snapshot.percent),
+             _("%.1f MB/s") % (snapshot.bytes_per_second / (1024 * 1024))]
+    if snapshot.records:
+        parts.append(_("%d records/s") % snapshot.records_per_second)
+    parts.append(_("%s remaining") % format_eta(snapshot.eta))
+    return ", ".join(parts)
+
 class CompletionPage(wx.adv.WizardPageSimple):
     def __init__(self, parent):
         super().__init__(parent)
@@ -0,0 +1,143 @@
+import unittest
+import subprocess
+import sys
+from unittest.mock import MagicMock, patch
+from core.batch_scheduler import BatchScheduler
+from core.file_processor import FileProcessor
+import tempfile
+import json
+import os
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestBatchScheduler(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.settings_manager = MagicMock()
+        self.settings_manager.get_setting.side_effect = lambda key, default=None: default
+        cache_home = patch.dict(os.environ, {'XDG_CACHE_HOME': self.work_dir.name})
+        cache_home.start()
+        self.addCleanup(cache_home.stop)
+        self.output_dir = os.path.join(self.work_dir.name, 'out')
+
+    def tearDown(self):
+        self.work_dir.cleanup()
+
+    def write_input(self, name, records):
+        path = os.path.join(self.work_dir.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            for i in range(records):
+                f.write(f"/project_root/{name}/file{i % 7}.txt\nline{i}\n")
+        return path
+
+    def test_runs_largest_first_and_skips_duplicates(self):
+        small = self.write_input('small.txt', 10)
+        large = self.write_input('large.txt', 500)
+        medium = self.write_input('medium.txt', 100)
+        copy = os.path.join(self.work_dir.name, 'copy.txt')
+        with open(medium) as src, open(copy, 'w') as dst:
+            dst.write(src.read())
+
+        started = []
+        original = FileProcessor.process_large_file
+
+        def tracking(processor, file_path, output_dir, progress_callback=None):
+            started.append(os.path.basename(file_path))
+            return original(processor, file_path, output_dir, progress_callback)
+
+        scheduler = BatchScheduler(self.settings_manager, parallel_files=1)
+        with patch.object(FileProcessor, 'process_large_file', autospec=True, side_effect=tracking):
+            report = scheduler.run([small, large, medium, copy, os.path.join(self.work_dir.name, '.', 'small.txt')],
+                                   self.output_dir)
+
+        self.assertEqual(started, ['large.txt', 'medium.txt', 'small.txt'])
+        self.assertEqual([result.status for result in report.results], ['ok', 'ok', 'ok', 'duplicate', 'duplicate'])
+        self.assertEqual(report.results[3].duplicate_of, medium)
+        self.assertTrue(report.succeeded)
+        with open(os.path.join(self.output_dir, 'large', 'project_root', 'large.txt', 'file3.txt')) as f:
+            self.assertEqual(f.read(), ''.join(f"line{i}\n" for i in range(3, 500, 7)))
+
+    def test_shared_pool_archives_and_report(self):
+        first = self.write_input(os.path.join('a', 'dump.txt'), 50)
+        second = self.write_input(os.path.join('b', 'dump.txt'), 60)
+        missing = os.path.join(self.work_dir.name, 'missing.txt')
+        progress = []
+
+        scheduler = BatchScheduler(self.settings_manager, parallel_files=2)
+        report = scheduler.run([first, second, missing], self.output_dir, create_archive=True, extract=False,
+                               progress_callback=progress.append)
+
+        self.assertEqual(sorted(os.listdir(self.output_dir)), ['dump-2.zip', 'dump.zip'])
+        self.assertEqual([result.status for result in report.results], ['ok', 'ok', 'failed'])
+        self.assertFalse(report.succeeded)
+        self.assertEqual(progress[-1], 100)
+        self.assertIn("failed: " + missing, report.summary())
+
+        report_path = os.path.join(self.work_dir.name, 'report.json')
+        report.write(report_path)
+        with open(report_path) as f:
+            self.assertEqual(json.load(f)["counts"], {"ok": 2, "duplicate": 0, "failed": 1, "cancelled": 0})
+
+    def test_failed_chunk_fails_the_job(self):
+        good = self.write_input('good.txt', 50)
+        bad = self.write_input('bad.txt', 50)
+        original = FileProcessor._process_range
+
+        def failing_range(processor, mm, start, end):
+            if b'bad.txt' in mm[start:end]:
+                raise OSError("injected failure")
+            return original(processor, mm, start, end)
+
+        scheduler = BatchScheduler(self.settings_manager, parallel_files=1)
+        with patch.object(FileProcessor, '_process_range', autospec=True, side_effect=failing_range):
+            report = scheduler.run([good, bad], self.output_dir)
+        self.assertEqual([result.status for result in report.results], ['ok', 'failed'])
+        self.assertIn("injected failure", report.results[1].error)
+        self.assertFalse(report.succeeded)
+        self.assertEqual(sorted(os.listdir(self.output_dir)), ['good'])
+
+    def test_cancel_before_job_starts_processing(self):
+        path = self.write_input('dump.txt', 200)
+        scheduler = BatchScheduler(self.settings_manager, parallel_files=1)
+        original = FileProcessor.process_large_file
+
+        def cancel_first(processor, file_path, output_dir, progress_callback=None):
+            scheduler.cancel()
+            return original(processor, file_path, output_dir, progress_callback)
+
+        with patch.object(FileProcessor, 'process_large_file', autospec=True, side_effect=cancel_first), \
+                patch.object(FileProcessor, '_process_range', autospec=True) as process_range:
+            report = scheduler.run([path], self.output_dir)
+        self.assertEqual([result.status for result in report.results], ['cancelled'])
+        process_range.assert_not_called()
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, 'dump')))
+
+        report = scheduler.run([path], self.output_dir)
+        self.assertEqual([result.status for result in report.results], ['ok'])
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), "needs RLIMIT_NOFILE and fork")
+    def test_process_pool_batch_under_low_file_limit(self):
+        # Each worker mmap holds a file descriptor; a shared pool must not
+        # keep one open for every input of the batch
+        inputs = [self.write_input(f'input{i}.txt', 20) for i in range(150)]
+        code = (
+            "import resource, sys\n"
+            "from unittest.mock import MagicMock\n"
+            "from core.batch_scheduler import BatchScheduler\n"
+            "resource.setrlimit(resource.RLIMIT_NOFILE, (32, resource.getrlimit(resource.RLIMIT_NOFILE)[1]))\n"
+            "settings = {'execution_mode': 'process', 'worker_count': 2, 'index_cache_enabled': False}\n"
+            "settings_manager = MagicMock()\n"
+            "settings_manager.get_setting.side_effect = lambda key, default=None: settings.get(key, default)\n"
+            "report = BatchScheduler(settings_manager, parallel_files=1).run(sys.argv[2:], sys.argv[1])\n"
+            "sys.exit(0 if report.succeeded else 1)\n")
+        completed = subprocess.run([sys.executable, '-c', code, self.output_dir, *inputs], cwd=ROOT_DIR,
+                                   capture_output=True, text=True)
+        self.assertEqual(completed.returncode, 0, completed.stdout[-2000:] + completed.stderr[-2000:])
+        for i in range(150):
+            with open(os.path.join(self.output_dir, f'input{i}', 'project_root', f'input{i}.txt', 'file6.txt')) as f:
+                self.assertEqual(f.read(), "line6\nline13\n")
+
+if __name__ == '__main__':
+    unittest.main()
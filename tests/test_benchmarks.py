@@ -0,0 +1,83 @@
+import io
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import contextlib
+from benchmarks import bench_codecs
+from benchmarks.bench_processor import compare, run_benchmarks
+from benchmarks.corpus import generate_corpus
+
+
+class TestCorpus(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def read(self, name):
+        with open(os.path.join(self.temp_dir, name), 'rb') as f:
+            return f.read()
+
+    def test_same_seed_same_bytes(self):
+        for name, seed in (('a.txt', 1), ('b.txt', 1), ('c.txt', 2)):
+            generate_corpus(os.path.join(self.temp_dir, name), 200, utf8_ratio=0.3, blob_ratio=0.1, seed=seed)
+        self.assertEqual(self.read('a.txt'), self.read('b.txt'))
+        self.assertNotEqual(self.read('a.txt'), self.read('c.txt'))
+
+    def test_record_shape(self):
+        path = os.path.join(self.temp_dir, 'corpus.txt')
+        stats = generate_corpus(path, 300, body_size="fixed:100", depth=3, utf8_ratio=0.5, duplicate_ratio=0.2)
+        data = self.read('corpus.txt')
+        self.assertEqual(stats.bytes, len(data))
+        headers = [line for line in data.decode('utf-8').split('\n') if line.startswith('/project_root/')]
+        self.assertEqual(len(headers), 300)
+        self.assertEqual(len(set(headers)), stats.distinct_paths)
+        self.assertLess(stats.distinct_paths, 300)
+        self.assertTrue(all(2 <= header.count('/') <= 5 for header in headers))
+        self.assertNotEqual(len(data), len(data.decode('utf-8')))
+
+    def test_size_target(self):
+        stats = generate_corpus(os.path.join(self.temp_dir, 'corpus.txt'), size_mb=0.25)
+        self.assertGreaterEqual(stats.bytes, 256 * 1024)
+        self.assertLess(stats.bytes, 512 * 1024)
+
+
+class TestBenchProcessor(unittest.TestCase):
+    def test_runs_every_benchmark(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'corpus.txt')
+            generate_corpus(path, 100, body_size="fixed:200")
+            report = run_benchmarks(path, repeat=1)
+        self.assertEqual(report["records"], 100)
+        self.assertEqual([result["benchmark"] for result in report["results"]],
+                         ["process_file", "process_large_file", "_process_chunk", "create_zip_archive"])
+        for result in report["results"]:
+            self.assertGreater(result["mb_per_s"], 0)
+            self.assertGreater(result["peak_rss_mb"], 0)
+
+    def test_compare_flags_regressions(self):
+        baseline = {"results": [{"benchmark": "process_file", "mb_per_s": 100.0},
+                                {"benchmark": "_process_chunk", "mb_per_s": 100.0}]}
+        report = {"results": [{"benchmark": "process_file", "mb_per_s": 95.0},
+                              {"benchmark": "_process_chunk", "mb_per_s": 80.0}]}
+        self.assertEqual(compare(report, baseline, 0.1), [("_process_chunk", 100.0, 80.0)])
+
+
+
+class TestBenchCodecs(unittest.TestCase):
+    def test_json_output_parses(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'corpus.txt')
+            generate_corpus(path, 50, body_size="fixed:200")
+            stdout = io.StringIO()
+            with contextlib.redirect_stdout(stdout):
+                bench_codecs.main(["--input", path, "--json"])
+        report = json.loads(stdout.getvalue())
+        self.assertEqual(len(report["results"]), len(bench_codecs.CODECS))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from core.chunk_scheduler import ChunkScheduler
+
+MB = 1024 * 1024
+
+
+class TestChunkScheduler(unittest.TestCase):
+    def setUp(self):
+        self.clock = [0.0]
+        patcher = patch('core.chunk_scheduler.time.perf_counter', side_effect=lambda: self.clock[0])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.governor = MagicMock(under_pressure=False, rss=100 * MB)
+        self.scheduler = ChunkScheduler(MB, MB // 4, 16 * MB, window=8, governor=self.governor)
+
+    def feed(self, parse_seconds, wall_seconds, chunks=4):
+        for _ in range(chunks):
+            self.scheduler.on_chunk_done(None)
+            self.clock[0] += wall_seconds
+            self.scheduler.record(self.scheduler.chunk_size, parse_seconds)
+
+    def test_grows_while_chunks_are_cheap(self):
+        self.feed(parse_seconds=0.001, wall_seconds=0.001)
+        self.assertEqual(self.scheduler.chunk_size, 2 * MB)
+        self.feed(parse_seconds=0.001, wall_seconds=0.001)
+        self.assertEqual(self.scheduler.chunk_size, 4 * MB)
+        self.assertEqual([d.reason for d in self.scheduler.decisions], ["per-chunk overhead"] * 2)
+
+    def test_reverts_growth_that_lowered_throughput(self):
+        self.feed(parse_seconds=0.001, wall_seconds=0.001)
+        # Twice the bytes per chunk, but four times the wall time
+        self.feed(parse_seconds=0.001, wall_seconds=0.004)
+        self.assertEqual(self.scheduler.chunk_size, MB)
+        self.assertEqual(self.scheduler.decisions[-1].reason, "throughput dropped")
+
+        # ...and doesn't try that size again
+        self.feed(parse_seconds=0.001, wall_seconds=0.001)
+        self.assertEqual(self.scheduler.chunk_size, MB)
+
+    def test_shrinks_under_memory_pressure_and_for_slow_chunks(self):
+        self.governor.under_pressure = True
+        self.feed(parse_seconds=0.001, wall_seconds=0.001)
+        self.assertEqual(self.scheduler.chunk_size, MB // 2)
+        self.assertEqual(self.scheduler.decisions[-1].rss, 100 * MB)
+
+        self.governor.under_pressure = False
+        self.feed(parse_seconds=2.0, wall_seconds=2.0)
+        self.assertEqual(self.scheduler.chunk_size, MB // 4)
+        self.feed(parse_seconds=2.0, wall_seconds=2.0)
+        self.assertEqual(self.scheduler.chunk_size, MB // 4)  # clamped to the minimum
+
+    def test_backlog_of_finished_chunks_blocks_growth(self):
+        for _ in range(8):
+            self.scheduler.on_chunk_done(None)
+        self.feed(parse_seconds=0.001, wall_seconds=0.001)
+        self.assertEqual(self.scheduler.chunk_size, MB)
+
+    def test_fixed_size_never_changes(self):
+        scheduler = ChunkScheduler(MB, MB, MB)
+        for _ in range(20):
+            scheduler.record(MB, 0.0)
+        self.assertEqual(scheduler.chunk_size, MB)
+        self.assertEqual(scheduler.decisions, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import re
+from core.delimiter_scanner import DelimiterScanner
+
+SAMPLE = (b"preamble /project_root/not_a_header\n"
+          b"/project_root/a.txt\n"
+          b"alpha\n"
+          b"  /project_root/indented\n"
+          b"/project_root/b.py\n"
+          b"/project_root/c.md\n"
+          b"gamma \xc3\xa9\n")
+
+
+def line_headers(pattern, data):
+    offsets = []
+    position = 0
+    # Nothing after the final newline is a line
+    for line in data[:-1].split(b'\n') if data.endswith(b'\n') else data.split(b'\n'):
+        if re.match(pattern, line.decode('utf-8')):
+            offsets.append(position)
+        position += len(line) + 1
+    return offsets
+
+
+class TestDelimiterScanner(unittest.TestCase):
+    def test_literal_prefix_uses_fast_path(self):
+        scanner = DelimiterScanner(r'^/project_root/')
+        self.assertEqual(scanner.literal, b'/project_root/')
+        self.assertIsNone(DelimiterScanner(r'^/project_root/.*\.py$').literal)
+        self.assertEqual(DelimiterScanner(r'^\./src\.d/').literal, b'./src.d/')
+
+    def test_matches_line_by_line_regex(self):
+        for pattern in (r'^/project_root/', r'^/project_root/.*\.(txt|md)$', r'/project_root/[bc]', r'^\s+/project'):
+            scanner = DelimiterScanner(pattern)
+            headers = [record[0] for record in scanner.iter_records(SAMPLE, 0, len(SAMPLE))]
+            self.assertEqual(headers, line_headers(pattern, SAMPLE), pattern)
+
+    def test_matches_do_not_cross_lines(self):
+        data = (b"\n\n  /x/a.txt\nbody\n\n/x/b.txt\n# comment\n\nplain\n"
+                b"\t\n/x/c.txt\n")
+        for pattern in (r'^\s*/x/', r'^[^#]', r'^\s*$', r'^[^a-z]*/x/[bc]'):
+            scanner = DelimiterScanner(pattern)
+            headers = [record[0] for record in scanner.iter_records(data, 0, len(data))]
+            self.assertEqual(headers, line_headers(pattern, data), pattern)
+
+    def test_regex_attempts_stay_within_one_line(self):
+        data = b"".join(b"/project_root/file%d.bin\n" % i + b"QUJD" * 19 + b"\n" + b"QUJD" * 19 + b"\n"
+                        for i in range(50))
+        for pattern, prefix in ((r'^/project_root/[^ ]+$', b'/project_root/'), (r'^[^ ]+\.bin$', b'')):
+            scanner = DelimiterScanner(pattern)
+            self.assertEqual(scanner.prefix, prefix)
+            calls = []
+
+            class RecordingRegex:
+                def match(self, buf, pos, endpos):
+                    calls.append((pos, endpos))
+                    return scanner_regex.match(buf, pos, endpos)
+
+            scanner_regex, scanner.regex = scanner.regex, RecordingRegex()
+            headers = [record[0] for record in scanner.iter_records(data, 0, len(data))]
+            self.assertEqual(headers, line_headers(pattern, data), pattern)
+            for pos, endpos in calls:
+                self.assertNotIn(b'\n', data[pos:endpos])
+            # With a literal prefix only the candidate lines are tried
+            self.assertEqual(len(calls), 50 if prefix else 150)
+
+    def test_required_prefix(self):
+        for pattern, prefix in ((r'^/x/(a|b)', b'/x/'), (r'^ab*c', b'a'), (r'^a|b', b''), (r'^(?i:abc)', b''),
+                                (r'^\./\d+', b'./'), ('^\u00e9/', '\u00e9/'.encode('utf-8'))):
+            self.assertEqual(DelimiterScanner(pattern + r'.').prefix, prefix, pattern)
+
+    def test_record_offsets(self):
+        scanner = DelimiterScanner(r'^/project_root/')
+        records = list(scanner.iter_records(SAMPLE, 0, len(SAMPLE)))
+        self.assertEqual(len(records), 3)
+        header_start, header_end, body_start, body_end = records[0]
+        self.assertEqual(SAMPLE[header_start:header_end], b'/project_root/a.txt')
+        self.assertEqual(SAMPLE[body_start:body_end], b'alpha\n  /project_root/indented\n')
+        self.assertEqual(records[1][2], records[1][3])
+        self.assertEqual(records[2][3], len(SAMPLE))
+
+    def test_header_without_trailing_newline(self):
+        data = b'/project_root/a.txt\nbody\n/project_root/last'
+        records = list(DelimiterScanner(r'^/project_root/').iter_records(data, 0, len(data)))
+        self.assertEqual(records[-1], (25, len(data), len(data), len(data)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,14 +1,29 @@
 import unittest
 from unittest.mock import MagicMock, patch
-from core.file_processor import FileProcessor
+from core.file_processor import FileProcessor, _iter_ordered, _process_file_range
+from core import file_processor as file_processor_module
+from core import index_cache as index_cache_module
+from core.record_index import RecordIndex
+from utils.metrics import Metrics
 import tempfile
+import json
 import os
+import zipfile
+import tarfile
 
 class TestFileProcessor(unittest.TestCase):
     def setUp(self):
         self.settings_manager = MagicMock()
+        self.settings_manager.get_setting.side_effect = lambda key, default=None: default
+        self.cache_dir = tempfile.TemporaryDirectory()
+        cache_home = patch.dict(os.environ, {'XDG_CACHE_HOME': self.cache_dir.name})
+        cache_home.start()
+        self.addCleanup(cache_home.stop)
         self.file_processor = FileProcessor(self.settings_manager)
 
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
     @patch('builtins.open', new_callable=unittest.mock.mock_open, read_data="/project_root/file1.txt\ncontent1\n/project_root/file2.txt\ncontent2\n")
     def test_process_file(self, mock_open):
         result = self.file_processor.process_file('dummy_file.txt')
@@ -42,5 +57,619 @@ class TestFileProcessor(unittest.TestCase):
             result = self.file_processor.process_file('dummy_file.txt')
             self.assertEqual(result, {})
 
+    def test_chunks_align_to_record_boundaries(self):
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False) as temp_file:
+            for i in range(50):
+                temp_file.write(f"/project_root/dir{i % 3}/file{i}.txt\nline one\u00e9\u4e2d\nline two {i}\n".encode('utf-8'))
+
+        try:
+            chunks = list(self.file_processor._read_file_chunks(temp_file.name, chunk_size=37))
+            self.assertGreater(len(chunks), 1)
+            for chunk in chunks:
+                self.assertTrue(chunk.startswith('/project_root/'))
+
+            merged = {}
+            for chunk in chunks:
+                merged.update(self.file_processor._process_chunk(chunk))
+            self.assertEqual(len(merged), 50)
+            self.assertEqual(merged['/project_root/dir1/file49.txt'], 'line one\u00e9\u4e2d\nline two 49')
+        finally:
+            os.unlink(temp_file.name)
+
+    def test_non_utf8_input_keeps_every_record(self):
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False) as temp_file:
+            for i in range(2001):
+                header = b"/project_root/caf\xe9.txt" if i == 1000 else f"/project_root/file{i}.txt".encode()
+                temp_file.write(header + b"\n" + (b"latin-1 \xe9\n" if i == 7 else f"content{i}\n".encode()))
+
+        settings = {"chunk_size": 4096, "adaptive_chunk_size": False}
+        self.settings_manager.get_setting.side_effect = lambda key, default=None: settings.get(key, default)
+        output_dir = os.path.join(self.cache_dir.name, 'out')
+        try:
+            result = self.file_processor.process_file(temp_file.name)
+            self.assertEqual(len(result), 2001)
+            self.assertEqual(result['/project_root/caf\ufffd.txt'], 'content1000')
+            self.assertEqual(result['/project_root/file7.txt'], 'latin-1 \ufffd')
+
+            self.file_processor.process_large_file(temp_file.name, output_dir)
+            written = [name for _, _, files in os.walk(output_dir) for name in files]
+            self.assertEqual(len(written), 2001)
+            # Bodies are written byte for byte
+            with open(os.path.join(output_dir, 'project_root', 'file7.txt'), 'rb') as f:
+                self.assertEqual(f.read(), b"latin-1 \xe9\n")
+        finally:
+            os.unlink(temp_file.name)
+
+    def test_results_are_merged_in_file_order(self):
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as temp_file:
+            for i in range(2000):
+                temp_file.write(f"/project_root/file{i % 10}.txt\ncontent{i}\n" + "x" * 1000 + "\n")
+
+        settings = {"duplicate_paths": "last"}
+        self.settings_manager.get_setting.side_effect = lambda key, default=None: settings.get(key, default)
+        try:
+            result = self.file_processor.process_file(temp_file.name)
+            self.assertEqual(result['/project_root/file9.txt'], 'content1999\n' + 'x' * 1000)
+            self.assertEqual(result['/project_root/file0.txt'], 'content1990\n' + 'x' * 1000)
+        finally:
+            os.unlink(temp_file.name)
+
+    def test_cancel_stops_pending_chunks(self):
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as temp_file:
+            for i in range(5000):
+                temp_file.write(f"/project_root/file{i}.txt\n" + "x" * 100 + "\n")
+
+        processed = []
+        original = self.file_processor._process_range
+
+        def tracking_process_range(mm, start, end):
+            processed.append(start)
+            return original(mm, start, end)
+
+        try:
+            with patch.object(self.file_processor, '_process_range', side_effect=tracking_process_range):
+                with RecordIndex(temp_file.name) as index:
+                    results = self.file_processor._iter_chunk_results(index, chunk_size=1024)
+                    next(results)
+                    self.file_processor.cancel_flag.set()
+                    self.assertEqual(list(results), [])
+            self.assertLess(len(processed), 100)
+        finally:
+            os.unlink(temp_file.name)
+
+    def test_memory_pressure_pauses_intake(self):
+        submitted = []
+        pressure = {"on": False}
+
+        def submit(item):
+            submitted.append(item)
+            return item
+
+        consumed = []
+        for item, _ in _iter_ordered(submit, range(20), 4, self.file_processor.cancel_flag,
+                                     lambda: pressure["on"]):
+            consumed.append(item)
+            in_flight = len(submitted) - len(consumed)
+            if 6 <= item <= 10:
+                # The window has drained; only one item at a time while under pressure
+                self.assertEqual(in_flight, 1)
+            elif 11 <= item <= 15:
+                self.assertEqual(in_flight, 4)
+            pressure["on"] = 3 <= item < 10
+        self.assertEqual(consumed, list(range(20)))
+
+    def test_adaptive_chunk_size_matches_fixed(self):
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as temp_file:
+            for i in range(3000):
+                temp_file.write(f"/project_root/file{i}.txt\ncontent{i}\n")
+
+        settings = {"chunk_size": 1024, "min_chunk_size": 1024}
+        self.settings_manager.get_setting.side_effect = lambda key, default=None: settings.get(key, default)
+        try:
+            adaptive = self.file_processor.process_file(temp_file.name)
+            self.assertTrue(self.file_processor.chunk_scheduler.adaptive)
+
+            settings["adaptive_chunk_size"] = False
+            settings["index_cache_enabled"] = False
+            self.assertEqual(self.file_processor.process_file(temp_file.name), adaptive)
+            self.assertEqual(self.file_processor.chunk_scheduler.decisions, [])
+        finally:
+            os.unlink(temp_file.name)
+
+    def test_process_pool_matches_thread_pool(self):
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as temp_file:
+            for i in range(3000):
+                temp_file.write(f"/project_root/dir{i % 7}/file{i}.txt\ncontent{i}\n" + "y" * 200 + "\n")
+
+        settings = {"chunk_size": 64 * 1024, "worker_count": 2}
+        self.settings_manager.get_setting.side_effect = lambda key, default=None: settings.get(key, default)
+        try:
+            thread_result = self.file_processor.process_file(temp_file.name)
+            settings["execution_mode"] = "process"
+            process_result = self.file_processor.process_file(temp_file.name)
+            self.assertEqual(len(process_result), 3000)
+            self.assertEqual(list(process_result.items()), list(thread_result.items()))
+        finally:
+            os.unlink(temp_file.name)
+
+    def test_worker_mmaps_are_bounded_and_follow_replaced_files(self):
+        work_dir = tempfile.mkdtemp()
+        paths = []
+        for i in range(10):
+            paths.append(os.path.join(work_dir, f'input{i}.txt'))
+            with open(paths[-1], 'w') as f:
+                f.write(f"/project_root/file{i}.txt\ncontent{i}\n")
+        for path in paths:
+            _process_file_range(path, 0, os.path.getsize(path), r'^/project_root/')
+        self.assertLessEqual(len(file_processor_module._worker_mmaps), file_processor_module._WORKER_MMAP_LIMIT)
+
+        replacement = paths[-1] + '.new'
+        with open(replacement, 'w') as f:
+            f.write("/project_root/replaced.txt\nnew\n")
+        os.replace(replacement, paths[-1])
+        records = _process_file_range(paths[-1], 0, os.path.getsize(paths[-1]), r'^/project_root/')
+        self.assertEqual([record[0] for record in records], ['/project_root/replaced.txt'])
+
+    def test_index_consumers(self):
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as temp_file:
+            temp_file.write("/project_root/a/one.txt\nfirst\n/project_root/b.txt\n\u00e9t\u00e9\n/project_root/a/one.txt\nsecond")
+
+        output_dir = tempfile.mkdtemp()
+        zip_path = os.path.join(output_dir, 'out.zip')
+        try:
+            with self.file_processor.index_file(temp_file.name) as index:
+                self.assertEqual(list(index), ['/project_root/a/one.txt', '/project_root/b.txt', '/project_root/a/one.txt'])
+                self.assertEqual(bytes(index.content(1)), '\u00e9t\u00e9'.encode('utf-8'))
+                self.assertEqual(index.text(2), 'second')
+
+                self.file_processor.write_index(index, os.path.join(output_dir, 'tree'))
+                self.file_processor.create_zip_from_index(index, zip_path)
+
+            with open(os.path.join(output_dir, 'tree', 'project_root', 'a', 'one.txt')) as f:
+                self.assertEqual(f.read(), 'first\nsecond\n')
+            with zipfile.ZipFile(zip_path) as zipf:
+                self.assertEqual(zipf.namelist(), ['project_root/a/one.txt', 'project_root/b.txt'])
+                self.assertEqual(zipf.read('project_root/a/one.txt'), b'first\nsecond\n')
+        finally:
+            os.unlink(temp_file.name)
+
+    def test_index_cache_skips_parsing_unchanged_file(self):
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as temp_file:
+            for i in range(100):
+                temp_file.write(f"/project_root/file{i}.txt\ncontent{i}\n")
+
+        try:
+            first = self.file_processor.process_file(temp_file.name)
+            with patch.object(self.file_processor, '_iter_chunk_results') as mock_iter:
+                cached = self.file_processor.process_file(temp_file.name)
+                mock_iter.assert_not_called()
+            self.assertEqual(list(cached.items()), list(first.items()))
+
+            with open(temp_file.name, 'a') as f:
+                f.write("/project_root/new.txt\nnew\n")
+            os.utime(temp_file.name, ns=(0, os.stat(temp_file.name).st_mtime_ns + 1))
+            changed = self.file_processor.process_file(temp_file.name)
+            self.assertEqual(changed['/project_root/new.txt'], 'new')
+        finally:
+            os.unlink(temp_file.name)
+
+    def test_index_with_failed_chunk_is_not_cached(self):
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as temp_file:
+            for i in range(200):
+                temp_file.write(f"/project_root/file{i}.txt\ncontent{i}\n")
+
+        settings = {"chunk_size": 512, "adaptive_chunk_size": False}
+        self.settings_manager.get_setting.side_effect = lambda key, default=None: settings.get(key, default)
+        process_range = self.file_processor._process_range
+
+        def failing_range(mm, start, end):
+            if start == 0:
+                raise OSError("injected failure")
+            return process_range(mm, start, end)
+
+        try:
+            with patch.object(self.file_processor, '_process_range', side_effect=failing_range):
+                with self.assertRaisesRegex(RuntimeError, "1 chunk\\(s\\) .* failed to parse: injected failure"):
+                    self.file_processor.process_file(temp_file.name)
+            self.assertEqual(self.file_processor.failed_chunks, 1)
+            cache_dir = os.path.join(self.cache_dir.name, 'text_analyzer', 'index_cache')
+            self.assertEqual(os.listdir(cache_dir) if os.path.isdir(cache_dir) else [], [])
+
+            complete = self.file_processor.process_file(temp_file.name)
+            self.assertEqual(len(complete), 200)
+            self.assertNotEqual(os.listdir(cache_dir), [])
+        finally:
+            os.unlink(temp_file.name)
+
+    def test_failed_chunk_fails_write_and_archive_runs(self):
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as temp_file:
+            for i in range(200):
+                temp_file.write(f"/project_root/file{i}.txt\ncontent{i}\n")
+
+        settings = {"chunk_size": 512, "adaptive_chunk_size": False, "index_cache_enabled": False}
+        self.settings_manager.get_setting.side_effect = lambda key, default=None: settings.get(key, default)
+        process_range = self.file_processor._process_range
+
+        def failing_range(mm, start, end):
+            if start > 1024:
+                raise OSError("injected failure")
+            return process_range(mm, start, end)
+
+        output_dir = os.path.join(self.cache_dir.name, 'out')
+        try:
+            with patch.object(self.file_processor, '_process_range', side_effect=failing_range):
+                with self.assertRaises(RuntimeError):
+                    self.file_processor.process_large_file(temp_file.name, os.path.join(output_dir, 'tree'))
+                with self.assertRaises(RuntimeError):
+                    self.file_processor.process_file_to_zip(temp_file.name, os.path.join(output_dir, 'out.zip'),
+                                                            extract_dir=os.path.join(output_dir, 'extracted'))
+            self.assertEqual(os.listdir(output_dir) if os.path.isdir(output_dir) else [], [])
+        finally:
+            os.unlink(temp_file.name)
+
+    def test_appended_file_is_indexed_incrementally(self):
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as temp_file:
+            for i in range(100):
+                temp_file.write(f"/project_root/file{i}.txt\ncontent{i}\n")
+            temp_file.write("/project_root/last.txt\npartial")
+
+        try:
+            self.file_processor.process_file(temp_file.name)
+            with open(temp_file.name, 'a') as f:
+                f.write(" line\n/project_root/new.txt\nnew\n")
+
+            with patch.object(self.file_processor, '_iter_chunk_results',
+                              wraps=self.file_processor._iter_chunk_results) as mock_iter:
+                result = self.file_processor.process_file(temp_file.name)
+            resume_offset = mock_iter.call_args.kwargs['start_offset']
+            with open(temp_file.name, 'rb') as f:
+                self.assertEqual(f.read()[resume_offset:].split(b'\n')[0], b'/project_root/last.txt')
+            self.assertEqual(len(result), 102)
+            self.assertEqual(result['/project_root/last.txt'], 'partial line')
+            self.assertEqual(result['/project_root/new.txt'], 'new')
+
+            with open(temp_file.name, 'r+') as f:
+                f.write("/project_root/edit.txt\n")
+            result = self.file_processor.process_file(temp_file.name)
+            self.assertIn('/project_root/edit.txt', result)
+            self.assertNotIn('/project_root/file0.txt', result)
+        finally:
+            os.unlink(temp_file.name)
+
+    def test_appended_file_only_hashes_new_blocks(self):
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as temp_file:
+            for i in range(4000):
+                temp_file.write(f"/project_root/file{i:04}.txt\n" + "x" * 80 + "\n")
+        size = os.path.getsize(temp_file.name)
+        block_size = 4096
+        hashed = []
+        original_digest = index_cache_module._block_digest
+
+        def recording_digest(fd, offset, length):
+            hashed.append(offset // block_size)
+            return original_digest(fd, offset, length)
+
+        try:
+            with patch.object(index_cache_module, '_BLOCK_SIZE', block_size), \
+                    patch.object(index_cache_module, '_block_digest', side_effect=recording_digest):
+                self.file_processor.process_file(temp_file.name)
+                self.assertEqual(sorted(hashed), list(range(-(-size // block_size))))
+
+                with open(temp_file.name, 'a') as f:
+                    f.write("/project_root/new.txt\n" + "y" * 9000 + "\n")
+                hashed.clear()
+                result = self.file_processor.process_file(temp_file.name)
+            self.assertEqual(len(result), 4001)
+            # A sample of the old blocks is checked, then only the blocks
+            # from the old (partial) last one onwards are hashed for the store
+            new_size = os.path.getsize(temp_file.name)
+            old_blocks, new_blocks = -(-size // block_size), -(-new_size // block_size)
+            self.assertLess(len(hashed), 20 + new_blocks - old_blocks + 1)
+            self.assertEqual(sorted(hashed)[-(new_blocks - old_blocks + 1):], list(range(old_blocks - 1, new_blocks)))
+        finally:
+            os.unlink(temp_file.name)
+
+    def test_edit_between_sampled_blocks_is_detected_with_full_verify(self):
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as temp_file:
+            for i in range(4000):
+                temp_file.write(f"/project_root/file{i:04}.txt\n" + "x" * 80 + "\n")
+        # Block 1 is never among the sampled blocks
+        edit_at = 4096 + 100
+
+        def edit(data):
+            header = data.index(b'/project_root/file', edit_at)
+            return data[:header] + b'/project_root/edit' + data[header + len(b'/project_root/file'):]
+
+        settings = {"incremental_full_verify": True}
+        self.settings_manager.get_setting.side_effect = lambda key, default=None: settings.get(key, default)
+        try:
+            with patch.object(index_cache_module, '_BLOCK_SIZE', 4096):
+                self.file_processor.process_file(temp_file.name)
+                with open(temp_file.name, 'rb') as f:
+                    data = edit(f.read()) + b'/project_root/new.txt\nnew\n'
+                with open(temp_file.name, 'wb') as f:
+                    f.write(data)
+                result = self.file_processor.process_file(temp_file.name)
+            self.assertEqual(sum(path.startswith('/project_root/edit') for path in result), 1)
+            self.assertEqual(result['/project_root/new.txt'], 'new')
+        finally:
+            os.unlink(temp_file.name)
+
+    def test_parallel_zip_archive_round_trip(self):
+        source_dir = tempfile.mkdtemp()
+        zip_path = os.path.join(tempfile.mkdtemp(), 'out.zip')
+        expected = {}
+        for i in range(40):
+            relative_path = os.path.join(f'dir{i % 4}', f'file{i}.txt')
+            os.makedirs(os.path.join(source_dir, f'dir{i % 4}'), exist_ok=True)
+            data = (f'record {i}\n' * (i * 500)).encode('utf-8')
+            with open(os.path.join(source_dir, relative_path), 'wb') as f:
+                f.write(data)
+            expected[relative_path.replace(os.sep, '/')] = data
+
+        progress = []
+        self.file_processor.create_zip_archive(source_dir, zip_path, progress_callback=progress.append)
+
+        with zipfile.ZipFile(zip_path) as zipf:
+            self.assertIsNone(zipf.testzip())
+            self.assertEqual(sorted(zipf.namelist()), sorted(expected))
+            for name, data in expected.items():
+                self.assertEqual(zipf.read(name), data)
+        self.assertEqual(progress[-1], 100)
+        self.assertEqual(progress, sorted(progress))
+
+    def test_process_file_to_zip_without_tree(self):
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as temp_file:
+            for i in range(200):
+                temp_file.write(f"/project_root/dir{i % 5}/file{i}.txt\ncontent{i}\n")
+
+        output_dir = tempfile.mkdtemp()
+        zip_path = os.path.join(output_dir, 'out.zip')
+        try:
+            self.file_processor.process_file_to_zip(temp_file.name, zip_path)
+            self.assertEqual(os.listdir(output_dir), ['out.zip'])
+            with zipfile.ZipFile(zip_path) as zipf:
+                self.assertEqual(len(zipf.namelist()), 200)
+                self.assertEqual(zipf.read('project_root/dir3/file8.txt'), b'content8\n')
+        finally:
+            os.unlink(temp_file.name)
+
+    def test_extracted_tree_is_replaced_on_rerun(self):
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as temp_file:
+            temp_file.write("/project_root/a.txt\nhello\n/project_root/sub/b.txt\nworld\n")
+
+        output_dir = os.path.join(self.cache_dir.name, 'out')
+        extract_dir = os.path.join(output_dir, 'tree')
+        try:
+            for _ in range(2):
+                self.file_processor.process_file_to_zip(temp_file.name, os.path.join(output_dir, 'out.zip'),
+                                                        extract_dir=extract_dir)
+            with open(os.path.join(extract_dir, 'project_root', 'a.txt')) as f:
+                self.assertEqual(f.read(), "hello\n")
+            with open(os.path.join(extract_dir, 'project_root', 'sub', 'b.txt')) as f:
+                self.assertEqual(f.read(), "world\n")
+            self.assertEqual(sorted(os.listdir(output_dir)), ['out.zip', 'tree'])
+        finally:
+            os.unlink(temp_file.name)
+
+    def test_archive_codecs_round_trip(self):
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as temp_file:
+            temp_file.write("/project_root/small.txt\ntiny\n/project_root/image.png\n" + "p" * 2000 + "\n")
+            temp_file.write("/project_root/big.txt\n" + "text line\n" * 500)
+
+        expected = {
+            'project_root/small.txt': b'tiny\n',
+            'project_root/image.png': b'p' * 2000 + b'\n',
+            'project_root/big.txt': b'text line\n' * 499 + b'text line\n',
+        }
+        settings = {}
+        self.settings_manager.get_setting.side_effect = lambda key, default=None: settings.get(key, default)
+        output_dir = tempfile.mkdtemp()
+        try:
+            for compression in ("stored", "deflate", "bzip2", "lzma", "auto"):
+                settings.update(compression=compression, compression_level=1)
+                zip_path = os.path.join(output_dir, compression + '.zip')
+                self.file_processor.process_file_to_zip(temp_file.name, zip_path)
+                with zipfile.ZipFile(zip_path) as zipf:
+                    self.assertIsNone(zipf.testzip())
+                    self.assertEqual({name: zipf.read(name) for name in zipf.namelist()}, expected)
+                    if compression == "auto":
+                        compress_types = {info.filename: info.compress_type for info in zipf.infolist()}
+                        self.assertEqual(compress_types['project_root/small.txt'], zipfile.ZIP_STORED)
+                        self.assertEqual(compress_types['project_root/image.png'], zipfile.ZIP_STORED)
+                        self.assertEqual(compress_types['project_root/big.txt'], zipfile.ZIP_DEFLATED)
+
+            for archive_format in ("tar.gz", "tar.xz"):
+                settings["archive_format"] = archive_format
+                tar_path = os.path.join(output_dir, 'out' + self.file_processor.archive_extension())
+                self.file_processor.process_file_to_zip(temp_file.name, tar_path)
+                with tarfile.open(tar_path) as tar:
+                    self.assertEqual({member.name: tar.extractfile(member).read() for member in tar}, expected)
+        finally:
+            os.unlink(temp_file.name)
+
+    def test_deduplicated_output(self):
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as temp_file:
+            for i in range(30):
+                temp_file.write(f"/project_root/file{i}.txt\n" + ("license\n" * 50 if i % 3 else f"unique{i}\n"))
+            temp_file.write("/project_root/file1.txt\nappended\n")
+
+        expected = {f'project_root/file{i}.txt': ("license\n" * 50 if i % 3 else f"unique{i}\n").encode()
+                    for i in range(30)}
+        expected['project_root/file1.txt'] += b'appended\n'
+        settings = {"deduplicate_output": True, "index_cache_enabled": False}
+        self.settings_manager.get_setting.side_effect = lambda key, default=None: settings.get(key, default)
+        metrics = Metrics()
+        file_processor = FileProcessor(self.settings_manager, metrics=metrics)
+        output_dir = tempfile.mkdtemp()
+        try:
+            file_processor.process_large_file(temp_file.name, os.path.join(output_dir, 'tree'))
+            stats = [os.stat(os.path.join(output_dir, 'tree', name)) for name in expected]
+            self.assertEqual(len({stat.st_ino for stat in stats}), 12)
+            for name, data in expected.items():
+                with open(os.path.join(output_dir, 'tree', name), 'rb') as f:
+                    self.assertEqual(f.read(), data)
+            self.assertEqual(metrics.counters["deduplicated_files"], 19)
+
+            zip_path = os.path.join(output_dir, 'out.zip')
+            file_processor.process_file_to_zip(temp_file.name, zip_path)
+            with zipfile.ZipFile(zip_path) as zipf:
+                self.assertIsNone(zipf.testzip())
+                self.assertEqual({name: zipf.read(name) for name in zipf.namelist()}, expected)
+            self.assertEqual(metrics.counters["deduplicated_members"], 18)
+
+            settings["archive_format"] = "tar.gz"
+            tar_path = os.path.join(output_dir, 'out.tar.gz')
+            file_processor.create_zip_archive(os.path.join(output_dir, 'tree'), tar_path)
+            with tarfile.open(tar_path) as tar:
+                self.assertEqual(sum(member.islnk() for member in tar), 18)
+                self.assertEqual({member.name: tar.extractfile(member).read() for member in tar}, expected)
+        finally:
+            os.unlink(temp_file.name)
+
+    def test_deduplicated_zip_reads_members_in_one_pass(self):
+        contents = [b"license\n" * 100] * 3 + [b"LICENSE\n" * 100, b"unique\n"]
+        reads = []
+
+        def blocks(i):
+            reads.append(i)
+            yield contents[i]
+
+        members = []
+        for i, data in enumerate(contents):
+            zinfo = zipfile.ZipInfo(f"file{i}.txt")
+            zinfo.file_size = len(data)
+            members.append((zinfo, lambda i=i: blocks(i)))
+        settings = {"deduplicate_output": True, "worker_count": 1}
+        self.settings_manager.get_setting.side_effect = lambda key, default=None: settings.get(key, default)
+        metrics = Metrics()
+        file_processor = FileProcessor(self.settings_manager, metrics=metrics)
+        zip_path = os.path.join(self.cache_dir.name, 'out.zip')
+        file_processor._write_zip(zip_path, members)
+
+        # Each member is hashed right before it's compressed, and duplicates aren't compressed
+        self.assertEqual(reads, [0, 0, 1, 2, 3, 3, 4])
+        self.assertEqual(metrics.counters["deduplicated_members"], 2)
+        with zipfile.ZipFile(zip_path) as zipf:
+            self.assertIsNone(zipf.testzip())
+            self.assertEqual([zipf.read(f"file{i}.txt") for i in range(5)], contents)
+
+    def test_metrics_are_exported_per_run(self):
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as temp_file:
+            for i in range(20):
+                temp_file.write(f"/project_root/file{i}.txt\ncontent{i}\n")
+        output_dir = tempfile.mkdtemp()
+        json_path = os.path.join(output_dir, 'metrics.json')
+        settings = {"metrics_enabled": True, "metrics_json": json_path, "index_cache_enabled": False}
+        self.settings_manager.get_setting.side_effect = lambda key, default=None: settings.get(key, default)
+        try:
+            file_processor = FileProcessor(self.settings_manager)
+            for run in range(2):
+                file_processor.process_file_to_zip(temp_file.name, os.path.join(output_dir, f'out{run}.zip'))
+                with open(json_path) as f:
+                    data = json.load(f)
+                os.unlink(json_path)
+                self.assertEqual(data["counters"]["records"], 20)
+                self.assertEqual(data["spans"]["total"]["count"], 1)
+
+            # Shared metrics belong to the caller (a batch), which exports them
+            shared = FileProcessor(self.settings_manager, metrics=Metrics())
+            shared.process_file(temp_file.name)
+            self.assertFalse(os.path.exists(json_path))
+            self.assertEqual(shared.metrics.counters["records"], 20)
+        finally:
+            os.unlink(temp_file.name)
+
+    def test_duplicate_path_policies_agree(self):
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as temp_file:
+            for i in range(400):
+                temp_file.write(f"/project_root/dir{i % 2}/file{i % 7}.txt\nrecord {i}\n")
+            temp_file.write("/project_root/dir0/file0~2.txt\nalready taken\n")
+
+        settings = {"chunk_size": 256, "index_cache_enabled": False}
+        self.settings_manager.get_setting.side_effect = lambda key, default=None: settings.get(key, default)
+        output_dir = tempfile.mkdtemp()
+        try:
+            for policy in ("concat", "first", "last", "suffix"):
+                settings["duplicate_paths"] = policy
+                result = self.file_processor.process_file(temp_file.name)
+                expected = {path.lstrip('/'): (text + '\n').encode('utf-8') for path, text in result.items()}
+
+                tree_dir = os.path.join(output_dir, policy)
+                self.file_processor.process_large_file(temp_file.name, tree_dir)
+                tree = {}
+                for root, _, files in os.walk(tree_dir):
+                    for name in files:
+                        with open(os.path.join(root, name), 'rb') as f:
+                            tree[os.path.relpath(os.path.join(root, name), tree_dir).replace(os.sep, '/')] = f.read()
+                self.assertEqual(tree, expected)
+
+                zip_path = os.path.join(output_dir, policy + '.zip')
+                self.file_processor.process_file_to_zip(temp_file.name, zip_path)
+                with zipfile.ZipFile(zip_path) as zipf:
+                    self.assertEqual({name: zipf.read(name) for name in zipf.namelist()}, expected)
+
+                first_file = expected['project_root/dir0/file0.txt']
+                if policy == "concat":
+                    self.assertEqual(len(expected), 15)
+                    self.assertEqual(first_file, b''.join(f"record {i}\n".encode() for i in range(0, 400, 14)))
+                elif policy == "first":
+                    self.assertEqual(first_file, b'record 0\n')
+                elif policy == "last":
+                    self.assertEqual(first_file, b'record 392\n')
+                else:
+                    self.assertEqual(len(expected), 401)
+                    self.assertEqual(expected['project_root/dir0/file0~2.txt'], b'already taken\n')
+                    self.assertEqual(expected['project_root/dir0/file0~3.txt'], b'record 14\n')
+        finally:
+            os.unlink(temp_file.name)
+
+    def test_large_file_output_with_small_handle_pool(self):
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as temp_file:
+            for i in range(300):
+                temp_file.write(f"/project_root/dir{i % 3}/file{i % 20}.txt\nline{i}\n")
+
+        settings = {"max_open_output_files": 64, "chunk_size": 512, "index_cache_enabled": False}
+        self.settings_manager.get_setting.side_effect = lambda key, default=None: settings.get(key, default)
+        try:
+            with patch('builtins.open', wraps=open) as mock_open:
+                self.file_processor.process_large_file(temp_file.name, tempfile.mkdtemp())
+            output_opens = [call for call in mock_open.call_args_list if 'project_root' in str(call.args[0])]
+            self.assertEqual(len(output_opens), 60)
+
+            # A pool smaller than the number of paths still appends correctly
+            settings["max_open_output_files"] = 4
+            output_dir = tempfile.mkdtemp()
+            self.file_processor.process_large_file(temp_file.name, output_dir)
+            with open(os.path.join(output_dir, 'project_root', 'dir1', 'file7.txt')) as f:
+                self.assertEqual(f.read(), ''.join(f"line{i}\n" for i in range(7, 300, 60)))
+        finally:
+            os.unlink(temp_file.name)
+
+    def test_quick_preview(self):
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as temp_file:
+            temp_file.write("preamble\n")
+            for i in range(20000):
+                temp_file.write(f"/project_root/dir{i % 10}/file{i % 500}.txt\n" + "x" * 50 + "\n")
+
+        settings = {"preview_sample_mb": 0.25, "preview_sample_windows": 4}
+        self.settings_manager.get_setting.side_effect = lambda key, default=None: settings.get(key, default)
+        try:
+            preview = self.file_processor.quick_preview(temp_file.name)
+            self.assertFalse(preview.exact)
+            self.assertLess(preview.sampled_bytes, preview.file_size // 2)
+            self.assertAlmostEqual(preview.estimated_records, 20000, delta=1000)
+            self.assertEqual(preview.estimated_files, 500)
+            self.assertAlmostEqual(preview.estimated_output_bytes, 20000 * 51, delta=50000)
+            self.assertEqual(preview.max_fan_out, 50)
+
+            # A sample as large as the file is an exact count
+            settings["preview_sample_mb"] = 16
+            preview = self.file_processor.quick_preview(temp_file.name, r'^/project_root/dir1/')
+            self.assertTrue(preview.exact)
+            self.assertEqual((preview.estimated_records, preview.estimated_files), (2000, 50))
+        finally:
+            os.unlink(temp_file.name)
+
 if __name__ == '__main__':
     unittest.main()
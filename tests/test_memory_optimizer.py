@@ -0,0 +1,66 @@
+import unittest
+import mmap
+import tempfile
+import psutil
+from unittest.mock import MagicMock, patch
+from utils.memory_optimizer import MemoryGovernor
+
+
+class TestMemoryGovernor(unittest.TestCase):
+    def setUp(self):
+        self.governor = MemoryGovernor(high_water_mb=100, sample_interval=60)
+        self.rss = [10 * 1024 * 1024]
+        self.governor._process = MagicMock()
+        self.governor._process.memory_info.side_effect = lambda: MagicMock(rss=self.rss[0], shared=0)
+
+    def sample(self):
+        self.governor._last_sample = float('-inf')
+        return self.governor.check()
+
+    def test_samples_at_most_once_per_interval(self):
+        with patch('gc.collect') as mock_collect:
+            for _ in range(1000):
+                self.governor.check()
+        self.assertEqual(self.governor._process.memory_info.call_count, 1)
+        mock_collect.assert_not_called()
+
+    def test_collects_and_throttles_above_high_water(self):
+        with patch('gc.collect') as mock_collect:
+            self.rss[0] = 150 * 1024 * 1024
+            self.assertTrue(self.sample())
+            self.assertEqual(mock_collect.call_count, 1)
+
+            # Stays throttled until usage falls below the low-water mark
+            self.rss[0] = 90 * 1024 * 1024
+            self.assertTrue(self.sample())
+            self.rss[0] = 50 * 1024 * 1024
+            self.assertFalse(self.sample())
+            self.assertEqual(mock_collect.call_count, 1)
+
+    def test_collection_that_frees_memory_does_not_throttle(self):
+        self.rss[0] = 150 * 1024 * 1024
+
+        def collect():
+            self.rss[0] = 20 * 1024 * 1024
+
+        with patch('gc.collect', side_effect=collect):
+            self.assertFalse(self.sample())
+        self.assertEqual(self.governor.collections, 1)
+
+    @unittest.skipUnless(hasattr(psutil.Process().memory_info(), 'shared'), "needs shared memory accounting")
+    def test_mapped_input_does_not_count(self):
+        info = psutil.Process().memory_info()
+        governor = MemoryGovernor(high_water_mb=(info.rss - info.shared) / (1024 * 1024) + 32, sample_interval=0)
+        with tempfile.TemporaryFile() as f:
+            f.truncate(96 * 1024 * 1024)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for offset in range(0, len(mm), mmap.PAGESIZE):
+                    mm[offset]
+                self.assertGreater(psutil.Process().memory_info().rss, governor.high_water)
+                with patch('gc.collect') as mock_collect:
+                    self.assertFalse(governor.check())
+                mock_collect.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
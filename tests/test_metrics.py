@@ -0,0 +1,78 @@
+import gc
+import json
+import unittest
+from unittest.mock import patch
+from utils.metrics import Metrics, NullMetrics, create_metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics({"input": "dump.txt"})
+
+    def test_spans_and_counters(self):
+        for _ in range(3):
+            with self.metrics.span("scan"):
+                pass
+        self.metrics.add_time("scan", 0.5)
+        self.metrics.count("records", 10)
+        self.metrics.count("records", 5)
+        self.metrics.gauge("chunk_size", 4096)
+        data = self.metrics.to_dict()
+        self.assertEqual(data["spans"]["scan"]["count"], 4)
+        self.assertGreaterEqual(data["spans"]["scan"]["seconds"], 0.5)
+        self.assertEqual(data["spans"]["scan"]["max_seconds"], 0.5)
+        self.assertEqual(data["counters"], {"records": 15})
+        self.assertEqual(data["gauges"], {"chunk_size": 4096})
+
+    def test_run_tracks_gc_once_when_nested(self):
+        with self.metrics.run():
+            with self.metrics.run():
+                gc.collect()
+            self.assertIn(self.metrics._on_gc, gc.callbacks)
+        self.assertNotIn(self.metrics._on_gc, gc.callbacks)
+        data = self.metrics.to_dict()
+        self.assertEqual(data["spans"]["total"]["count"], 1)
+        self.assertGreaterEqual(data["spans"]["gc"]["count"], 1)
+
+    def test_prometheus_format(self):
+        self.metrics.add_time("scan", 1.5)
+        self.metrics.count("bytes", 100)
+        text = self.metrics.to_prometheus()
+        self.assertIn('text_analyzer_phase_seconds_total{input="dump.txt",phase="scan"} 1.5', text)
+        self.assertIn('# TYPE text_analyzer_bytes_total counter', text)
+        self.assertIn('text_analyzer_bytes_total{input="dump.txt"} 100', text)
+        self.assertTrue(text.endswith("\n"))
+
+    def test_otlp_export(self):
+        self.metrics.add_time("zip", 2.0)
+        self.metrics.count("members", 3)
+        with patch('urllib.request.urlopen') as mock_urlopen:
+            self.metrics.export_otlp("http://localhost:4318")
+        request = mock_urlopen.call_args[0][0]
+        self.assertEqual(request.full_url, "http://localhost:4318/v1/metrics")
+        payload = json.loads(request.data)
+        metrics = payload["resourceMetrics"][0]["scopeMetrics"][0]["metrics"]
+        by_name = {metric["name"]: metric for metric in metrics}
+        point = by_name["text_analyzer.phase.duration"]["sum"]["dataPoints"][0]
+        self.assertEqual(point["asDouble"], 2.0)
+        self.assertIn({"key": "phase", "value": {"stringValue": "zip"}}, point["attributes"])
+        self.assertEqual(by_name["text_analyzer.members"]["sum"]["dataPoints"][0]["asInt"], "3")
+
+    def test_disabled_by_default(self):
+        class Settings:
+            def __init__(self, settings):
+                self.settings = settings
+
+            def get_setting(self, key, default=None):
+                return self.settings.get(key, default)
+
+        metrics = create_metrics(Settings({}))
+        self.assertIsInstance(metrics, NullMetrics)
+        with metrics.run(), metrics.span("scan"):
+            metrics.count("records")
+        self.assertEqual(metrics.to_dict()["spans"], {})
+        self.assertTrue(create_metrics(Settings({"metrics_enabled": True})).enabled)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+import unittest
+from unittest.mock import patch
+from core.output_commit import StagedOutput, fast_copy
+import tempfile
+import errno
+import stat
+import os
+
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(data)
+
+
+def read_tree(root):
+    tree = {}
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            with open(os.path.join(dirpath, name)) as f:
+                tree[os.path.relpath(os.path.join(dirpath, name), root)] = f.read()
+    return tree
+
+
+class TestStagedOutput(unittest.TestCase):
+    def setUp(self):
+        self.parent = tempfile.TemporaryDirectory()
+        self.output_dir = os.path.join(self.parent.name, 'out')
+
+    def tearDown(self):
+        self.parent.cleanup()
+
+    def test_new_output_is_published_with_one_rename(self):
+        with StagedOutput(self.output_dir) as staged:
+            self.assertEqual(os.path.dirname(staged.staging_dir), self.parent.name)
+            write_file(os.path.join(staged.staging_dir, 'a', 'b.txt'), 'b')
+            with patch('os.rename', wraps=os.rename) as mock_rename:
+                staged.commit()
+            mock_rename.assert_called_once_with(staged.staging_dir, self.output_dir)
+
+        self.assertEqual(read_tree(self.output_dir), {os.path.join('a', 'b.txt'): 'b'})
+        self.assertEqual(os.listdir(self.parent.name), ['out'])
+
+    def test_existing_output_is_merged(self):
+        write_file(os.path.join(self.output_dir, 'a', 'old.txt'), 'old')
+        write_file(os.path.join(self.output_dir, 'a', 'b.txt'), 'stale')
+        with StagedOutput(self.output_dir) as staged:
+            write_file(os.path.join(staged.staging_dir, 'a', 'b.txt'), 'new')
+            staged.commit()
+
+        self.assertEqual(read_tree(self.output_dir), {os.path.join('a', 'old.txt'): 'old',
+                                                      os.path.join('a', 'b.txt'): 'new'})
+        self.assertEqual(os.listdir(self.parent.name), ['out'])
+
+    def test_new_output_gets_default_directory_mode(self):
+        old_umask = os.umask(0o027)
+        try:
+            with StagedOutput(self.output_dir) as staged:
+                write_file(os.path.join(staged.staging_dir, 'a.txt'), 'a')
+                staged.commit()
+        finally:
+            os.umask(old_umask)
+        self.assertEqual(stat.S_IMODE(os.stat(self.output_dir).st_mode), 0o750)
+
+    def test_existing_output_is_updated_in_place(self):
+        write_file(os.path.join(self.output_dir, 'a', 'b.txt'), 'stale')
+        write_file(os.path.join(self.output_dir, 'a', 'c'), 'file becomes a directory')
+        write_file(os.path.join(self.output_dir, 'd', 'e.txt'), 'directory becomes a file')
+        os.chmod(self.output_dir, 0o751)
+        before = os.stat(self.output_dir)
+        with StagedOutput(self.output_dir) as staged:
+            write_file(os.path.join(staged.staging_dir, 'a', 'b.txt'), 'new')
+            write_file(os.path.join(staged.staging_dir, 'a', 'c', 'f.txt'), 'f')
+            write_file(os.path.join(staged.staging_dir, 'd'), 'd')
+            # Written by someone else while the run was staging
+            write_file(os.path.join(self.output_dir, 'late.txt'), 'late')
+            staged.commit()
+
+        after = os.stat(self.output_dir)
+        self.assertEqual((after.st_ino, stat.S_IMODE(after.st_mode)), (before.st_ino, 0o751))
+        self.assertEqual(read_tree(self.output_dir), {os.path.join('a', 'b.txt'): 'new',
+                                                      os.path.join('a', 'c', 'f.txt'): 'f',
+                                                      'd': 'd', 'late.txt': 'late'})
+        self.assertEqual(os.listdir(self.parent.name), ['out'])
+
+    def test_replace_across_mount_point_falls_back_to_copy(self):
+        write_file(os.path.join(self.output_dir, 'mnt', 'old.txt'), 'old')
+        replace = os.replace
+
+        def cross_device(src, dst):
+            if os.path.dirname(dst) == os.path.join(self.output_dir, 'mnt') and 'staging' in src:
+                raise OSError(errno.EXDEV, 'Invalid cross-device link')
+            return replace(src, dst)
+
+        with StagedOutput(self.output_dir) as staged:
+            write_file(os.path.join(staged.staging_dir, 'mnt', 'old.txt'), 'new')
+            write_file(os.path.join(staged.staging_dir, 'top.txt'), 'top')
+            with patch('os.replace', side_effect=cross_device):
+                staged.commit()
+
+        self.assertEqual(read_tree(self.output_dir), {os.path.join('mnt', 'old.txt'): 'new', 'top.txt': 'top'})
+        self.assertEqual(os.listdir(self.parent.name), ['out'])
+
+    def test_failure_before_commit_leaves_output_untouched(self):
+        write_file(os.path.join(self.output_dir, 'keep.txt'), 'keep')
+        with self.assertRaises(RuntimeError):
+            with StagedOutput(self.output_dir) as staged:
+                write_file(os.path.join(staged.staging_dir, 'keep.txt'), 'partial')
+                raise RuntimeError("interrupted")
+
+        self.assertEqual(read_tree(self.output_dir), {'keep.txt': 'keep'})
+        self.assertEqual(os.listdir(self.parent.name), ['out'])
+
+    def test_failed_publish_keeps_unpublished_files(self):
+        write_file(os.path.join(self.output_dir, 'a.txt'), 'old a')
+        write_file(os.path.join(self.output_dir, 'b.txt'), 'old b')
+        replace = os.replace
+        published = []
+
+        def failing_replace(src, dst):
+            if published:
+                raise OSError(errno.EIO, 'Input/output error')
+            published.append(os.path.basename(dst))
+            return replace(src, dst)
+
+        with self.assertRaises(OSError):
+            with StagedOutput(self.output_dir) as staged:
+                write_file(os.path.join(staged.staging_dir, 'a.txt'), 'new a')
+                write_file(os.path.join(staged.staging_dir, 'b.txt'), 'new b')
+                with patch('os.replace', side_effect=failing_replace):
+                    staged.commit()
+
+        self.assertTrue(staged.kept)
+        unpublished, = {'a.txt', 'b.txt'} - set(published)
+        expected = {'a.txt': 'new a', 'b.txt': 'new b'}
+        self.assertEqual(read_tree(self.output_dir), dict(expected, **{unpublished: 'old ' + unpublished[0]}))
+        self.assertEqual(read_tree(staged.staging_dir), {unpublished: expected[unpublished]})
+
+        # The next run clears it away and publishes everything again
+        with StagedOutput(self.output_dir) as rerun:
+            self.assertFalse(os.path.exists(staged.staging_dir))
+            write_file(os.path.join(rerun.staging_dir, 'a.txt'), 'new a')
+            write_file(os.path.join(rerun.staging_dir, 'b.txt'), 'new b')
+            rerun.commit()
+        self.assertEqual(read_tree(self.output_dir), {'a.txt': 'new a', 'b.txt': 'new b'})
+        self.assertEqual(os.listdir(self.parent.name), ['out'])
+
+    def test_stale_staging_directories_are_removed(self):
+        dead = os.path.join(self.parent.name, '.out.staging-abc123')  # older naming, or a dead process
+        live = os.path.join(self.parent.name, f'.out.staging-{os.getppid()}-abc123')
+        other = os.path.join(self.parent.name, '.other.staging-abc123')
+        for path in (dead, live, other):
+            write_file(os.path.join(path, 'f.txt'), 'partial')
+
+        with StagedOutput(self.output_dir) as staged:
+            concurrent = StagedOutput(self.output_dir)
+            with StagedOutput(self.output_dir):
+                self.assertTrue(os.path.isdir(staged.staging_dir))
+                self.assertTrue(os.path.isdir(concurrent.staging_dir))
+            concurrent.discard()
+
+        self.assertFalse(os.path.exists(dead))
+        self.assertTrue(os.path.isdir(live))
+        self.assertTrue(os.path.isdir(other))
+
+    def test_copy_fallback_across_filesystems(self):
+        write_file(os.path.join(self.output_dir, 'old.txt'), 'old')
+        with StagedOutput(self.output_dir, max_workers=2) as staged:
+            staged.on_target_fs = False
+            data = {os.path.join('d', f'f{i}.txt'): str(i) * (i * 1000) for i in range(8)}
+            for name, content in data.items():
+                write_file(os.path.join(staged.staging_dir, name), content)
+            staged.commit()
+
+        data['old.txt'] = 'old'
+        self.assertEqual(read_tree(self.output_dir), data)
+        self.assertFalse(os.path.exists(staged.staging_dir))
+
+    def test_fast_copy_without_kernel_copy(self):
+        src = os.path.join(self.parent.name, 'src.bin')
+        dst = os.path.join(self.parent.name, 'dst.bin')
+        payload = os.urandom(3 * 1024 * 1024 + 17)
+        with open(src, 'wb') as f:
+            f.write(payload)
+        with patch('core.output_commit._copy_file_range', side_effect=OSError(18, 'EXDEV')), \
+                patch('core.output_commit._sendfile', side_effect=lambda s, d, copied, size: copied):
+            fast_copy(src, dst)
+        with open(dst, 'rb') as f:
+            self.assertEqual(f.read(), payload)
+
+if __name__ == '__main__':
+    unittest.main()
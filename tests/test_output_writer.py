@@ -0,0 +1,79 @@
+import unittest
+from core.output_writer import DeduplicatingOutputWriter, OutputWriter, content_key
+import tempfile
+import os
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class TestDeduplicatingOutputWriter(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_content_key(self):
+        self.assertEqual(content_key([b'ab', b'c']), content_key([b'abc']))
+        self.assertNotEqual(content_key([b'abc']), content_key([b'abd']))
+        self.assertEqual(content_key([b'abc'])[0], 3)
+
+    def test_identical_files_are_hardlinked(self):
+        writer = DeduplicatingOutputWriter(self.root)
+        writer.write(os.path.join('a', 'one.txt'), [b'same ', b'body\n'])
+        writer.write(os.path.join('b', 'two.txt'), [b'same body\n'])
+        writer.write(os.path.join('b', 'other.txt'), [b'different\n'])
+        writer.close()
+
+        one, two, other = (os.stat(os.path.join(self.root, *parts))
+                           for parts in (('a', 'one.txt'), ('b', 'two.txt'), ('b', 'other.txt')))
+        self.assertEqual(one.st_ino, two.st_ino)
+        self.assertNotEqual(one.st_ino, other.st_ino)
+        self.assertEqual(read(os.path.join(self.root, 'b', 'two.txt')), b'same body\n')
+        self.assertEqual((writer.linked_files, writer.linked_bytes), (1, 10))
+
+    def test_append_to_linked_file_keeps_other_names(self):
+        writer = DeduplicatingOutputWriter(self.root, max_open_files=1)
+        writer.write('one.txt', [b'body\n'])
+        writer.write('two.txt', [b'body\n'])
+        writer.write('three.txt', [b'body\n'])
+        writer.write('two.txt', [b'more\n'])
+        writer.write('one.txt', [b'extra\n'])
+        writer.close()
+
+        self.assertEqual(read(os.path.join(self.root, 'one.txt')), b'body\nextra\n')
+        self.assertEqual(read(os.path.join(self.root, 'two.txt')), b'body\nmore\n')
+        self.assertEqual(read(os.path.join(self.root, 'three.txt')), b'body\n')
+        self.assertEqual(os.stat(os.path.join(self.root, 'three.txt')).st_nlink, 1)
+
+    def test_existing_file_is_not_a_link_source(self):
+        with open(os.path.join(self.root, 'old.txt'), 'wb') as f:
+            f.write(b'previous run\n')
+        writer = DeduplicatingOutputWriter(self.root)
+        writer.write('old.txt', [b'body\n'])
+        writer.write('new.txt', [b'body\n'])
+        writer.close()
+
+        self.assertEqual(read(os.path.join(self.root, 'old.txt')), b'previous run\nbody\n')
+        self.assertEqual(read(os.path.join(self.root, 'new.txt')), b'body\n')
+        self.assertEqual(writer.linked_files, 0)
+
+    def test_matches_plain_writer_output(self):
+        records = [('x.txt', b'1\n'), ('y.txt', b'1\n'), ('x.txt', b'2\n'), ('z.txt', b'1\n'), ('y.txt', b'3\n')]
+        trees = []
+        for writer_class in (OutputWriter, DeduplicatingOutputWriter):
+            root = os.path.join(self.root, writer_class.__name__)
+            writer = writer_class(root, max_open_files=2)
+            for path, body in records:
+                writer.write(path, [body])
+            writer.close()
+            trees.append({name: read(os.path.join(root, name)) for name in os.listdir(root)})
+        self.assertEqual(trees[0], trees[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+from core.path_trie import PathTrie
+
+
+class TestPathTrie(unittest.TestCase):
+    def test_directories_are_shared(self):
+        trie = PathTrie(['/project_root/a/x.txt', '/project_root/a/y.txt', '/project_root/b.txt',
+                         '/project_root/a/x.txt'])
+        self.assertEqual(list(trie.root.children), ['project_root'])
+        project_root = trie.find('/project_root')
+        self.assertEqual(sorted(project_root.children), ['a', 'b.txt'])
+        self.assertEqual((project_root.records, project_root.files), (4, 3))
+        self.assertEqual(trie.find('/project_root/a/x.txt').records, 2)
+        self.assertEqual(len(trie), 3)
+
+    def test_sorted_children_pages(self):
+        trie = PathTrie([f'/root/file{i:03}.txt' for i in range(250)] + ['/root/sub/inner.txt'])
+        node = trie.find('root')
+        first, remaining = node.sorted_children(0, 100)
+        self.assertEqual(first[0].name, 'sub')
+        self.assertEqual(first[1].name, 'file000.txt')
+        self.assertEqual(remaining, 151)
+        last, remaining = node.sorted_children(200, 100)
+        self.assertEqual([child.name for child in last][-1], 'file249.txt')
+        self.assertEqual((len(last), remaining), (51, 0))
+
+    def test_path_that_is_also_a_directory(self):
+        trie = PathTrie(['/a/b', '/a'])
+        self.assertEqual((trie.root.records, trie.root.files), (2, 2))
+        self.assertFalse(trie.find('a').is_file)
+
+if __name__ == '__main__':
+    unittest.main()
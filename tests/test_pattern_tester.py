@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from core.delimiter_scanner import DelimiterScanner
+from core.pattern_tester import PatternTester, backtracking_risk, evaluate_pattern
+
+
+class TestBacktrackingRisk(unittest.TestCase):
+    def test_safe_patterns(self):
+        for pattern in (r'^/project_root/', r'^#FILE (.*)', r'^(?:[a-z]+/)+\w+\.txt',
+                        r'^\d{1,3}(\.\d{1,3}){3}', r'^(ab|cd)*', r'(a|ab)*c'):
+            self.assertIsNone(backtracking_risk(pattern), pattern)
+
+    def test_risky_patterns(self):
+        for pattern in (r'^(a+)+$', r'^(\w+\s?)+x', r'(x+x+)+y', r'(a|aa)*b', r'(a|a)*',
+                        r'^(\w|.)*z', r'^.*foo.*bar'):
+            self.assertIsNotNone(backtracking_risk(pattern), pattern)
+
+
+class TestPatternTester(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.tester = PatternTester(timeout=1.0)
+
+    def tearDown(self):
+        self.tester.close()
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, data):
+        path = os.path.join(self.temp_dir, 'input.txt')
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_evaluate_counts_line_matches(self):
+        sample = b'/project_root/a.txt\nbody\n/project_root/b.txt\nmore /project_root/\n'
+        stats = evaluate_pattern(r'^/project_root/', sample)
+        self.assertEqual(stats.matches, 2)
+        self.assertEqual(stats.lines, 5)
+        self.assertEqual(stats.sample_bytes, len(sample))
+        self.assertGreater(stats.slowest_line_number, 0)
+
+    def test_evaluate_times_the_scanner(self):
+        sample = b'a\n\nb\n'
+        with patch('core.pattern_tester.DelimiterScanner', wraps=DelimiterScanner) as scanner:
+            stats = evaluate_pattern(r'^\s*$', sample)
+        scanner.assert_called_once_with(r'^\s*$')
+        # Same records as processing would find: the text after the last newline isn't a line
+        self.assertEqual(stats.matches, 1)
+
+    def test_sample_drops_partial_line(self):
+        tester = PatternTester(sample_bytes=10)
+        path = self.write(b'12345\n67890\nabc\n')
+        self.assertEqual(tester.sample(path), b'12345\n')
+
+    def test_compile_error(self):
+        stats = self.tester.test(r'^(/project_root/', self.write(b'x\n'))
+        self.assertIsNotNone(stats.error)
+        self.assertEqual(stats.matches, 0)
+
+    def test_without_file_only_checks_pattern(self):
+        stats = self.tester.test(r'^(a+)+$')
+        self.assertIsNotNone(stats.warning)
+        self.assertEqual(stats.sample_bytes, 0)
+
+    def test_runs_against_file(self):
+        path = self.write(b'/project_root/a.txt\nbody\n/project_root/b.txt\n')
+        stats = self.tester.test(r'^/project_root/', path)
+        self.assertFalse(stats.timed_out)
+        self.assertEqual(stats.matches, 2)
+        self.assertIsNone(stats.warning)
+
+    def test_catastrophic_pattern_times_out(self):
+        path = self.write(b'a' * 40 + b'!\n')
+        stats = self.tester.test(r'^(a+)+$', path)
+        self.assertTrue(stats.timed_out)
+        self.assertIsNotNone(stats.warning)
+        # The stuck worker was replaced, so the next pattern still runs
+        stats = self.tester.test(r'^a', path)
+        self.assertEqual(stats.matches, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
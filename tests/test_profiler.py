@@ -0,0 +1,114 @@
+import os
+import time
+import pstats
+import shutil
+import tempfile
+import threading
+import unittest
+import concurrent.futures
+from unittest.mock import patch
+from core.batch_scheduler import BatchScheduler
+from core.file_processor import FileProcessor
+from utils.profiler import Profiler, StackSampler, profile_mode
+from utils.settings_manager import SettingsManager
+
+
+def busy_wait(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+    return seconds
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.settings_manager = SettingsManager(os.path.join(self.temp_dir, 'settings.json'))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def profiled_functions(self, path):
+        return {function for _, _, function in pstats.Stats(path).stats}
+
+    def test_sampler_sees_other_threads(self):
+        sampler = StackSampler(0.001)
+        sampler.start()
+        worker = threading.Thread(target=busy_wait, args=(0.2,), name="busy")
+        worker.start()
+        worker.join()
+        sampler.stop()
+        self.assertGreater(sampler.samples, 0)
+        self.assertTrue(any(stack.startswith("busy;") and "busy_wait" in stack for stack in sampler.stacks))
+
+        path = os.path.join(self.temp_dir, 'stacks.collapsed')
+        sampler.write_collapsed(path)
+        with open(path) as f:
+            stack, count = f.readline().rsplit(' ', 1)
+        self.assertGreater(int(count), 0)
+
+    def test_worker_threads_and_processes_are_profiled(self):
+        output_dir = os.path.join(self.temp_dir, 'out')
+        with Profiler("all", output_dir, "test", 0.001) as profiler:
+            with concurrent.futures.ThreadPoolExecutor(2) as executor:
+                list(executor.map(profiler.wrap(busy_wait), [0.05, 0.05]))
+            with concurrent.futures.ProcessPoolExecutor(1) as executor:
+                executor.submit(profiler.wrap(busy_wait, use_processes=True), 0.05).result()
+        self.assertEqual(sorted(os.path.splitext(path)[1] for path in profiler.paths), ['.collapsed', '.pstats'])
+        stats = pstats.Stats(profiler.paths[0])
+        calls = {function: values[1] for (_, _, function), values in stats.stats.items()}
+        self.assertEqual(calls["busy_wait"], 3)
+        self.assertFalse(os.path.exists(profiler._worker_dir))
+
+    def test_worker_processes_dump_once_at_shutdown(self):
+        output_dir = os.path.join(self.temp_dir, 'out')
+        with Profiler("cprofile", output_dir, "test") as profiler:
+            executor = concurrent.futures.ProcessPoolExecutor(1)
+            task = profiler.wrap(busy_wait, use_processes=True)
+            for _ in range(5):
+                executor.submit(task, 0.01).result()
+            self.assertEqual(os.listdir(profiler._worker_dir), [])
+            executor.shutdown()
+            self.assertEqual(len(os.listdir(profiler._worker_dir)), 1)
+        stats = pstats.Stats(profiler.paths[0])
+        calls = {function: values[1] for (_, _, function), values in stats.stats.items()}
+        self.assertEqual(calls["busy_wait"], 5)
+
+    def test_mode_from_environment_wins(self):
+        self.settings_manager.settings["profile_mode"] = "sample"
+        self.assertEqual(profile_mode(self.settings_manager), "sample")
+        with patch.dict(os.environ, {"TEXT_ANALYZER_PROFILE": "1"}):
+            self.assertEqual(profile_mode(self.settings_manager), "all")
+        with patch.dict(os.environ, {"TEXT_ANALYZER_PROFILE": "bogus"}):
+            self.assertEqual(profile_mode(self.settings_manager), "off")
+
+    def test_processing_run_writes_profile_beside_output(self):
+        input_file = os.path.join(self.temp_dir, 'input.txt')
+        with open(input_file, 'w') as f:
+            f.write("/project_root/a.txt\nalpha\n/project_root/b.txt\nbeta\n")
+        self.settings_manager.settings.update(profile_mode="cprofile", index_cache_enabled=False)
+        output_dir = os.path.join(self.temp_dir, 'out')
+        FileProcessor(self.settings_manager).process_large_file(input_file, output_dir)
+        profiles = [name for name in os.listdir(output_dir) if name.startswith('profile-process_large_file-')]
+        self.assertEqual(len(profiles), 1)
+        self.assertIn('_scan_record_offsets', self.profiled_functions(os.path.join(output_dir, profiles[0])))
+
+
+    def test_batch_profiles_shared_worker_processes(self):
+        inputs = []
+        for name in ('a.txt', 'b.txt'):
+            inputs.append(os.path.join(self.temp_dir, name))
+            with open(inputs[-1], 'w') as f:
+                for i in range(200):
+                    f.write(f"/project_root/{name}/file{i}.txt\nline{i}\n")
+        self.settings_manager.settings.update(profile_mode="cprofile", execution_mode="process", worker_count=2,
+                                              index_cache_enabled=False)
+        output_dir = os.path.join(self.temp_dir, 'out')
+        report = BatchScheduler(self.settings_manager, parallel_files=2).run(inputs, output_dir)
+        self.assertEqual(report.count("ok"), 2)
+        profiles = [name for name in os.listdir(output_dir) if name.startswith('profile-batch-')]
+        self.assertEqual(len(profiles), 1)
+        self.assertIn('_scan_record_offsets', self.profiled_functions(os.path.join(output_dir, profiles[0])))
+
+if __name__ == '__main__':
+    unittest.main()
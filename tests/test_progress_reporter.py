@@ -0,0 +1,59 @@
+import unittest
+from utils.progress_reporter import NullProgressReporter, ProgressReporter, as_reporter, format_eta
+
+
+class TestProgressReporter(unittest.TestCase):
+    def setUp(self):
+        self.now = [0.0]
+        self.snapshots = []
+        self.reporter = ProgressReporter(self.snapshots.append, rate=10, clock=lambda: self.now[0])
+
+    def test_throttles_updates(self):
+        self.reporter.start_phase("parse", 1000)
+        for _ in range(1000):
+            self.reporter.advance(1, 1)
+        # The phase start and the first update; the rest fell inside 100 ms
+        self.assertEqual(len(self.snapshots), 2)
+        self.now[0] = 0.1
+        self.reporter.advance(0)
+        self.assertEqual(len(self.snapshots), 3)
+        self.assertEqual((self.snapshots[-1].bytes_done, self.snapshots[-1].records), (1000, 1000))
+
+    def test_rates_and_eta(self):
+        self.reporter.start_phase("parse", 1000)
+        self.now[0] = 2.0
+        self.reporter.advance(500, 50)
+        snapshot = self.snapshots[-1]
+        self.assertEqual(snapshot.percent, 50)
+        self.assertEqual(snapshot.bytes_per_second, 250)
+        self.assertEqual(snapshot.records_per_second, 25)
+        self.assertAlmostEqual(snapshot.eta, 2.0)
+
+    def test_planned_phases(self):
+        self.reporter.plan(parse=(0, 30), zip=(30, 70))
+        self.reporter.start_phase("parse", 100)
+        self.reporter.advance(50)
+        self.assertEqual(self.snapshots[-1].percent, 15)
+        self.reporter.end_phase()
+        self.assertEqual(self.snapshots[-1].percent, 30)
+        self.reporter.start_phase("zip", 0)
+        self.reporter.end_phase()
+        self.assertEqual((self.snapshots[-1].phase, self.snapshots[-1].percent), ("zip", 100))
+
+    def test_as_reporter(self):
+        self.assertIs(as_reporter(self.reporter), self.reporter)
+        self.assertIsInstance(as_reporter(None), NullProgressReporter)
+        percents = []
+        reporter = as_reporter(percents.append)
+        reporter.start_phase("write", 10)
+        reporter.end_phase()
+        self.assertEqual(percents, [0, 100])
+
+    def test_format_eta(self):
+        self.assertEqual(format_eta(None), "--:--")
+        self.assertEqual(format_eta(75), "1:15")
+        self.assertEqual(format_eta(3725), "1:02:05")
+
+
+if __name__ == '__main__':
+    unittest.main()
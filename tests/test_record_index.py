@@ -0,0 +1,44 @@
+import unittest
+from core.record_index import RecordIndex, resolve_duplicate_paths
+import tempfile
+import os
+
+
+class TestDuplicatePaths(unittest.TestCase):
+    paths = ['/a.txt', '/b', '/a.txt', '/dir/.env', '/a.txt', '/b', '/dir/.env']
+
+    def test_policies(self):
+        self.assertEqual(resolve_duplicate_paths(self.paths, "concat"), self.paths)
+        self.assertEqual(resolve_duplicate_paths(self.paths, "first"),
+                         ['/a.txt', '/b', None, '/dir/.env', None, None, None])
+        self.assertEqual(resolve_duplicate_paths(self.paths, "last"),
+                         [None, None, None, None, '/a.txt', '/b', '/dir/.env'])
+        self.assertEqual(resolve_duplicate_paths(self.paths, "suffix"),
+                         ['/a.txt', '/b', '/a~2.txt', '/dir/.env', '/a~3.txt', '/b~2', '/dir/.env~2'])
+
+    def test_suffix_skips_names_in_use(self):
+        self.assertEqual(resolve_duplicate_paths(['/a.txt', '/a.txt', '/a~2.txt', '/a.txt'], "suffix"),
+                         ['/a.txt', '/a~3.txt', '/a~2.txt', '/a~4.txt'])
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            resolve_duplicate_paths(self.paths, "newest")
+
+    def test_group_and_to_dict(self):
+        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
+            temp_file.write(b'one\ntwo\nthree\n')
+        try:
+            with RecordIndex(temp_file.name) as index:
+                index.append('/x', 0, 0, 3)
+                index.append('/y', 4, 4, 7)
+                index.append('/x', 8, 8, 13)
+                self.assertEqual(index.group(), {'/x': [0, 2], '/y': [1]})
+                self.assertEqual(index.group("last"), {'/y': [1], '/x': [2]})
+                self.assertEqual(index.to_dict(), {'/x': 'one\nthree', '/y': 'two'})
+                self.assertEqual(index.to_dict("first"), {'/x': 'one', '/y': 'two'})
+        finally:
+            os.unlink(temp_file.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+import subprocess
+import sys
+import tempfile
+import os
+import zipfile
+import json
+from unittest.mock import patch
+import text_analyzer
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestCommandLine(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.settings_file = os.path.join(self.work_dir.name, 'settings.json')
+        cache_home = patch.dict(os.environ, {'XDG_CACHE_HOME': self.work_dir.name})
+        cache_home.start()
+        self.addCleanup(cache_home.stop)
+        for name in ('first.txt', 'second.txt'):
+            with open(os.path.join(self.work_dir.name, name), 'w') as f:
+                f.write(f"/data/a/{name}\nalpha\n/data/b.txt\nbeta\n")
+
+    def tearDown(self):
+        self.work_dir.cleanup()
+
+    def run_split(self, *args):
+        return text_analyzer.main(['split', '--settings', self.settings_file, '-d', r'^/data/', *args])
+
+    def test_split_glob_into_directory_trees(self):
+        output_dir = os.path.join(self.work_dir.name, 'out')
+        self.assertEqual(self.run_split(os.path.join(self.work_dir.name, '*.txt'), '-o', output_dir, '-j', '2'), 0)
+        with open(os.path.join(output_dir, 'second', 'data', 'a', 'second.txt')) as f:
+            self.assertEqual(f.read(), "alpha\n")
+        with open(os.path.join(output_dir, 'first', 'data', 'b.txt')) as f:
+            self.assertEqual(f.read(), "beta\n")
+        self.assertFalse(os.path.exists(self.settings_file))
+
+    def test_metrics_files(self):
+        output_dir = os.path.join(self.work_dir.name, 'out')
+        metrics_json = os.path.join(self.work_dir.name, 'metrics.json')
+        metrics_prometheus = os.path.join(self.work_dir.name, 'metrics.prom')
+        self.assertEqual(self.run_split(os.path.join(self.work_dir.name, 'first.txt'), '-o', output_dir,
+                                        '--metrics-json', metrics_json, '--metrics-prometheus', metrics_prometheus), 0)
+        with open(metrics_json) as f:
+            metrics = json.load(f)
+        self.assertEqual(metrics["counters"]["records"], 2)
+        self.assertEqual(metrics["counters"]["records_written"], 2)
+        for span in ("total", "scan", "write", "merge"):
+            self.assertIn(span, metrics["spans"])
+        with open(metrics_prometheus) as f:
+            self.assertIn('text_analyzer_records_total 2', f.read())
+
+    def test_split_to_zip(self):
+        output_dir = os.path.join(self.work_dir.name, 'out')
+        input_file = os.path.join(self.work_dir.name, 'first.txt')
+        self.assertEqual(self.run_split(input_file, '-o', output_dir, '--archive', 'zip', '--compression', 'lzma'), 0)
+        with zipfile.ZipFile(os.path.join(output_dir, 'first.zip')) as zipf:
+            self.assertEqual(zipf.read('data/b.txt'), b"beta\n")
+            self.assertEqual(zipf.getinfo('data/b.txt').compress_type, zipfile.ZIP_LZMA)
+        self.assertFalse(os.path.exists(os.path.join(output_dir, 'first')))
+
+    def test_index_cache_stays_out_of_working_directory(self):
+        run_dir = os.path.join(self.work_dir.name, 'run')
+        os.makedirs(run_dir)
+        previous_dir = os.getcwd()
+        os.chdir(run_dir)
+        try:
+            self.assertEqual(text_analyzer.main(['split', '--settings', 'settings.json', '-d', r'^/data/',
+                                                 os.path.join(self.work_dir.name, 'first.txt'), '-o', 'out']), 0)
+        finally:
+            os.chdir(previous_dir)
+        self.assertEqual(sorted(os.listdir(run_dir)), ['out'])
+        self.assertNotEqual(os.listdir(os.path.join(self.work_dir.name, 'text_analyzer', 'index_cache')), [])
+
+    def test_missing_input_fails(self):
+        output_dir = os.path.join(self.work_dir.name, 'out')
+        self.assertEqual(self.run_split(os.path.join(self.work_dir.name, 'missing*.log'), '-o', output_dir), 1)
+
+    def test_never_imports_wx(self):
+        code = ("import sys, text_analyzer; text_analyzer.build_parser(); import core.file_processor; "
+                "print(sorted(m for m in sys.modules if m.split('.')[0] in ('wx', 'gui', 'requests')))")
+        output = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT_DIR, text=True)
+        self.assertEqual(output.strip(), '[]')
+
+    def test_startup_imports_stay_light(self):
+        # Slow modules are imported only by the code paths that need them
+        slow = ('tarfile', 'gzip', 'urllib.request', 'psutil', 'inspect', 'pstats')
+        code = ("import sys, text_analyzer\n"
+                "try:\n    text_analyzer.main(['--help'])\nexcept SystemExit:\n    pass\n"
+                "help_modules = sorted(m for m in sys.modules if m.split('.')[0] in ('core', 'utils', 'zipfile'))\n"
+                "import core.batch_scheduler\n"
+                f"print(help_modules, sorted(m for m in {slow!r} if m in sys.modules))")
+        output = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT_DIR, text=True)
+        self.assertEqual(output.strip().splitlines()[-1], '[] []')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import os
+import re
+import sys
+import glob
+import argparse
+
+# Command-line entry point for headless use (cron, pipelines, servers
+# without a display). Never import wx or anything from gui/ here.
+
+ARCHIVE_FORMATS = ["none", "zip", "tar.gz", "tar.xz"]
+COMPRESSION_CHOICES = ["auto", "stored", "deflate", "bzip2", "lzma"]
+DUPLICATE_POLICIES = ["concat", "first", "last", "suffix"]
+
+
+def expand_inputs(patterns):
+    # Shells expand globs for us, but cron and quoted arguments don't
+    inputs = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = [path for path in sorted(glob.glob(pattern, recursive=True)) if os.path.isfile(path)]
+        else:
+            matches = [pattern] if os.path.isfile(pattern) else []
+        if not matches:
+            raise FileNotFoundError(f"No input files match: {pattern}")
+        inputs.extend(matches)
+    return inputs
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="text_analyzer",
+                                     description="Split delimited text dumps into files and archives.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    split = subparsers.add_parser("split", help="split input files on a delimiter pattern")
+    split.add_argument("inputs", nargs="+", help="input files or glob patterns")
+    split.add_argument("-o", "--output-dir", required=True,
+                       help="each input is written to <output-dir>/<input name> (and/or an archive beside it); "
+                            "identical inputs are processed once")
+    split.add_argument("-d", "--delimiter", help="delimiter regex (default: from settings, else ^/project_root/)")
+    split.add_argument("--archive", choices=ARCHIVE_FORMATS, default="none",
+                       help="write an archive instead of (or, with --extract, as well as) a directory tree")
+    split.add_argument("--compression", choices=COMPRESSION_CHOICES, help="ZIP compression method")
+    split.add_argument("--level", type=int, choices=range(1, 10), metavar="1-9", help="compression level")
+    split.add_argument("--extract", action="store_true", help="also write the directory tree when archiving")
+    split.add_argument("-j", "--workers", type=int, help="worker count (0 = automatic)")
+    split.add_argument("--processes", action="store_true", help="parse with a process pool instead of threads")
+    split.add_argument("--parallel-files", type=int, help="number of inputs processed at the same time")
+    split.add_argument("--report", help="write a JSON report of the run to this file")
+    split.add_argument("--settings", default="settings.json",
+                       help="settings file to read defaults from (never written)")
+    split.add_argument("--duplicates", choices=DUPLICATE_POLICIES,
+                       help="records sharing a path: concat (default) appends them, first / last keeps one, "
+                            "suffix writes name~2.ext, name~3.ext, ...")
+    split.add_argument("--dedupe", action="store_true",
+                       help="store identical files once: hardlinks on disk, one compressed copy in archives")
+    split.add_argument("--no-index-cache", action="store_true", help="don't read or write the index cache")
+    split.add_argument("--metrics-json", help="write per-phase timings and counters to this JSON file")
+    split.add_argument("--metrics-prometheus", help="write the same metrics in Prometheus text format")
+    split.add_argument("--otlp-endpoint",
+                       help="send the metrics to an OpenTelemetry collector (OTLP/HTTP), e.g. http://localhost:4318")
+    split.add_argument("--profile", choices=["cprofile", "sample", "all"],
+                       help="profile each input (also TEXT_ANALYZER_PROFILE); .pstats and flame-graph stacks "
+                            "are written beside the output")
+    split.add_argument("--profile-dir", help="write profiles here instead")
+    split.set_defaults(handler=run_split)
+    return parser
+
+
+def command_line_settings(args):
+    from utils.settings_manager import SettingsManager
+
+    class CommandLineSettings(SettingsManager):
+        # Settings file values overlaid with command-line options; the
+        # overrides only apply to this run and are never saved.
+        def save_settings(self):
+            pass
+
+    settings_manager = CommandLineSettings(args.settings)
+    overrides = {
+        "delimiter_pattern": args.delimiter,
+        "archive_format": args.archive if args.archive != "none" else None,
+        "compression": args.compression,
+        "compression_level": args.level,
+        "worker_count": args.workers,
+        "execution_mode": "process" if args.processes else None,
+        "index_cache_enabled": False if args.no_index_cache else None,
+        "deduplicate_output": True if args.dedupe else None,
+        "duplicate_paths": args.duplicates,
+        "metrics_json": args.metrics_json,
+        "metrics_prometheus": args.metrics_prometheus,
+        "metrics_otlp_endpoint": args.otlp_endpoint,
+        "profile_mode": args.profile,
+        "profile_dir": args.profile_dir,
+        "metrics_enabled": True if args.metrics_json or args.metrics_prometheus or args.otlp_endpoint else None,
+    }
+    settings_manager.settings.update({key: value for key, value in overrides.items() if value is not None})
+    return settings_manager
+
+
+def run_split(args):
+    from core.batch_scheduler import BatchScheduler
+
+    inputs = expand_inputs(args.inputs)
+    scheduler = BatchScheduler(command_line_settings(args), args.parallel_files)
+    report = scheduler.run(inputs, args.output_dir, create_archive=args.archive != "none", extract=args.extract)
+    if args.report:
+        report.write(args.report)
+    return 0 if report.succeeded else 1
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "delimiter", None) is not None:
+        try:
+            re.compile(args.delimiter)
+        except re.error as e:
+            parser.error(f"invalid delimiter pattern: {e}")
+    try:
+        return args.handler(args)
+    except (OSError, ValueError) as e:
+        print(f"text_analyzer: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,5 +7,5 @@ class FileDropTarget(wx.FileDropTarget):
 
     def OnDropFiles(self, x, y, filenames):
         if len(filenames) > 0:
-            self.window.ProcessFile(filenames[0])
+            self.window.QueueFiles(list(filenames))
         return True
@@ -0,0 +1,69 @@
+import gc
+import time
+
+# psutil is imported where it's used: it is slow to import, and the
+# command-line tool shouldn't pay for it before processing starts
+
+class MemoryOptimizer:
+    @staticmethod
+    def optimize():
+        import psutil
+        gc.collect()
+        psutil.Process().memory_info()
+
+    @staticmethod
+    def get_memory_usage():
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)  # in MB
+
+    @staticmethod
+    def log_memory_usage(logger):
+        memory_usage = MemoryOptimizer.get_memory_usage()
+        logger.info(f"Current memory usage: {memory_usage:.2f} MB")
+
+class MemoryGovernor:
+    # Samples memory use at most once per sample_interval instead of on every
+    # call, and only spends time on gc.collect() once the high-water mark is
+    # crossed. Callers read `under_pressure` to throttle their intake.
+    #
+    # `rss` leaves out file-backed pages (the mmapped input, shared
+    # libraries): the kernel can drop those at any time, and counting them
+    # would keep any input larger than the high-water mark under pressure.
+    def __init__(self, high_water_mb: float = 0, sample_interval: float = 0.5):
+        import psutil
+        if not high_water_mb:
+            # Automatic: half of physical memory
+            high_water_mb = psutil.virtual_memory().total / (1024 * 1024) / 2
+        self.high_water = high_water_mb * 1024 * 1024
+        self.low_water = self.high_water * 0.8
+        self.sample_interval = sample_interval
+        self.under_pressure = False
+        self.rss = 0
+        self.collections = 0
+        self._process = psutil.Process()
+        self._last_sample = float('-inf')
+
+    @property
+    def pressure(self) -> float:
+        return self.rss / self.high_water
+
+    def check(self) -> bool:
+        now = time.monotonic()
+        if now - self._last_sample < self.sample_interval:
+            return self.under_pressure
+        self._last_sample = now
+        self.rss = self._private_rss()
+
+        if self.rss > self.high_water:
+            gc.collect()
+            self.collections += 1
+            self.rss = self._private_rss()
+            self.under_pressure = self.rss > self.low_water
+        elif self.rss < self.low_water:
+            self.under_pressure = False
+        return self.under_pressure
+
+    def _private_rss(self) -> int:
+        info = self._process.memory_info()
+        # `shared` (Linux only) counts file-backed and shared memory pages
+        return info.rss - getattr(info, 'shared', 0)
@@ -0,0 +1,305 @@
+import gc
+import json
+import time
+import threading
+from typing import Dict
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Spans used by FileProcessor:
+#   total    wall time of a top-level call
+#   wait     the consumer blocked on the next chunk result
+#   scan     delimiter scanning in the workers (summed across workers)
+#   decode   turning record bytes into text
+#   write    writing records to output files
+#   merge    publishing the staged output directory
+#   hash     hashing archive members to find duplicates (summed across workers)
+#   compress compressing archive members (summed across workers)
+#   zip      appending members to the archive
+#   gc       garbage collection pauses
+# Counters: bytes, records, chunks, failed_chunks, records_written, members,
+# deduplicated_files / deduplicated_members / deduplicated_bytes, plus the
+# process's disk reads and page faults (read_bytes, write_bytes,
+# major_page_faults), which tell an I/O-bound run from a CPU-bound one.
+
+
+class SpanStats:
+    __slots__ = ('count', 'seconds', 'max_seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+
+class _Span:
+    __slots__ = ('metrics', 'name', 'started')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.add_time(self.name, time.perf_counter() - self.started)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Metrics:
+    # Thread-safe named spans, counters and gauges for one run (or a batch of
+    # runs sharing the object).
+    enabled = True
+
+    def __init__(self, labels: Dict[str, str] = None):
+        self.labels = dict(labels or {})
+        self.spans = {}
+        self.counters = {}
+        self.gauges = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._run_depth = 0
+        self._run_started = None
+        self._gc_started = None
+        self._os_before = None
+
+    def span(self, name: str):
+        return _Span(self, name)
+
+    def reset(self) -> None:
+        # Clears the figures (not the labels) so the next run starts from zero
+        with self._lock:
+            self.spans.clear()
+            self.counters.clear()
+            self.gauges.clear()
+            self.started = time.time()
+
+    def add_time(self, name: str, seconds: float) -> None:
+        with self._lock:
+            stats = self.spans.get(name)
+            if stats is None:
+                stats = self.spans[name] = SpanStats()
+            stats.count += 1
+            stats.seconds += seconds
+            if seconds > stats.max_seconds:
+                stats.max_seconds = seconds
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self.gauges[name] = value
+
+    def run(self):
+        # Wraps a top-level call: total time, GC pauses and OS counters.
+        # Nested and concurrent runs on the same object are measured once,
+        # from the first start to the last finish.
+        return _Run(self)
+
+    def _start_run(self) -> None:
+        with self._lock:
+            self._run_depth += 1
+            if self._run_depth > 1:
+                return
+            self._run_started = time.perf_counter()
+            self._os_before = _os_counters()
+        gc.callbacks.append(self._on_gc)
+
+    def _finish_run(self) -> None:
+        with self._lock:
+            self._run_depth -= 1
+            if self._run_depth:
+                return
+            elapsed = time.perf_counter() - self._run_started
+            os_before, os_after = self._os_before, _os_counters()
+        gc.callbacks.remove(self._on_gc)
+        self.add_time("total", elapsed)
+        for name, value in os_after.items():
+            self.count(name, value - os_before.get(name, value))
+
+    def _on_gc(self, phase, info):
+        if phase == "start":
+            self._gc_started = time.perf_counter()
+        elif self._gc_started is not None:
+            self.add_time("gc", time.perf_counter() - self._gc_started)
+            self._gc_started = None
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "started": self.started,
+                "labels": dict(self.labels),
+                "spans": {name: {"count": stats.count, "seconds": round(stats.seconds, 6),
+                                 "max_seconds": round(stats.max_seconds, 6)}
+                          for name, stats in sorted(self.spans.items())},
+                "counters": dict(sorted(self.counters.items())),
+                "gauges": dict(sorted(self.gauges.items())),
+            }
+
+    def write_json(self, path: str) -> None:
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=4)
+
+    def to_prometheus(self, prefix: str = "text_analyzer") -> str:
+        # Prometheus text exposition format, e.g. for node_exporter's textfile collector
+        data = self.to_dict()
+        labels = [f'{key}="{_escape_label(value)}"' for key, value in sorted(self.labels.items())]
+
+        def series(name, value, extra=None):
+            all_labels = labels + ([f'phase="{extra}"'] if extra else [])
+            label_text = "{" + ",".join(all_labels) + "}" if all_labels else ""
+            return f"{prefix}_{name}{label_text} {value}"
+
+        lines = [f"# HELP {prefix}_phase_seconds_total Time spent per processing phase.",
+                 f"# TYPE {prefix}_phase_seconds_total counter"]
+        lines += [series("phase_seconds_total", stats["seconds"], name) for name, stats in data["spans"].items()]
+        lines += [f"# HELP {prefix}_phase_calls_total Times each processing phase was entered.",
+                  f"# TYPE {prefix}_phase_calls_total counter"]
+        lines += [series("phase_calls_total", stats["count"], name) for name, stats in data["spans"].items()]
+        for name, value in data["counters"].items():
+            lines += [f"# TYPE {prefix}_{name}_total counter", series(f"{name}_total", value)]
+        for name, value in data["gauges"].items():
+            lines += [f"# TYPE {prefix}_{name} gauge", series(name, value)]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        with open(path, 'w') as f:
+            f.write(self.to_prometheus())
+
+    def to_otlp(self, service_name: str = "text_analyzer") -> dict:
+        # OTLP/HTTP JSON encoding of the spans (as cumulative sums per phase),
+        # counters and gauges
+        data = self.to_dict()
+        start = str(int(self.started * 1e9))
+        now = str(time.time_ns())
+
+        def attributes(extra=None):
+            items = dict(self.labels, **(extra or {}))
+            return [{"key": key, "value": {"stringValue": str(value)}} for key, value in sorted(items.items())]
+
+        def total(name, unit, points):
+            return {"name": name, "unit": unit,
+                    "sum": {"aggregationTemporality": 2, "isMonotonic": True, "dataPoints": points}}
+
+        metrics = [
+            total("text_analyzer.phase.duration", "s",
+                  [{"attributes": attributes({"phase": name}), "startTimeUnixNano": start, "timeUnixNano": now,
+                    "asDouble": stats["seconds"]} for name, stats in data["spans"].items()]),
+        ]
+        metrics += [total(f"text_analyzer.{name}", "1",
+                          [{"attributes": attributes(), "startTimeUnixNano": start, "timeUnixNano": now,
+                            "asInt": str(value)}])
+                    for name, value in data["counters"].items()]
+        metrics += [{"name": f"text_analyzer.{name}", "unit": "1",
+                     "gauge": {"dataPoints": [{"attributes": attributes(), "timeUnixNano": now, "asDouble": value}]}}
+                    for name, value in data["gauges"].items()]
+        return {"resourceMetrics": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeMetrics": [{"scope": {"name": "text_analyzer"}, "metrics": metrics}],
+        }]}
+
+    def export_otlp(self, endpoint: str, timeout: float = 5.0) -> None:
+        # endpoint is the collector's base URL, e.g. http://localhost:4318
+        import urllib.request  # slow to import, and only needed here
+        url = endpoint.rstrip('/')
+        if not url.endswith('/v1/metrics'):
+            url += '/v1/metrics'
+        request = urllib.request.Request(url, json.dumps(self.to_otlp()).encode('utf-8'),
+                                         {"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+
+
+class _Run:
+    __slots__ = ('metrics',)
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def __enter__(self):
+        self.metrics._start_run()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics._finish_run()
+
+
+class NullMetrics(Metrics):
+    # Used when metrics are off: every call is a no-op
+    enabled = False
+
+    def span(self, name: str):
+        return _NULL_SPAN
+
+    def add_time(self, name: str, seconds: float) -> None:
+        pass
+
+    def count(self, name: str, value: int = 1) -> None:
+        pass
+
+    def gauge(self, name: str, value: float) -> None:
+        pass
+
+    def run(self):
+        return _NULL_SPAN
+
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _os_counters() -> Dict[str, int]:
+    import psutil
+
+    counters = {}
+    try:
+        io = psutil.Process().io_counters()
+        counters.update(read_bytes=io.read_bytes, write_bytes=io.write_bytes)
+    except (AttributeError, psutil.Error):  # not available on macOS
+        pass
+    if resource is not None:
+        counters["major_page_faults"] = resource.getrusage(resource.RUSAGE_SELF).ru_majflt
+    return counters
+
+
+def create_metrics(settings_manager, labels: Dict[str, str] = None) -> Metrics:
+    if settings_manager.get_setting("metrics_enabled", False):
+        return Metrics(labels)
+    return NullMetrics()
+
+
+def export_metrics(metrics: Metrics, settings_manager) -> None:
+    # Writes / sends the metrics wherever the settings ask for them
+    if not metrics.enabled:
+        return
+    json_path = settings_manager.get_setting("metrics_json", None)
+    if json_path:
+        metrics.write_json(json_path)
+    prometheus_path = settings_manager.get_setting("metrics_prometheus", None)
+    if prometheus_path:
+        metrics.write_prometheus(prometheus_path)
+    endpoint = settings_manager.get_setting("metrics_otlp_endpoint", None)
+    if endpoint:
+        try:
+            metrics.export_otlp(endpoint)
+        except OSError as e:
+            print(f"Error exporting metrics to {endpoint}: {str(e)}")
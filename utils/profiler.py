@@ -0,0 +1,190 @@
+import os
+import sys
+import glob
+import shutil
+import tempfile
+import time
+import cProfile
+import threading
+import collections
+import functools
+
+PROFILE_MODES = ("off", "cprofile", "sample", "all")
+ENVIRONMENT_VARIABLE = "TEXT_ANALYZER_PROFILE"
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+# Per-process profile of the tasks a pool worker runs, dumped once when the
+# worker exits (the pool is shut down before the profile is merged)
+_worker_profiles = {}
+
+
+def _dump_worker_profiles():
+    for dump_prefix, profile in _worker_profiles.items():
+        try:
+            profile.dump_stats(f"{dump_prefix}.worker-{os.getpid()}.pstats")
+        except OSError as e:
+            print(f"Error writing worker profile: {str(e)}")
+    _worker_profiles.clear()
+
+
+def _profiled_call(dump_prefix: str, function, *args):
+    # Runs inside a ProcessPoolExecutor worker
+    profile = _worker_profiles.get(dump_prefix)
+    if profile is None:
+        if not _worker_profiles:
+            from multiprocessing import util
+            util.Finalize(None, _dump_worker_profiles, exitpriority=10)
+        profile = _worker_profiles[dump_prefix] = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:  # another profiler is already active
+        return function(*args)
+    try:
+        return function(*args)
+    finally:
+        profile.disable()
+
+
+class StackSampler:
+    # Low-overhead alternative to cProfile: a thread that records every other
+    # thread's Python stack each `interval` seconds. Counts are kept in
+    # flame-graph "collapsed" form (frames joined by ';').
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                frames.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(frames))] += 1
+            self.samples += 1
+
+    def write_collapsed(self, path: str) -> None:
+        # Input for flamegraph.pl, speedscope, inferno etc.
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    # Profiles one processing run. cProfile covers the calling thread, the
+    # worker threads (each task runs under a per-thread profile, see wrap())
+    # and the worker processes (they dump their own stats as the pool shuts
+    # down, which must happen inside the run; merged in at the end); the
+    # sampler covers the threads of this process.
+    def __init__(self, mode: str, output_dir: str, name: str, sample_interval: float = DEFAULT_SAMPLE_INTERVAL):
+        self.mode = mode
+        self.output_dir = output_dir
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        self.dump_prefix = os.path.join(output_dir, f"profile-{name}-{stamp}-{os.getpid()}")
+        # The output directory may not exist until the run publishes it
+        self._worker_dir = None
+        self.sample_interval = sample_interval
+        self.paths = []
+        self._profile = None
+        self._sampler = None
+        self._thread_profiles = threading.local()
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    @property
+    def uses_cprofile(self) -> bool:
+        return self.mode in ("cprofile", "all")
+
+    def __enter__(self):
+        if self.uses_cprofile:
+            self._worker_dir = tempfile.mkdtemp(prefix="text_analyzer-profile-")
+            self._profile = self._enable()
+        if self.mode in ("sample", "all"):
+            self._sampler = StackSampler(self.sample_interval)
+            self._sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._sampler is not None:
+            self._sampler.stop()
+        if self._profile is not None:
+            self._profile.disable()
+        os.makedirs(self.output_dir, exist_ok=True)
+        if self.uses_cprofile:
+            self._write_pstats()
+        if self._sampler is not None:
+            self.paths.append(self.dump_prefix + ".collapsed")
+            self._sampler.write_collapsed(self.paths[-1])
+        for path in self.paths:
+            print(f"Profile written: {path}")
+
+    def _enable(self):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # another profiler is already active
+            return None
+        with self._lock:
+            self._profiles.append(profile)
+        return profile
+
+    def wrap(self, function, use_processes: bool = False):
+        # The function to submit to a worker pool in place of `function`
+        if not self.uses_cprofile:
+            return function
+        if use_processes:
+            return functools.partial(_profiled_call, os.path.join(self._worker_dir, "run"), function)
+
+        @functools.wraps(function)
+        def profiled(*args):
+            profile = getattr(self._thread_profiles, "profile", None)
+            if profile is None:
+                profile = self._thread_profiles.profile = cProfile.Profile()
+                with self._lock:
+                    self._profiles.append(profile)
+            try:
+                profile.enable()
+            except ValueError:
+                return function(*args)
+            try:
+                return function(*args)
+            finally:
+                profile.disable()
+        return profiled
+
+    def _write_pstats(self) -> None:
+        import pstats  # slow to import; only needed once a profile is written
+
+        worker_dumps = glob.glob(os.path.join(glob.escape(self._worker_dir), "*.pstats"))
+        sources = [profile for profile in self._profiles if profile.getstats()] + worker_dumps
+        try:
+            if sources:
+                self.paths.append(self.dump_prefix + ".pstats")
+                pstats.Stats(*sources).dump_stats(self.paths[-1])
+        finally:
+            shutil.rmtree(self._worker_dir, ignore_errors=True)
+
+
+def profile_mode(settings_manager) -> str:
+    # The environment variable wins, so a deployed install can be profiled
+    # without touching its settings
+    mode = os.environ.get(ENVIRONMENT_VARIABLE) or settings_manager.get_setting("profile_mode", "off")
+    mode = {"1": "all", "true": "all", "0": "off", "false": "off"}.get(str(mode).lower(), str(mode).lower())
+    return mode if mode in PROFILE_MODES else "off"
@@ -0,0 +1,130 @@
+import threading
+import time
+from typing import Callable, NamedTuple, Optional
+
+DEFAULT_RATE = 10.0  # snapshots published per second
+
+
+class ProgressSnapshot(NamedTuple):
+    phase: str
+    percent: int  # of the whole job, across phases
+    bytes_done: int  # in the current phase
+    total_bytes: int
+    records: int
+    bytes_per_second: float
+    records_per_second: float
+    eta: Optional[float]  # seconds; None until there is something to go by
+    elapsed: float
+
+
+class ProgressReporter:
+    # Collects progress from the processing loop and hands a snapshot to
+    # `publish` at most `rate` times per second, plus once per phase change,
+    # so per-chunk and per-member updates never reach the UI one by one.
+    # `publish` runs on the reporting thread; GUI callers wrap it in wx.CallAfter.
+    def __init__(self, publish: Callable[[ProgressSnapshot], None], rate: float = DEFAULT_RATE,
+                 clock: Callable[[], float] = time.monotonic):
+        self.publish = publish
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._plan = {}
+        self._started = clock()
+        self._next_publish = 0.0
+        self._begin_phase("", 0)
+
+    def plan(self, **phases) -> None:
+        # phase=(start, span): where each phase sits on the overall 0-100
+        # scale. Phases left out of the plan run from 0 to 100 on their own.
+        self._plan = phases
+
+    def start_phase(self, phase: str, total_bytes: int = 0) -> None:
+        with self._lock:
+            self._begin_phase(phase, total_bytes)
+            snapshot = self._snapshot(self.clock())
+        self.publish(snapshot)
+
+    def advance(self, bytes_done: int = 0, records: int = 0) -> None:
+        with self._lock:
+            self.bytes_done += bytes_done
+            self.records += records
+            now = self.clock()
+            if now < self._next_publish:
+                return
+            self._next_publish = now + self.interval
+            snapshot = self._snapshot(now)
+        self.publish(snapshot)
+
+    def end_phase(self) -> None:
+        # Always published, so the last snapshot of a phase shows it complete
+        with self._lock:
+            self._complete = True
+            snapshot = self._snapshot(self.clock())
+        self.publish(snapshot)
+
+    def _begin_phase(self, phase: str, total_bytes: int) -> None:
+        self.phase = phase
+        self.total_bytes = total_bytes
+        self.bytes_done = 0
+        self.records = 0
+        self._complete = False
+        self._phase_started = self.clock()
+        self._span = self._plan.get(phase, (0, 100))
+
+    def _snapshot(self, now: float) -> ProgressSnapshot:
+        if self._complete:
+            fraction = 1.0
+        else:
+            fraction = min(self.bytes_done / self.total_bytes, 1.0) if self.total_bytes else 0.0
+        start, span = self._span
+        percent = start + span * fraction
+        elapsed = now - self._started
+        phase_elapsed = now - self._phase_started
+        eta = elapsed * (100 - percent) / percent if percent > 0 else None
+        return ProgressSnapshot(
+            phase=self.phase,
+            percent=int(percent),
+            bytes_done=self.bytes_done,
+            total_bytes=self.total_bytes,
+            records=self.records,
+            bytes_per_second=self.bytes_done / phase_elapsed if phase_elapsed > 0 else 0.0,
+            records_per_second=self.records / phase_elapsed if phase_elapsed > 0 else 0.0,
+            eta=eta,
+            elapsed=elapsed,
+        )
+
+
+class NullProgressReporter(ProgressReporter):
+    # Used when nobody listens; keeps the processing loop free of checks
+    def __init__(self):
+        super().__init__(lambda snapshot: None)
+
+    def plan(self, **phases) -> None:
+        pass
+
+    def start_phase(self, phase: str, total_bytes: int = 0) -> None:
+        pass
+
+    def advance(self, bytes_done: int = 0, records: int = 0) -> None:
+        pass
+
+    def end_phase(self) -> None:
+        pass
+
+
+def as_reporter(progress_callback, rate: float = DEFAULT_RATE) -> ProgressReporter:
+    # progress_callback may be None, a reporter, or a plain function taking
+    # the overall percentage (the original interface).
+    if isinstance(progress_callback, ProgressReporter):
+        return progress_callback
+    if progress_callback is None:
+        return NullProgressReporter()
+    return ProgressReporter(lambda snapshot: progress_callback(snapshot.percent), rate)
+
+
+def format_eta(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "--:--"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}" if hours else f"{minutes}:{seconds:02}"